@@ -1,49 +1,158 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.db import get_session
+from sqlalchemy import select, func
+from app.db import get_session, mark_written, read_sessionmaker
 from app import models
-from app.schemas import GradeSettingIn, AssignmentOut, AdminSettingIn, AdminSettingOut, ClosePreferenceRequest
-from app.assignment.engine import run_assignment
-from app.core.security import get_current_user
+from app.schemas import (
+  GradeSettingIn, AssignmentOut, AdminSettingIn, AdminSettingOut, ClosePreferenceRequest,
+  SchoolCredentialsIn, SchoolIn, SchoolOut,
+)
+from app.assignment.engine import rerun_assignment
+from app.assignment.solver import SOLVERS
+from app.assignment.jobs import submit_assignment_job, submit_batch_job, job_to_dict, year_lock
+from app.assignment.incremental import reassign_incremental
+from app.assignment_export import export_stream, MEDIA_TYPES
+from app.data_version import bump_version, versioned_json
+from app.preference_buffer import forget_closed
+from app.preference_summary import get_summary, refresh_summary
+from app.teacher_import import import_teachers, upload_size
+from app.core.metrics import RunMetrics
+from app.core.security import get_current_user, hash_password, revoke_tokens, school_of
 from app.core.security_enhanced import validate_file_size, validate_file_extension, check_rate_limit
 from fastapi.responses import StreamingResponse
-import io
-from openpyxl import load_workbook
+from urllib.parse import quote
 from typing import List, Dict, Any
 
+async def get_read_session(user=Depends(get_current_user)) -> AsyncSession:
+  """조회 전용 세션 (읽기 복제본, 단 최근에 데이터를 바꾼 학교는 기본 DB)"""
+  async with (await read_sessionmaker(school_of(user)))() as session:
+    yield session
+
+
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
+@router.get("/schools", response_model=list[SchoolOut])
+async def list_schools(
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """학교 목록 (교육청 관리자만)"""
+  if user.get("role") != "admin" or not user.get("district"):
+    raise HTTPException(status_code=403, detail="Forbidden")
+  return (await session.execute(select(models.School).order_by(models.School.id))).scalars().all()
+
+
+@router.post("/schools", response_model=SchoolOut)
+async def create_school(
+  payload: SchoolIn,
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """학교 추가 (교육청 관리자만)"""
+  if user.get("role") != "admin" or not user.get("district"):
+    raise HTTPException(status_code=403, detail="Forbidden")
+  name = payload.name.strip()
+  exists = (await session.execute(select(models.School).where(models.School.name == name))).scalars().first()
+  if exists:
+    raise HTTPException(status_code=400, detail="이미 등록된 학교입니다.")
+  school = models.School(
+    name=name,
+    admin_password_hash=hash_password(payload.admin_password),
+    teacher_password_hash=hash_password(payload.teacher_password),
+    self_enrollment=payload.self_enrollment,
+  )
+  session.add(school)
+  await session.commit()
+  await session.refresh(school)
+  return school
+
+
+@router.put("/schools/{school_id}", response_model=SchoolOut)
+async def update_school_credentials(
+  school_id: int,
+  payload: SchoolCredentialsIn,
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """학교 관리자/교사 비밀번호, 자가 등록 여부 변경 (교육청 관리자만)"""
+  if user.get("role") != "admin" or not user.get("district"):
+    raise HTTPException(status_code=403, detail="Forbidden")
+  school = await session.get(models.School, school_id)
+  if not school:
+    raise HTTPException(status_code=404, detail="Not found")
+  if payload.admin_password is not None:
+    school.admin_password_hash = hash_password(payload.admin_password)
+  if payload.teacher_password is not None:
+    school.teacher_password_hash = hash_password(payload.teacher_password)
+  if payload.self_enrollment is not None:
+    school.self_enrollment = payload.self_enrollment
+  if payload.admin_password is not None or payload.teacher_password is not None:
+    # 비밀번호를 바꾸면 이전 비밀번호로 받은 토큰도 무효
+    await revoke_tokens(session, school_id)
+  await session.commit()
+  await session.refresh(school)
+  return school
+
+
+@router.post("/tokens/revoke")
+async def revoke_school_tokens(
+  teacher_id: int | None = None,
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """
+  토큰 무효화: teacher_id가 있으면 그 교사의 토큰만, 없으면 이 학교의 모든 토큰(요청한 관리자 포함)
+  다른 워커에는 TOKEN_VERSION_CACHE_SECONDS 안에 반영
+  """
+  if user.get("role") != "admin":
+    raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
+  if teacher_id is not None:
+    teacher = await session.get(models.Teacher, teacher_id)
+    if not teacher or teacher.school_id != school_id:
+      raise HTTPException(status_code=404, detail="Not found")
+  await revoke_tokens(session, school_id, teacher_id)
+  await session.commit()
+  return {"status": "ok"}
+
+
 @router.get("/dashboard")
 async def dashboard(
   year: int,
-  session: AsyncSession = Depends(get_session),
+  request: Request,
+  session: AsyncSession = Depends(get_read_session),
   user=Depends(get_current_user),
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
-  
+  school_id = school_of(user)
+  return await versioned_json(request, session, "dashboard", school_id, year, lambda: _dashboard(session, year, school_id))
+
+
+async def _dashboard(session: AsyncSession, year: int, school_id: int) -> dict:
   # 전체 교사 수 (설정에서 가져오기, 없으면 DB의 실제 교사 수)
-  admin_setting_stmt = select(models.AdminSetting).where(models.AdminSetting.year == year)
+  admin_setting_stmt = select(models.AdminSetting).where(
+    models.AdminSetting.school_id == school_id, models.AdminSetting.year == year
+  )
   admin_setting_res = await session.execute(admin_setting_stmt)
   admin_setting = admin_setting_res.scalars().first()
   total_count = admin_setting.total_teachers if admin_setting else 0
   
   # 설정이 없으면 DB의 실제 교사 수 사용
   if total_count == 0:
-    total_teachers = (await session.execute(select(models.Teacher))).scalars().all()
-    total_count = len(total_teachers)
+    total_count = (
+      await session.execute(select(func.count()).where(models.Teacher.school_id == school_id))
+    ).scalar_one()
   
-  # 희망 제출 수
-  prefs = (
-    await session.execute(select(models.Preference).where(models.Preference.year == year))
-  ).scalars().all()
-  submitted_count = len(prefs)
+  # 희망 제출 수 / 지망 현황 (연도별 집계 행)
+  pref_summary = await get_summary(session, year, school_id)
   
   # 필요 담임 수
   settings = (
-    await session.execute(select(models.GradeSetting).where(models.GradeSetting.year == year))
+    await session.execute(
+      select(models.GradeSetting).where(models.GradeSetting.school_id == school_id, models.GradeSetting.year == year)
+    )
   ).scalars().all()
   required_homerooms = sum(s.required_homerooms for s in settings)
   
@@ -53,27 +162,15 @@ async def dashboard(
   # 마감 여부
   is_closed = admin_setting.is_closed if admin_setting else False
   
-  # 지망 현황
-  first_counts = {}
-  second_counts = {}
-  third_counts = {}
-  for p in prefs:
-    if p.first_choice_grade:
-      first_counts[p.first_choice_grade] = first_counts.get(p.first_choice_grade, 0) + 1
-    if p.second_choice_grade:
-      second_counts[p.second_choice_grade] = second_counts.get(p.second_choice_grade, 0) + 1
-    if p.third_choice_grade:
-      third_counts[p.third_choice_grade] = third_counts.get(p.third_choice_grade, 0) + 1
-  
   return {
     "year": year,
     "total_teachers": total_count,
-    "submitted_count": submitted_count,
+    "submitted_count": pref_summary["submitted_count"],
     "required_homerooms": required_homerooms,
     "grade_class_counts": grade_class_counts,
-    "first_choice_counts": first_counts,
-    "second_choice_counts": second_counts,
-    "third_choice_counts": third_counts,
+    "first_choice_counts": pref_summary["counts"]["first"],
+    "second_choice_counts": pref_summary["counts"]["second"],
+    "third_choice_counts": pref_summary["counts"]["third"],
     "is_closed": is_closed,
   }
 
@@ -81,43 +178,47 @@ async def dashboard(
 @router.get("/summary")
 async def summary(
   year: int,
-  session: AsyncSession = Depends(get_session),
+  request: Request,
+  session: AsyncSession = Depends(get_read_session),
   user=Depends(get_current_user),
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
-  prefs = (
-    await session.execute(select(models.Preference).where(models.Preference.year == year))
-  ).scalars()
-  first_counts = {}
-  second_counts = {}
-  third_counts = {}
-  for p in prefs:
-    if p.first_choice_grade:
-      first_counts[p.first_choice_grade] = first_counts.get(p.first_choice_grade, 0) + 1
-    if p.second_choice_grade:
-      second_counts[p.second_choice_grade] = second_counts.get(p.second_choice_grade, 0) + 1
-    if p.third_choice_grade:
-      third_counts[p.third_choice_grade] = third_counts.get(p.third_choice_grade, 0) + 1
+  school_id = school_of(user)
+  return await versioned_json(request, session, "summary", school_id, year, lambda: _summary(session, year, school_id))
+
+
+async def _summary(session: AsyncSession, year: int, school_id: int) -> dict:
+  pref_summary = await get_summary(session, year, school_id)
   return {
     "year": year,
-    "first_choice_counts": first_counts,
-    "second_choice_counts": second_counts,
-    "third_choice_counts": third_counts,
+    "first_choice_counts": pref_summary["counts"]["first"],
+    "second_choice_counts": pref_summary["counts"]["second"],
+    "third_choice_counts": pref_summary["counts"]["third"],
   }
 
 
 @router.get("/settings")
 async def get_settings(
   year: int,
-  session: AsyncSession = Depends(get_session),
+  request: Request,
+  session: AsyncSession = Depends(get_read_session),
   user=Depends(get_current_user),
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
-  stmt = select(models.GradeSetting).where(models.GradeSetting.year == year)
+  school_id = school_of(user)
+  return await versioned_json(request, session, "settings", school_id, year, lambda: _grade_settings(session, year, school_id))
+
+
+async def _grade_settings(session: AsyncSession, year: int, school_id: int) -> list:
+  stmt = select(models.GradeSetting).where(
+    models.GradeSetting.school_id == school_id, models.GradeSetting.year == year
+  )
   res = await session.execute(stmt)
-  return res.scalars().all()
+  # 같은 버전이면 같은 바이트가 되도록 컬럼 순서로 직렬화 (ETag)
+  columns = models.GradeSetting.__table__.columns.keys()
+  return [{key: getattr(gs, key) for key in columns} for gs in res.scalars().all()]
 
 
 @router.post("/settings")
@@ -128,8 +229,10 @@ async def upsert_settings(
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
   for item in payload:
     stmt = select(models.GradeSetting).where(
+      models.GradeSetting.school_id == school_id,
       models.GradeSetting.year == item.year,
       models.GradeSetting.grade == item.grade,
     )
@@ -144,6 +247,7 @@ async def upsert_settings(
       gs.required_duty_heads = duty_heads
     else:
       gs = models.GradeSetting(
+        school_id=school_id,
         year=item.year,
         grade=item.grade,
         class_count=item.class_count,
@@ -152,6 +256,9 @@ async def upsert_settings(
         required_duty_heads=duty_heads,
       )
       session.add(gs)
+  for year in {item.year for item in payload}:
+    await bump_version(session, school_id, year)
+  await mark_written(session, school_id)
   await session.commit()
   return {"status": "ok"}
 
@@ -163,7 +270,9 @@ async def get_preference_status(
   user=Depends(get_current_user),
 ):
   """희망 제출 마감 상태 조회 (교사/관리자 모두 사용 가능)"""
-  stmt = select(models.AdminSetting).where(models.AdminSetting.year == year)
+  stmt = select(models.AdminSetting).where(
+    models.AdminSetting.school_id == school_of(user), models.AdminSetting.year == year
+  )
   res = await session.execute(stmt)
   admin_setting = res.scalars().first()
   is_closed = admin_setting.is_closed if admin_setting else False
@@ -179,8 +288,11 @@ async def close_preferences(
   """희망 제출 마감 설정/해제 (관리자만)"""
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
   
-  stmt = select(models.AdminSetting).where(models.AdminSetting.year == payload.year)
+  stmt = select(models.AdminSetting).where(
+    models.AdminSetting.school_id == school_id, models.AdminSetting.year == payload.year
+  )
   res = await session.execute(stmt)
   admin_setting = res.scalars().first()
   
@@ -188,13 +300,18 @@ async def close_preferences(
     admin_setting.is_closed = payload.is_closed
   else:
     admin_setting = models.AdminSetting(
+      school_id=school_id,
       year=payload.year,
       total_teachers=0,
       is_closed=payload.is_closed,
     )
     session.add(admin_setting)
   
+  await bump_version(session, school_id, payload.year)
+  await mark_written(session, school_id)
   await session.commit()
+  # 응답한 희망 제출은 이미 커밋되어 있고, 아직 저장 중인 제출은 저장 트랜잭션에서 마감 여부를 다시 확인함
+  forget_closed(school_id, payload.year)
   return {"year": payload.year, "is_closed": payload.is_closed}
 
 
@@ -206,17 +323,24 @@ async def update_total_teachers(
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
   
-  stmt = select(models.AdminSetting).where(models.AdminSetting.year == payload.year)
+  stmt = select(models.AdminSetting).where(
+    models.AdminSetting.school_id == school_id, models.AdminSetting.year == payload.year
+  )
   res = await session.execute(stmt)
   admin_setting = res.scalars().first()
   
   if admin_setting:
     admin_setting.total_teachers = payload.total_teachers
   else:
-    admin_setting = models.AdminSetting(year=payload.year, total_teachers=payload.total_teachers, is_closed=False)
+    admin_setting = models.AdminSetting(
+      school_id=school_id, year=payload.year, total_teachers=payload.total_teachers, is_closed=False
+    )
     session.add(admin_setting)
   
+  await bump_version(session, school_id, payload.year)
+  await mark_written(session, school_id)
   await session.commit()
   await session.refresh(admin_setting)
   return AdminSettingOut.model_validate(admin_setting)
@@ -230,186 +354,24 @@ async def upload_teachers(
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
   
   # 파일 확장자 검증
   if not validate_file_extension(file.filename):
     raise HTTPException(status_code=400, detail="Only Excel files (.xlsx, .xls) are allowed")
   
-  # 파일 크기 검증 (10MB 제한)
-  file_content = await file.read()
-  if not validate_file_size(len(file_content), max_size_mb=10):
+  # 파일 크기 검증 (10MB 제한, 내용을 메모리에 올리지 않고 확인)
+  if not validate_file_size(await upload_size(file, 10 * 1024 * 1024), max_size_mb=10):
     raise HTTPException(status_code=400, detail="File size exceeds 10MB limit")
   
-  # 파일 내용 재사용을 위해 seek
-  await file.seek(0)
-  
   try:
-    # 파일 읽기
-    contents = await file.read()
-    wb = load_workbook(io.BytesIO(contents))
-    ws = wb.active
-    
-    # 헤더 행 찾기 (첫 번째 행)
-    headers = [cell.value for cell in ws[1]]
-    
-    # 헤더 매핑 (다양한 형식 지원)
-    header_map = {}
-    for idx, header in enumerate(headers):
-      if header is None:
-        continue
-      header_str = str(header).strip().lower()
-      if "이름" in header_str or "name" in header_str:
-        header_map["name"] = idx
-      elif "이메일" in header_str or "email" in header_str:
-        header_map["email"] = idx
-      elif "구글" in header_str or "google" in header_str:
-        header_map["google_id"] = idx
-      elif "성별" in header_str or "gender" in header_str:
-        header_map["gender"] = idx
-      elif "총 경력" in header_str or "발령" in header_str or "hire" in header_str:
-        header_map["hire_year"] = idx
-      elif "본교" in header_str or "근무 시작" in header_str or "school_join" in header_str:
-        header_map["school_join_year"] = idx
-      elif "올해 학년" in header_str or "current_grade" in header_str:
-        header_map["current_grade"] = idx
-      elif "올해 학급" in header_str or "current_class" in header_str:
-        header_map["current_class"] = idx
-      elif "담임" in header_str and "올해" in header_str or "is_homeroom" in header_str:
-        header_map["is_homeroom_current"] = idx
-      elif "교과전담" in header_str or "is_subject" in header_str:
-        header_map["is_subject_teacher"] = idx
-      elif "업무부장" in header_str or "duty_role" in header_str:
-        header_map["duty_role"] = idx
-      elif "교과" in header_str or "subject" in header_str:
-        header_map["subject"] = idx
-      elif "특수" in header_str or "special" in header_str:
-        header_map["special_conditions"] = idx
-      elif "본교 담임 이력" in header_str or "학년이력" in header_str or "grade_history" in header_str or "담임 이력" in header_str:
-        header_map["grade_history"] = idx
-    
-    if "name" not in header_map:
-      raise HTTPException(status_code=400, detail="Excel file must contain 'name' column")
-    
-    # 데이터 행 처리
-    success_count = 0
-    error_count = 0
-    errors: List[str] = []
-    
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=False), start=2):
-      # 빈 행 건너뛰기
-      if not row[header_map["name"]].value:
-        continue
-      
-      try:
-        name = str(row[header_map["name"]].value).strip()
-        if not name:
-          continue
-        
-        # 기존 교사 찾기 또는 새로 생성
-        stmt = select(models.Teacher).where(models.Teacher.name == name)
-        res = await session.execute(stmt)
-        teacher = res.scalars().first()
-        
-        if not teacher:
-          teacher = models.Teacher(name=name)
-          session.add(teacher)
-        
-        # 데이터 업데이트
-        if "email" in header_map and row[header_map["email"]].value:
-          teacher.email = str(row[header_map["email"]].value).strip() or None
-        
-        if "google_id" in header_map and row[header_map["google_id"]].value:
-          teacher.google_id = str(row[header_map["google_id"]].value).strip() or None
-        
-        if "gender" in header_map and row[header_map["gender"]].value:
-          teacher.gender = str(row[header_map["gender"]].value).strip()[:10] or None
-        
-        if "hire_year" in header_map and row[header_map["hire_year"]].value:
-          try:
-            teacher.hire_year = int(row[header_map["hire_year"]].value)
-          except (ValueError, TypeError):
-            pass
-        
-        if "school_join_year" in header_map and row[header_map["school_join_year"]].value:
-          try:
-            teacher.school_join_year = int(row[header_map["school_join_year"]].value)
-          except (ValueError, TypeError):
-            pass
-        
-        if "current_grade" in header_map and row[header_map["current_grade"]].value:
-          try:
-            teacher.current_grade = int(row[header_map["current_grade"]].value)
-          except (ValueError, TypeError):
-            pass
-        
-        if "current_class" in header_map and row[header_map["current_class"]].value:
-          teacher.current_class = str(row[header_map["current_class"]].value).strip() or None
-        
-        if "is_homeroom_current" in header_map:
-          val = row[header_map["is_homeroom_current"]].value
-          if val is not None:
-            if isinstance(val, bool):
-              teacher.is_homeroom_current = val
-            elif isinstance(val, str):
-              teacher.is_homeroom_current = val.lower() in ("true", "1", "예", "yes", "담임", "o", "○")
-            elif isinstance(val, (int, float)):
-              teacher.is_homeroom_current = bool(val)
-        
-        if "is_subject_teacher" in header_map:
-          val = row[header_map["is_subject_teacher"]].value
-          if val is not None:
-            if isinstance(val, bool):
-              teacher.is_subject_teacher = val
-            elif isinstance(val, str):
-              teacher.is_subject_teacher = val.lower() in ("true", "1", "예", "yes", "교과전담", "o", "○")
-            elif isinstance(val, (int, float)):
-              teacher.is_subject_teacher = bool(val)
-        
-        if "duty_role" in header_map and row[header_map["duty_role"]].value:
-          teacher.duty_role = str(row[header_map["duty_role"]].value).strip() or None
-        
-        if "subject" in header_map and row[header_map["subject"]].value:
-          teacher.subject = str(row[header_map["subject"]].value).strip() or None
-        
-        if "special_conditions" in header_map and row[header_map["special_conditions"]].value:
-          teacher.special_conditions = str(row[header_map["special_conditions"]].value).strip() or None
-        
-        # 학년 이력 파싱 및 저장
-        if "grade_history" in header_map and row[header_map["grade_history"]].value:
-          import json
-          history_str = str(row[header_map["grade_history"]].value).strip()
-          if history_str:
-            try:
-              # "연도:학년,연도:학년" 형식 파싱
-              history = []
-              for entry in history_str.split(","):
-                entry = entry.strip()
-                if ":" in entry:
-                  parts = entry.split(":")
-                  if len(parts) == 2:
-                    year = int(parts[0].strip())
-                    grade = int(parts[1].strip())
-                    history.append({"year": year, "grade": grade})
-              if history:
-                teacher.grade_history = json.dumps(history, ensure_ascii=False)
-            except (ValueError, TypeError) as e:
-              # 파싱 실패 시 무시 (에러 로그에 기록하지 않음)
-              pass
-        
-        success_count += 1
-        
-      except Exception as e:
-        error_count += 1
-        errors.append(f"{row_idx}행: {str(e)}")
-    
+    result = await import_teachers(session, file.file, school_id=school_id)
+    await bump_version(session, school_id)
+    await mark_written(session, school_id)
     await session.commit()
-    
-    return {
-      "status": "ok",
-      "success_count": success_count,
-      "error_count": error_count,
-      "errors": errors[:10],  # 최대 10개 오류만 반환
-    }
+    return result
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
   except Exception as e:
     import logging
     logger = logging.getLogger(__name__)
@@ -421,20 +383,31 @@ async def upload_teachers(
 @router.post("/assign", response_model=list[AssignmentOut])
 async def assign(
   year: int,
+  response: Response,
+  solver: str = "greedy",
+  profile: bool = False,
   session: AsyncSession = Depends(get_session),
   user=Depends(get_current_user),
 ):
+  """배정 실행. profile=true면 cProfile 결과를 저장하고 경로를 X-Profile-Path 헤더로 반환"""
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
+  if solver not in SOLVERS:
+    raise HTTPException(status_code=400, detail=f"solver는 {', '.join(SOLVERS)} 중 하나여야 합니다.")
   try:
-    # 기존 결과 삭제
-    await session.execute(
-      models.Assignment.__table__.delete().where(models.Assignment.year == year)
-    )
-    await session.commit()
-    assigned, excluded, logs = await run_assignment(session, year)
+    # 기존 결과 삭제 후 재배정 (같은 연도의 백그라운드 작업과 겹치지 않도록 잠금)
+    async with year_lock(year, school_id):
+      run = RunMetrics(school_id=school_id, year=year, solver=solver)
+      assigned, excluded, logs = await rerun_assignment(
+        session, year, solver=solver, school_id=school_id, metrics=run, profile=profile
+      )
+    if run.profile_path:
+      response.headers["X-Profile-Path"] = run.profile_path
     res = (
-      await session.execute(select(models.Assignment).where(models.Assignment.year == year))
+      await session.execute(
+        select(models.Assignment).where(models.Assignment.school_id == school_id, models.Assignment.year == year)
+      )
     ).scalars().all()
     return res
   except ValueError as e:
@@ -443,14 +416,93 @@ async def assign(
     raise HTTPException(status_code=500, detail=f"배정 중 오류 발생: {str(e)}")
 
 
+@router.post("/assign/incremental")
+async def assign_incremental(
+  year: int,
+  teacher_ids: List[int] = Query(...),
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """일부 교사 변경 시 영향받는 학년만 재배정하고 달라진 행만 저장"""
+  if user.get("role") != "admin":
+    raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
+  try:
+    async with year_lock(year, school_id):
+      return await reassign_incremental(session, year, teacher_ids, school_id=school_id)
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/assign/batch", status_code=202)
+async def assign_batch(
+  year: int,
+  school_ids: List[int] | None = Query(None),
+  solver: str = "flow",
+  workers: int | None = Query(None, ge=1, le=64),
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """
+  여러 학교 일괄 배정 (교육청 관리자만). 백그라운드 작업으로 실행하고 작업 id 반환
+  진행률과 학교별 소요 시간/결과는 GET /assign/jobs/{job_id}의 progress, metrics로 조회
+  """
+  if user.get("role") != "admin" or not user.get("district"):
+    raise HTTPException(status_code=403, detail="Forbidden")
+  if solver not in SOLVERS:
+    raise HTTPException(status_code=400, detail=f"solver는 {', '.join(SOLVERS)} 중 하나여야 합니다.")
+  job = await submit_batch_job(session, year, solver, school_ids, workers, school_id=school_of(user))
+  return {"job_id": job.id, "status": job.status}
+
+
+@router.post("/assign/jobs", status_code=202)
+async def create_assign_job(
+  year: int,
+  solver: str = "greedy",
+  profile: bool = False,
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """배정을 백그라운드 작업으로 실행하고 작업 id 반환 (profile=true면 cProfile 결과 경로를 작업 metrics에 기록)"""
+  if user.get("role") != "admin":
+    raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
+  if solver not in SOLVERS:
+    raise HTTPException(status_code=400, detail=f"solver는 {', '.join(SOLVERS)} 중 하나여야 합니다.")
+  job = await submit_assignment_job(session, year, solver, school_id=school_id, profile=profile)
+  return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/assign/jobs/{job_id}")
+async def get_assign_job(
+  job_id: int,
+  session: AsyncSession = Depends(get_session),
+  user=Depends(get_current_user),
+):
+  """배정 작업 진행 상태 조회 (단계, 진행률, 단계별 소요 시간)"""
+  if user.get("role") != "admin":
+    raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
+  job = await session.get(models.AssignmentJob, job_id)
+  if not job or job.school_id != school_id:
+    raise HTTPException(status_code=404, detail="Not found")
+  return job_to_dict(job)
+
+
 @router.get("/assignments")
 async def list_assignments(
   year: int,
-  session: AsyncSession = Depends(get_session),
+  request: Request,
+  session: AsyncSession = Depends(get_read_session),
   user=Depends(get_current_user),
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
+  return await versioned_json(request, session, "assignments", school_id, year, lambda: _assignments(session, year, school_id))
+
+
+async def _assignments(session: AsyncSession, year: int, school_id: int) -> list:
   stmt = (
     select(
       models.Assignment.id,
@@ -462,7 +514,7 @@ async def list_assignments(
       models.Teacher.name,
     )
     .join(models.Teacher, models.Teacher.id == models.Assignment.teacher_id)
-    .where(models.Assignment.year == year)
+    .where(models.Assignment.school_id == school_id, models.Assignment.year == year)
   )
   res = await session.execute(stmt)
   rows = res.all()
@@ -484,95 +536,77 @@ async def list_assignments(
 async def export_assignments(
   year: int,
   format: str = "csv",
-  session: AsyncSession = Depends(get_session),
   user=Depends(get_current_user),
 ):
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
-  stmt = (
-    select(
-      models.Assignment.teacher_id,
-      models.Teacher.name,
-      models.Assignment.assigned_grade,
-      models.Assignment.assignment_type,
-      models.Assignment.rule_reference,
-      models.Assignment.description,
-    )
-    .join(models.Teacher, models.Teacher.id == models.Assignment.teacher_id)
-    .where(models.Assignment.year == year)
-  )
-  res = await session.execute(stmt)
-  rows = res.all()
-
-  output = io.StringIO()
-  headers = ["teacher_id", "teacher_name", "assigned_grade", "assignment_type", "rule_reference", "description"]
-  output.write(",".join(headers) + "\n")
-  for r in rows:
-    output.write(
-      f"{r.teacher_id},{r.name},{r.assigned_grade},{r.assignment_type},{r.rule_reference or ''},{r.description or ''}\n"
-    )
-  output.seek(0)
+  school_id = school_of(user)
+  try:
+    body = export_stream(year, format, school_id)
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e))
 
   return StreamingResponse(
-    output,
-    media_type="text/csv",
-    headers={"Content-Disposition": f'attachment; filename="assignments_{year}.csv"'},
+    body,
+    media_type=MEDIA_TYPES[format],
+    headers={"Content-Disposition": f'attachment; filename="assignments_{year}.{format}"'},
   )
 
 
 @router.get("/preferences")
 async def list_preferences(
   year: int,
-  session: AsyncSession = Depends(get_session),
+  response: Response,
+  after_name: str | None = None,
+  limit: int | None = Query(None, ge=1, le=1000),
+  orphans: bool = False,
+  session: AsyncSession = Depends(get_read_session),
   user=Depends(get_current_user),
 ):
-  """제출한 사람들의 명단과 지망 정보 조회"""
+  """
+  제출한 사람들의 명단과 지망 정보 조회
+  - 교사 이름순 키셋 페이지네이션: limit을 주면 다음 페이지 커서를 X-Next-After-Name 헤더로 반환
+  - orphans=true: 교사 레코드가 없는 희망만 조회 (데이터 점검용)
+  """
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
-  
-  import logging
-  logger = logging.getLogger(__name__)
-  logger.info(f"제출 명단 조회 요청: year={year}")
-
-  # 전체 Preference 확인
-  all_prefs_stmt = select(models.Preference).where(models.Preference.year == year)
-  all_prefs_res = await session.execute(all_prefs_stmt)
-  all_prefs = all_prefs_res.scalars().all()
-  logger.info(f"해당 연도의 전체 Preference 수: {len(all_prefs)}")
-
-  # 각 Preference의 teacher_id 확인
-  for pref in all_prefs:
-    logger.info(f"Preference ID={pref.id}, teacher_id={pref.teacher_id}")
-    # 해당 teacher가 존재하는지 확인
-    teacher_stmt = select(models.Teacher).where(models.Teacher.id == pref.teacher_id)
-    teacher_res = await session.execute(teacher_stmt)
-    teacher = teacher_res.scalars().first()
-    if teacher:
-      logger.info(f"  -> Teacher 존재: id={teacher.id}, name={teacher.name}")
-    else:
-      logger.warning(f"  -> Teacher 없음! teacher_id={pref.teacher_id}에 해당하는 Teacher 레코드가 DB에 없습니다.")
-
-  stmt = (
-    select(
-      models.Preference.id,
-      models.Preference.teacher_id,
-      models.Preference.first_choice_grade,
-      models.Preference.second_choice_grade,
-      models.Preference.third_choice_grade,
-      models.Preference.wants_grade_head,
-      models.Preference.wants_subject_teacher,
-      models.Preference.wants_duty_head,
-      models.Teacher.name,
-    )
-    .join(models.Teacher, models.Teacher.id == models.Preference.teacher_id)
-    .where(models.Preference.year == year)
-    .order_by(models.Teacher.name)
+  school_id = school_of(user)
+
+  columns = (
+    models.Preference.id,
+    models.Preference.teacher_id,
+    models.Preference.first_choice_grade,
+    models.Preference.second_choice_grade,
+    models.Preference.third_choice_grade,
+    models.Preference.wants_grade_head,
+    models.Preference.wants_subject_teacher,
+    models.Preference.wants_duty_head,
+    models.Teacher.name,
   )
-  res = await session.execute(stmt)
-  rows = res.all()
-  logger.info(f"JOIN 후 결과 수: {len(rows)}")
-  
-  result = [
+  if orphans:
+    stmt = (
+      select(*columns)
+      .outerjoin(models.Teacher, models.Teacher.id == models.Preference.teacher_id)
+      .where(models.Preference.school_id == school_id, models.Preference.year == year, models.Teacher.id.is_(None))
+      .order_by(models.Preference.id)
+    )
+  else:
+    stmt = (
+      select(*columns)
+      .join(models.Teacher, models.Teacher.id == models.Preference.teacher_id)
+      .where(models.Preference.school_id == school_id, models.Preference.year == year)
+      .order_by(models.Teacher.name)
+    )
+    if after_name is not None:
+      stmt = stmt.where(models.Teacher.name > after_name)
+  if limit:
+    stmt = stmt.limit(limit)
+  rows = (await session.execute(stmt)).all()
+
+  if limit and len(rows) == limit and not orphans:
+    response.headers["X-Next-After-Name"] = quote(rows[-1].name)
+
+  return [
     {
       "id": r.id,
       "teacher_id": r.teacher_id,
@@ -586,9 +620,6 @@ async def list_preferences(
     }
     for r in rows
   ]
-  
-  logger.info(f"제출 명단 조회 결과: {len(result)}건")
-  return result
 
 
 @router.delete("/preferences")
@@ -600,11 +631,16 @@ async def clear_preferences(
   """특정 연도의 모든 희망 초기화"""
   if user.get("role") != "admin":
     raise HTTPException(status_code=403, detail="Forbidden")
+  school_id = school_of(user)
   
   # 해당 연도의 모든 희망 삭제
   deleted = await session.execute(
-    models.Preference.__table__.delete().where(models.Preference.year == year)
+    models.Preference.__table__.delete().where(
+      models.Preference.school_id == school_id, models.Preference.year == year
+    )
   )
+  await refresh_summary(session, year, school_id)
+  await mark_written(session, school_id)
   await session.commit()
   
   return {"status": "ok", "message": f"{year}년도 희망서가 모두 초기화되었습니다.", "deleted_count": deleted.rowcount}
@@ -2,12 +2,16 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.core.config import settings
-from app.core.security import create_access_token, get_current_user
+from app.core.google_auth import verify_google_token
+from app.core.security import create_access_token, get_current_user, school_password_ok
 from app.core.security_enhanced import check_rate_limit, sanitize_string
+from app.data_version import bump_version
 from app.db import get_session
+from app.grade_history import load_history_json, parse_history_json, replace_history
 from app import models
 from app.schemas import LoginRequest, TeacherUpdate
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+import hmac
 import httpx
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -15,13 +19,14 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 class GoogleTokenRequest(BaseModel):
   token: str
+  school_id: int = Field(models.DEFAULT_SCHOOL_ID, ge=1)  # 명단에 없는 교사를 등록할 학교 (자가 등록을 허용한 학교만)
 
 
 @router.post("/login")
 async def login(req: LoginRequest, request: Request, session: AsyncSession = Depends(get_session)):
   # Rate limiting 체크
   client_ip = request.client.host if request.client else "unknown"
-  if not check_rate_limit(f"login:{client_ip}", max_requests=5, window_seconds=300):
+  if not await check_rate_limit(f"login:{client_ip}", max_requests=5, window_seconds=300):
     raise HTTPException(
       status_code=429,
       detail="Too many login attempts. Please try again later."
@@ -35,31 +40,45 @@ async def login(req: LoginRequest, request: Request, session: AsyncSession = Dep
   if len(password) > 200:
     raise HTTPException(status_code=400, detail="Invalid input")
   
+  school = await session.get(models.School, req.school_id)
+  if not school:
+    raise HTTPException(status_code=401, detail="Invalid credentials")
+
   role = req.role
   if role == "admin":
-    if password != settings.admin_password:
+    # 교육청 관리자: 학교 생성/조회 가능, 원하는 학교(school_id)의 관리자 권한 포함
+    # 학교 관리자: 그 학교의 관리자 비밀번호로만 로그인
+    district = bool(settings.district_admin_password) and hmac.compare_digest(
+      password.encode(), settings.district_admin_password.encode()
+    )
+    if not district and not school_password_ok(school, "admin", password):
       raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token({"role": "admin"})
-    return {"token": token, "role": "admin"}
+    token = create_access_token({"role": "admin", "school_id": req.school_id, "district": district}, school)
+    return {"token": token, "role": "admin", "school_id": req.school_id, "district": district}
 
-  # teacher login (shared password) + ensure teacher exists
-  if password != settings.teacher_password:
+  # teacher login (학교 교사 비밀번호) + 명단 확인
+  if not school_password_ok(school, "teacher", password):
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
   if name:
-    stmt = select(models.Teacher).where(models.Teacher.name == name)
+    stmt = select(models.Teacher).where(models.Teacher.school_id == req.school_id, models.Teacher.name == name)
     res = await session.execute(stmt)
     teacher = res.scalars().first()
     if not teacher:
-      teacher = models.Teacher(name=name)
+      # 명단에 없는 교사는 자가 등록을 허용한 학교에서만 등록
+      if not school.self_enrollment:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+      teacher = models.Teacher(school_id=req.school_id, name=name)
       session.add(teacher)
+      # 교사 수/명단이 바뀌므로 관리자 조회 캐시 무효화
+      await bump_version(session, req.school_id)
       await session.commit()
       await session.refresh(teacher)
   else:
     raise HTTPException(status_code=400, detail="Name is required for teacher login")
 
-  token = create_access_token({"role": "teacher", "teacher_id": teacher.id})
-  return {"token": token, "role": "teacher", "teacher_id": teacher.id}
+  token = create_access_token({"role": "teacher", "teacher_id": teacher.id, "school_id": teacher.school_id}, school, teacher)
+  return {"token": token, "role": "teacher", "teacher_id": teacher.id, "school_id": teacher.school_id}
 
 
 @router.post("/google")
@@ -78,36 +97,26 @@ async def google_login(req: GoogleTokenRequest, session: AsyncSession = Depends(
   
   logger.info(f"Received Google token request (token length: {len(req.token) if req.token else 0})")
   
-  # 구글 Access Token으로 사용자 정보 가져오기
+  # 구글 토큰 검증 (google_token_mode: userinfo면 Access Token으로 사용자 정보 조회, id_token이면 서명 직접 검증)
   google_id = None
   email = None
   name = None
   
   try:
-    async with httpx.AsyncClient(timeout=10.0) as client:
-      # Access token으로 userinfo 가져오기
-      resp = await client.get(
-        "https://www.googleapis.com/oauth2/v2/userinfo",
-        headers={"Authorization": f"Bearer {req.token}"}
-      )
-      logger.info(f"Google API response status: {resp.status_code}")
-      
-      if resp.status_code != 200:
-        error_text = resp.text[:500] if resp.text else "No error message"
-        logger.error(f"Google API error: {resp.status_code}, {error_text}")
-        raise HTTPException(status_code=401, detail=f"Invalid Google token: {resp.status_code}")
-      
-      user_info = resp.json()
-      logger.info(f"Google user_info received: {user_info.get('email', 'no email')}")
-      
-      google_id = user_info.get("id")
-      email = user_info.get("email")
-      name = user_info.get("name", email.split("@")[0] if email else "Unknown")
+    user_info = await verify_google_token(req.token)
+    logger.info(f"Google user_info received: {user_info.get('email', 'no email')}")
+    
+    google_id = user_info.get("id")
+    email = user_info.get("email")
+    # userinfo 모드: 확인되지 않은 이메일은 명단 연결에 쓰지 않음
+    if user_info.get("verified_email") is False or user_info.get("email_verified") is False:
+      email = None
+    name = user_info.get("name") or (email.split("@")[0] if email else "Unknown")
+    
+    if not google_id:
+      logger.error(f"Missing google_id in user_info: {user_info}")
+      raise HTTPException(status_code=401, detail="Invalid Google token: missing user ID")
       
-      if not google_id:
-        logger.error(f"Missing google_id in user_info: {user_info}")
-        raise HTTPException(status_code=401, detail="Invalid Google token: missing user ID")
-        
   except HTTPException:
     raise
   except httpx.TimeoutException as e:
@@ -118,16 +127,32 @@ async def google_login(req: GoogleTokenRequest, session: AsyncSession = Depends(
     logger.error(f"Traceback: {traceback.format_exc()}")
     raise HTTPException(status_code=401, detail=f"Google token verification failed: {str(e)}")
   
-  # 교사 찾기 또는 생성
-  stmt = select(models.Teacher).where(
-    (models.Teacher.google_id == google_id) | (models.Teacher.email == email)
-  )
+  # 요청한 학교의 명단에서 교사 찾기 또는 생성
+  # (email이 없으면 email 조건을 빼야 함. None과 비교하면 IS NULL이 되어 이메일 없는 교사와 연결됨)
+  match = models.Teacher.google_id == google_id
+  if email:
+    match = match | (models.Teacher.email == email)
+  stmt = select(models.Teacher).where(models.Teacher.school_id == req.school_id, match)
   res = await session.execute(stmt)
   teacher = res.scalars().first()
   
   if not teacher:
-    teacher = models.Teacher(name=name, email=email, google_id=google_id)
+    # google_id/email은 전역 고유이므로 다른 학교 명단에 있는 계정은 이 학교에 등록할 수 없음
+    if (await session.execute(select(models.Teacher.id).where(match).limit(1))).first():
+      raise HTTPException(status_code=403, detail="다른 학교 명단에 등록된 계정입니다.")
+    # 명단(이메일/구글 ID)에 없는 계정은 자가 등록을 허용한 학교에서만 등록
+    school = await session.get(models.School, req.school_id)
+    if not school:
+      raise HTTPException(status_code=400, detail="Unknown school")
+    if not school.self_enrollment:
+      raise HTTPException(status_code=403, detail="교사 명단에 없는 계정입니다. 학교 관리자에게 명단 등록을 요청하세요.")
+    # 이름만 같은 명단 교사에 구글 계정을 연결하지 않음 (관리자가 명단에 이메일을 등록해야 연결)
+    same_name = select(models.Teacher.id).where(models.Teacher.school_id == req.school_id, models.Teacher.name == name)
+    if (await session.execute(same_name)).first():
+      raise HTTPException(status_code=409, detail="같은 이름의 교사가 명단에 있습니다. 학교 관리자에게 이메일 등록을 요청하세요.")
+    teacher = models.Teacher(school_id=req.school_id, name=name, email=email, google_id=google_id)
     session.add(teacher)
+    await bump_version(session, req.school_id)
     await session.commit()
     await session.refresh(teacher)
   else:
@@ -138,11 +163,13 @@ async def google_login(req: GoogleTokenRequest, session: AsyncSession = Depends(
       teacher.email = email
     if not teacher.name or teacher.name != name:
       teacher.name = name
+      await bump_version(session, teacher.school_id)
     await session.commit()
     await session.refresh(teacher)
   
-  token = create_access_token({"role": "teacher", "teacher_id": teacher.id})
-  return {"token": token, "role": "teacher", "teacher_id": teacher.id, "name": teacher.name}
+  school = await session.get(models.School, teacher.school_id)
+  token = create_access_token({"role": "teacher", "teacher_id": teacher.id, "school_id": teacher.school_id}, school, teacher)
+  return {"token": token, "role": "teacher", "teacher_id": teacher.id, "school_id": teacher.school_id, "name": teacher.name}
 
 
 @router.get("/me")
@@ -166,7 +193,7 @@ async def get_me(session: AsyncSession = Depends(get_session), user=Depends(get_
     "is_homeroom_current": teacher.is_homeroom_current,
     "is_subject_teacher": teacher.is_subject_teacher,
     "duty_role": teacher.duty_role,
-    "grade_history": teacher.grade_history,
+    "grade_history": await load_history_json(session, teacher.id),
   }
 
 
@@ -201,8 +228,8 @@ async def update_me(
   if payload.duty_role is not None:
     teacher.duty_role = payload.duty_role
   if payload.grade_history is not None:
-    # grade_history는 이미 Pydantic에서 검증됨
-    teacher.grade_history = payload.grade_history
+    # grade_history는 이미 Pydantic에서 검증됨 (teacher_grade_history 테이블에 저장)
+    await replace_history(session, teacher.id, parse_history_json(payload.grade_history))
   
   await session.commit()
   await session.refresh(teacher)
@@ -218,6 +245,6 @@ async def update_me(
     "is_homeroom_current": teacher.is_homeroom_current,
     "is_subject_teacher": teacher.is_subject_teacher,
     "duty_role": teacher.duty_role,
-    "grade_history": teacher.grade_history,
+    "grade_history": await load_history_json(session, teacher.id),
   }
 
@@ -0,0 +1,193 @@
+"""
+여러 학교 일괄 배정
+- 학교별 입력을 평범한 레코드로 읽어(load_school_data) 프로세스 풀에서 병렬로 계산(solve_assignment)
+- 계산이 끝나는 학교부터 비동기 세션으로 기존 결과 삭제 → 저장
+  (학교별 조회 → 계산 → 저장은 year_lock 안에서 실행해 같은 학교·연도의 다른 배정과 겹치지 않음)
+- 학교별 단계 소요 시간(조회/계산/저장)과 오류를 결과로 반환
+- 서버에서는 startup에서 만든 프로세스 풀 1개를 공유 (start_batch_pool / shutdown_batch_pool)
+  스레드가 있는 서버 프로세스를 fork하면 자식이 멈출 수 있으므로 spawn으로 작업 프로세스를 띄움
+- API(POST /admin/assign/batch)는 배정 작업(assignment_jobs)으로 실행 (submit_batch_job)
+
+CLI:
+  python -m app.assignment.batch --year 2026 [--schools 1 2 3] [--solver flow] [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+from sqlalchemy import select
+from app.assignment.engine import load_school_data, persist_assignments, record_solver
+from app.assignment.solver import SOLVERS, solve_assignment
+from app.assignment.jobs import year_lock
+from app.core.config import settings
+from app.data_version import bump_version
+from app.db import SessionLocal, mark_written
+from app.models import Assignment, School
+
+logger = logging.getLogger(__name__)
+
+# 서버 전체에서 공유하는 프로세스 풀 (startup에서 생성, 깨지면 다음 실행에서 다시 생성)
+_pool: ProcessPoolExecutor | None = None
+_serving = False
+
+
+def batch_worker_count(workers: Optional[int] = None) -> int:
+  """작업자 수: 인자 → settings.batch_workers → CPU 수"""
+  return max(1, workers or settings.batch_workers or os.cpu_count() or 1)
+
+
+def _new_pool(max_workers: int) -> ProcessPoolExecutor:
+  return ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context("spawn"))
+
+
+def start_batch_pool() -> ProcessPoolExecutor:
+  """공유 프로세스 풀 생성 (작업 프로세스는 처음 계산할 때 띄움)"""
+  global _pool, _serving
+  _serving = True
+  if _pool is None:
+    _pool = _new_pool(batch_worker_count())
+  return _pool
+
+
+async def shutdown_batch_pool():
+  global _pool, _serving
+  _serving = False
+  if _pool is not None:
+    pool, _pool = _pool, None
+    await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+  """작업 프로세스가 죽어 깨진 공유 풀은 버리고 다음 실행에서 새로 만듦"""
+  global _pool
+  if _pool is pool:
+    _pool = None
+  pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _school_ids(school_ids: Optional[Sequence[int]]) -> List[int]:
+  if school_ids:
+    return list(school_ids)
+  async with SessionLocal() as session:
+    return list((await session.execute(select(School.id).order_by(School.id))).scalars().all())
+
+
+async def _solve_school(
+  pool: ProcessPoolExecutor,
+  school_id: int,
+  year: int,
+  solver: str,
+) -> dict:
+  loop = asyncio.get_running_loop()
+  report: Dict[str, object] = {"school_id": school_id, "status": "failed", "timings": {}}
+  timings = report["timings"]
+  try:
+    # 조회 → 계산 → 저장 전체를 잠가 그 사이 다른 배정(/admin/assign, 증분 재배정)의 결과를
+    # 오래된 입력으로 계산한 결과로 덮어쓰지 않도록 함
+    async with year_lock(year, school_id):
+      started = time.perf_counter()
+      async with SessionLocal() as session:
+        data = await load_school_data(session, year, school_id)
+      timings["load"] = round(time.perf_counter() - started, 4)
+
+      started = time.perf_counter()
+      assigned, excluded, logs = await loop.run_in_executor(pool, solve_assignment, data, solver)
+      timings["solve"] = round(time.perf_counter() - started, 4)
+
+      # 기존 결과 삭제 → 저장
+      started = time.perf_counter()
+      async with SessionLocal() as session:
+        await session.execute(
+          Assignment.__table__.delete().where(Assignment.school_id == school_id, Assignment.year == year)
+        )
+        await persist_assignments(session, year, assigned)
+        await record_solver(session, year, school_id, solver)
+        await bump_version(session, school_id, year)
+        await mark_written(session, school_id)
+        await session.commit()
+    timings["persist"] = round(time.perf_counter() - started, 4)
+
+    report.update(status="succeeded", assigned_count=len(assigned), excluded_count=len(excluded))
+  except ValueError as e:
+    report["error"] = str(e)
+  except BrokenProcessPool as e:
+    _discard_pool(pool)
+    report["error"] = f"계산 프로세스가 중단되었습니다: {e}"[:500]
+  except Exception as e:
+    logger.error(f"일괄 배정 실패: school_id={school_id}, year={year}: {e}", exc_info=True)
+    report["error"] = str(e)[:500]
+  return report
+
+
+async def run_batch(
+  year: int,
+  school_ids: Optional[Sequence[int]] = None,
+  solver: str = "flow",
+  workers: Optional[int] = None,
+  progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+) -> dict:
+  """
+  여러 학교를 한 번에 배정 (school_ids가 없으면 전체 학교)
+  학교별 결과: {"school_id", "status", "timings": {"load", "solve", "persist"}, "assigned_count" | "error"}
+  공유 풀이 있으면(서버) 동시에 workers개 학교까지만 계산, 없으면(CLI) 이 실행만의 풀을 만듦
+  progress: 학교 하나가 끝날 때마다 (끝난 학교 수, 전체 학교 수)로 호출
+  """
+  if solver not in SOLVERS:
+    raise ValueError(f"지원하지 않는 배정 방식입니다: {solver}")
+  ids = await _school_ids(school_ids)
+  worker_count = batch_worker_count(workers)
+
+  slots = asyncio.Semaphore(worker_count)
+  done = 0
+
+  async def solve(pool: ProcessPoolExecutor, school_id: int) -> dict:
+    nonlocal done
+    async with slots:
+      report = await _solve_school(pool, school_id, year, solver)
+    done += 1
+    if progress:
+      await progress(done, len(ids))
+    return report
+
+  started = time.perf_counter()
+  if _serving:
+    pool = start_batch_pool()
+    schools = await asyncio.gather(*(solve(pool, school_id) for school_id in ids))
+  else:
+    with _new_pool(worker_count) as pool:
+      schools = await asyncio.gather(*(solve(pool, school_id) for school_id in ids))
+  elapsed = round(time.perf_counter() - started, 4)
+
+  logger.info(f"일괄 배정 완료: year={year}, 학교 {len(ids)}곳, 작업자 {worker_count}, {elapsed}초")
+  return {
+    "year": year,
+    "solver": solver,
+    "workers": worker_count,
+    "elapsed_seconds": elapsed,
+    "succeeded": sum(1 for s in schools if s["status"] == "succeeded"),
+    "failed": sum(1 for s in schools if s["status"] != "succeeded"),
+    "schools": schools,
+  }
+
+
+def main(argv: Optional[Sequence[str]] = None):
+  parser = argparse.ArgumentParser(description="여러 학교 일괄 배정")
+  parser.add_argument("--year", type=int, required=True)
+  parser.add_argument("--schools", type=int, nargs="*", help="학교 id 목록 (생략 시 전체)")
+  parser.add_argument("--solver", choices=SOLVERS, default="flow")
+  parser.add_argument("--workers", type=int, default=None, help="프로세스 수 (기본: BATCH_WORKERS 또는 CPU 수)")
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.INFO)
+  result = asyncio.run(run_batch(args.year, args.schools, args.solver, args.workers))
+  print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+  main()
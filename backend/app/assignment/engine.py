@@ -1,224 +1,216 @@
-from typing import List
+"""
+배정 실행 (DB 어댑터)
+- load_school_data: 학교·연도 입력을 평범한 레코드로 조회
+- solver.solve_phases: 순수 배정 계산 (스레드에서 단계별로 진행)
+- persist_assignments: 결과 일괄 저장
+단계마다 소요 시간·SQL 수·변경 행 수를 RunMetrics로 기록합니다.
+"""
+from typing import Awaitable, Callable, Optional, Tuple
 from app import models
-from app.models import Teacher, GradeSetting, Assignment, Preference
-from app.assignment.rules import (
-  apply_exclusions,
-  apply_priority_rules,
-  apply_rotation,
-  apply_subject_rules,
-  ROLE_POINTS,
+from app.models import DEFAULT_SCHOOL_ID, AdminSetting, Teacher, GradeSetting, Assignment, Preference
+from app.assignment.scoring import score_candidate  # 기존 import 경로 호환
+from app.assignment.solver import (  # PHASES/assign_by_flow/pref_grades: 기존 import 경로 호환
+  PHASES,
+  SOLVERS,
+  assign_by_flow,
+  pref_grades,
+  rule_reference,
+  solve_assignment,
+  solve_phases,
 )
+from app.core.metrics import RunMetrics, profiled, untracked
+from app.data_version import bump_version
+from app.db import dialect_insert, mark_written
+from app.assignment.records import GradeSettingRecord, PreferenceRecord, SchoolData, TeacherRecord
+from app.grade_history import load_repeated_grades, upsert_history
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
+# 단계 보고 콜백: 각 단계(PHASES) 시작 시 단계 이름으로 호출
+ProgressCallback = Callable[[str], Awaitable[None]]
 
-def score_candidate(teacher: Teacher, grade: int, prefs: list[int]) -> tuple[int, dict]:
-  """점수 계산 및 상세 내역 반환"""
-  hope_score = 0
-  hope_detail = ""
-  if prefs:
-    if grade == prefs[0]:
-      hope_score = 10
-      hope_detail = "1지망"
-    elif len(prefs) > 1 and grade == prefs[1]:
-      hope_score = 5
-      hope_detail = "2지망"
-    elif len(prefs) > 2 and grade == prefs[2]:
-      hope_score = 2
-      hope_detail = "3지망"
-  
-  grade_weight = {6: 6, 1: 5, 5: 4, 3: 3, 4: 3, 2: 2}.get(grade, 0)
-  
-  # 역할 점수: duty_role 필드 우선, 없으면 subject/special_conditions 텍스트 매칭
-  role_score = 0
-  role_detail = ""
-  role_text = (teacher.duty_role or "") + " " + (teacher.special_conditions or "") + " " + (teacher.subject or "")
-  for key, val in ROLE_POINTS.items():
-    if key in role_text:
-      if val > role_score:
-        role_score = val
-        role_detail = key
-  
-  penalty = -999 if grade in getattr(teacher, "banned_grades", set()) else 0
-  total_score = hope_score + grade_weight + role_score + penalty
-  
-  details = {
-    "hope_score": hope_score,
-    "hope_detail": hope_detail,
-    "grade_weight": grade_weight,
-    "role_score": role_score,
-    "role_detail": role_detail,
-    "penalty": penalty,
-    "total_score": total_score,
-  }
-  
-  return total_score, details
-
-
-async def run_assignment(session: AsyncSession, year: int):
-  from sqlalchemy import select
-  
-  settings: List[GradeSetting] = (
-    await session.execute(select(GradeSetting).where(GradeSetting.year == year))
-  ).scalars().all()
-  
-  if not settings:
-    raise ValueError(f"{year}년도 학급 설정이 없습니다. 먼저 학급 설정을 입력해주세요.")
-  
-  teachers: List[Teacher] = (
-    await session.execute(select(Teacher))
-  ).scalars().all()
-  
-  if not teachers:
-    raise ValueError("교사 데이터가 없습니다.")
-  
+
+async def persist_assignments(session: AsyncSession, year: int, assigned: list):
+  """
+  배정 결과를 일괄 저장합니다.
+  - Assignment: 다중 행 INSERT ... RETURNING 1회
+  - AssignmentLog: 일괄 INSERT 1회
+  - teacher_grade_history: INSERT ... ON CONFLICT DO UPDATE 1회
+  교사는 id/school_id만 사용하므로 다시 조회하지 않습니다.
+  """
+  if not assigned:
+    return
+  assignment_rows = [
+    {
+      "school_id": t.school_id,
+      "teacher_id": t.id,
+      "year": year,
+      "assigned_grade": g,
+      "assignment_type": atype,
+      "rule_reference": rule_reference(atype, desc),
+      "description": desc,
+    }
+    for t, g, atype, desc in assigned
+  ]
+  # 교사당 배정은 1건이므로 RETURNING 결과를 teacher_id로 매칭
+  # (sort_by_parameter_order는 SQLite에서 행 단위 INSERT로 떨어지므로 사용하지 않음)
+  returned = await session.execute(
+    insert(Assignment).returning(Assignment.id, Assignment.teacher_id),
+    assignment_rows,
+  )
+  assignment_ids = {teacher_id: assignment_id for assignment_id, teacher_id in returned.all()}
+
+  # 로그 기록
+  await session.execute(
+    insert(models.AssignmentLog),
+    [
+      {"assignment_id": assignment_ids[t.id], "step": "assign", "message": desc or atype}
+      for t, g, atype, desc in assigned
+    ],
+  )
+
+  # 학년 이력 기록 (같은 연도 기록이 있으면 갱신)
+  await upsert_history(
+    session,
+    [{"teacher_id": t.id, "year": year, "grade": g} for t, g, atype, desc in assigned],
+  )
+
+
+async def record_solver(session: AsyncSession, year: int, school_id: int, solver: str):
+  """전체 배정에 쓴 방식을 admin_settings에 기록 (증분 재배정이 같은 방식으로 풀도록)"""
+  stmt = dialect_insert(AdminSetting.__table__, session.bind.dialect.name)
+  await session.execute(
+    stmt.on_conflict_do_update(index_elements=["school_id", "year"], set_={"solver": stmt.excluded.solver}),
+    {"school_id": school_id, "year": year, "solver": solver},
+  )
+
+
+def _next_phase(phases) -> Tuple[Optional[str], Optional[tuple]]:
+  """solve_phases를 다음 단계까지 진행 → (단계 이름, None), 끝나면 (None, 결과)"""
+  try:
+    return next(phases), None
+  except StopIteration as done:
+    return None, done.value
+
+
+async def load_school_data(session: AsyncSession, year: int, school_id: int = DEFAULT_SCHOOL_ID) -> SchoolData:
+  """해당 학교·연도의 배정 입력을 평범한 레코드로 조회 (세션 없이 solver에 넘길 수 있음)"""
+  settings = [
+    GradeSettingRecord(grade, required)
+    for grade, required in (
+      await session.execute(
+        select(GradeSetting.grade, GradeSetting.required_homerooms)
+        .where(GradeSetting.school_id == school_id, GradeSetting.year == year)
+      )
+    ).all()
+  ]
+  teachers = [
+    TeacherRecord(*row)
+    for row in (
+      await session.execute(
+        select(
+          Teacher.id,
+          Teacher.school_id,
+          Teacher.name,
+          Teacher.current_grade,
+          Teacher.is_subject_teacher,
+          Teacher.duty_role,
+          Teacher.special_conditions,
+          Teacher.subject,
+        ).where(Teacher.school_id == school_id)
+      )
+    ).all()
+  ]
   prefs_by_teacher = {
-    p.teacher_id: p
-    for p in (
-      await session.execute(select(Preference).where(Preference.year == year))
-    ).scalars().all()
+    row[0]: PreferenceRecord(*row)
+    for row in (
+      await session.execute(
+        select(
+          Preference.teacher_id,
+          Preference.first_choice_grade,
+          Preference.second_choice_grade,
+          Preference.third_choice_grade,
+        ).where(Preference.school_id == school_id, Preference.year == year)
+      )
+    ).all()
   }
+  # 올해 이전 이력 기준 (같은 연도를 다시 배정해도 직전 결과가 순환 규칙에 섞이지 않도록)
+  repeated_grades = await load_repeated_grades(session, year, school_id=school_id)
+  return SchoolData(school_id, year, teachers, settings, prefs_by_teacher, repeated_grades)
 
-  kept, excluded, logs_all = apply_exclusions(teachers, year)
-  # 희망 정보를 teacher 객체에 힌트로 붙여 우선배정 활용
-  for t in kept:
-    pref = prefs_by_teacher.get(t.id)
-    if pref:
-      t.preferred_grade_primary = pref.first_choice_grade
-      t.preferred_grade_secondary = pref.second_choice_grade
-      t.preferred_grade_third = pref.third_choice_grade
-  assigned, remaining, pri_logs = apply_priority_rules(kept, settings, year)
-  logs_all.extend(pri_logs)
-
-  remaining = apply_rotation(remaining, prefs_by_teacher)
-  remaining = apply_subject_rules(remaining)
-
-  # 슬롯 풀 생성
-  slots: List[int] = []
-  for s in settings:
-    for _ in range(s.required_homerooms):
-      slots.append(s.grade)
-  
-  if not slots:
-    raise ValueError("필요 담임 수가 0입니다. 학급 설정에서 필요 담임 수를 입력해주세요.")
-
-  # 1/2/3 지망 우선 배정
-  for choice_idx in [0, 1, 2]:
-    still = []
-    for t in remaining:
-      prefs = []
-      pref = prefs_by_teacher.get(t.id)
-      if pref:
-        prefs = [
-          pref.first_choice_grade,
-          pref.second_choice_grade,
-          pref.third_choice_grade,
-        ]
-        prefs = [p for p in prefs if p is not None]
-      if choice_idx < len(prefs) and prefs[choice_idx] in slots and prefs[choice_idx] not in getattr(t, "banned_grades", set()):
-        g = prefs[choice_idx]
-        hope_rank = f"{choice_idx+1}지망"
-        desc = f"{hope_rank} 반영 (희망 학년: {g}학년)"
-        assigned.append((t, g, hope_rank, desc))
-        slots.remove(g)
-      else:
-        still.append(t)
-    remaining = still
-
-  # 남은 슬롯 점수 기반 배정 (greedy)
-  scored = []
-  for t in remaining:
-    prefs = []
-    pref = prefs_by_teacher.get(t.id)
-    if pref:
-      prefs = [
-        pref.first_choice_grade,
-        pref.second_choice_grade,
-        pref.third_choice_grade,
-      ]
-      prefs = [p for p in prefs if p is not None]
-    best = None
-    best_details = None
-    for g in set(slots):
-      sc, details = score_candidate(t, g, prefs)
-      if best is None or sc > best[1]:
-        best = (g, sc)
-        best_details = details
-    if best:
-      scored.append((t, best[0], best[1], best_details))
-  scored.sort(key=lambda x: x[2], reverse=True)
-  for t, g, sc, details in scored:
-    if g in slots:
-      # 점수 상세 내역 구성
-      desc_parts = []
-      if details["hope_detail"]:
-        desc_parts.append(f"희망: {details['hope_detail']}({details['hope_score']}점)")
-      desc_parts.append(f"학년가중치: {details['grade_weight']}점")
-      if details["role_detail"]:
-        desc_parts.append(f"역할: {details['role_detail']}({details['role_score']}점)")
-      desc_parts.append(f"총점: {details['total_score']}점")
-      desc = " | ".join(desc_parts)
-      assigned.append((t, g, "조정", desc))
-      slots.remove(g)
-
-  # DB 저장 및 grade_history 업데이트
-  import json
-  for t, g, atype, desc in assigned:
-    # rule_reference 설정
-    rule_ref = None
-    if "규정우선" in atype:
-      if "제12조④" in (desc or ""):
-        rule_ref = "제12조④ (특수 사유 우선 배정)"
-      elif "제12조②" in (desc or ""):
-        rule_ref = "제12조② (역할 우선 배정)"
-      elif "제13조" in (desc or ""):
-        rule_ref = "제13조 (배정 제외)"
-    elif "1지망" in atype or "2지망" in atype or "3지망" in atype:
-      rule_ref = "제11조 (희망 학년 반영)"
-    elif "조정" in atype:
-      rule_ref = "제12조① (학년 순환 원칙) + 점수 기반 조정"
-    
-    a = Assignment(
-      teacher_id=t.id,
-      year=year,
-      assigned_grade=g,
-      assignment_type=atype,
-      rule_reference=rule_ref,
-      description=desc,
-    )
-    session.add(a)
-    await session.flush()
-    # 로그 기록
-    log_msg = desc or atype
-    session.add(
-      models.AssignmentLog(
-        assignment_id=a.id,
-        step="assign",
-        message=log_msg,
-      )
-    )
-    
-    # grade_history 업데이트 (배정 완료 후 이력 추가)
-    teacher_stmt = select(Teacher).where(Teacher.id == t.id)
-    teacher_res = await session.execute(teacher_stmt)
-    teacher_obj = teacher_res.scalars().first()
-    if teacher_obj:
-      history = []
-      if teacher_obj.grade_history:
-        try:
-          history = json.loads(teacher_obj.grade_history) if isinstance(teacher_obj.grade_history, str) else teacher_obj.grade_history
-        except (json.JSONDecodeError, TypeError):
-          history = []
-      # 중복 체크: 같은 연도에 이미 배정 기록이 있으면 업데이트, 없으면 추가
-      found = False
-      for entry in history:
-        if isinstance(entry, dict) and entry.get("year") == year:
-          entry["grade"] = g
-          found = True
+
+async def run_assignment(
+  session: AsyncSession,
+  year: int,
+  solver: str = "greedy",
+  progress: Optional[ProgressCallback] = None,
+  school_id: int = DEFAULT_SCHOOL_ID,
+  metrics: Optional[RunMetrics] = None,
+  profile: bool = False,
+):
+  """
+  배정 실행 후 결과 저장 (school_id 학교의 데이터만 조회)
+  progress가 주어지면 각 단계(PHASES) 시작 시 단계 이름으로 호출합니다.
+  metrics를 넘기면 실행이 끝난 뒤 metrics.result로 계측 결과를 볼 수 있고,
+  profile=True면 cProfile 결과를 저장합니다 (metrics.profile_path).
+  """
+  if solver not in SOLVERS:
+    raise ValueError(f"지원하지 않는 배정 방식입니다: {solver}")
+  metrics = metrics or RunMetrics(school_id=school_id, year=year, solver=solver)
+
+  async def enter(phase: str):
+    metrics.phase(phase)
+    if progress:
+      # 진행률 기록 쿼리는 단계 계측에서 제외
+      with untracked():
+        await progress(phase)
+
+  try:
+    with profiled(metrics, profile):
+      metrics.phase("load")
+      data = await load_school_data(session, year, school_id)
+      metrics.count(teachers=len(data.teachers), preferences=len(data.prefs_by_teacher))
+      phases = solve_phases(data, solver)
+      while True:
+        # 계산은 스레드에서 진행해 이벤트 루프(다른 요청, 작업 진행률 기록)를 막지 않음
+        # cProfile은 호출한 스레드만 기록하므로 profile=True면 이 스레드에서 계산
+        phase, result = _next_phase(phases) if profile else await run_in_threadpool(_next_phase, phases)
+        if phase is None:
+          assigned, excluded, logs_all = result
           break
-      if not found:
-        history.append({"year": year, "grade": g})
-      teacher_obj.grade_history = json.dumps(history, ensure_ascii=False)
-  
-  await session.commit()
+        await enter(phase)
+
+      await enter("persistence")
+      await persist_assignments(session, year, assigned)
+      await record_solver(session, year, school_id, solver)
+      await bump_version(session, school_id, year)
+      await mark_written(session, school_id)
+      await session.commit()
+  except Exception:
+    metrics.finish("failed")
+    raise
+  metrics.count(assigned=len(assigned), excluded=len(excluded))
+  metrics.finish()
   return assigned, excluded, logs_all
 
+
+async def rerun_assignment(
+  session: AsyncSession,
+  year: int,
+  solver: str = "greedy",
+  progress: Optional[ProgressCallback] = None,
+  school_id: int = DEFAULT_SCHOOL_ID,
+  metrics: Optional[RunMetrics] = None,
+  profile: bool = False,
+):
+  """해당 학교·연도의 기존 배정 결과를 삭제하고 다시 배정"""
+  await session.execute(
+    Assignment.__table__.delete().where(Assignment.school_id == school_id, Assignment.year == year)
+  )
+  await bump_version(session, school_id, year)
+  await mark_written(session, school_id)
+  await session.commit()
+  return await run_assignment(
+    session, year, solver=solver, progress=progress, school_id=school_id, metrics=metrics, profile=profile
+  )
@@ -0,0 +1,114 @@
+"""
+최소비용 유량(min-cost flow) 기반 학년 배정 솔버
+
+source → 교사(용량 1) → 학년(용량 = 필요 담임 수) → sink 형태의 이분 그래프를
+successive shortest path 방식으로 풉니다.
+
+학년 수(G)는 최대 6개로 매우 작기 때문에, 교사 노드를 그래프에서 직접 다루지 않고
+학년 노드 사이의 잔여 간선으로 압축합니다.
+- source → 학년 b : 미배정 교사 중 cost(t, b) 최솟값
+- 학년 a → 학년 b : a에 배정된 교사 중 cost(t, b) - cost(t, a) 최솟값
+각 최솟값은 (lazy deletion) 힙으로 유지하므로, 교사 T명 기준 전체 비용은
+O(T · G² · log T) 정도이며 수천 명 규모에서도 빠르게 동작합니다.
+"""
+import heapq
+from typing import List, Optional, Sequence
+
+
+def solve_min_cost_assignment(
+  costs: Sequence[Sequence[float]],
+  capacities: Sequence[int],
+) -> List[Optional[int]]:
+  """
+  교사별 학년 비용 행렬(costs[t][g])과 학년별 용량(capacities[g])으로
+  총비용이 최소인 최대 배정을 구합니다.
+
+  Returns:
+    교사 인덱스별 배정된 학년 인덱스 (배정되지 않으면 None)
+  """
+  n_teachers = len(costs)
+  n_grades = len(capacities)
+  assign: List[Optional[int]] = [None] * n_teachers
+  cap_left = list(capacities)
+  if n_teachers == 0 or n_grades == 0:
+    return assign
+
+  # 미배정 교사 힙: free_heaps[b] = [(cost(t, b), t), ...]
+  free_heaps = [
+    [(costs[t][b], t) for t in range(n_teachers)] for b in range(n_grades)
+  ]
+  for h in free_heaps:
+    heapq.heapify(h)
+  # 이동 힙: move_heaps[a][b] = [(cost(t, b) - cost(t, a), t), ...] (t는 a에 배정됨)
+  move_heaps = [[[] for _ in range(n_grades)] for _ in range(n_grades)]
+
+  def peek_free(b: int):
+    h = free_heaps[b]
+    while h and assign[h[0][1]] is not None:
+      heapq.heappop(h)
+    return h[0] if h else None
+
+  def peek_move(a: int, b: int):
+    h = move_heaps[a][b]
+    while h and assign[h[0][1]] != a:
+      heapq.heappop(h)
+    return h[0] if h else None
+
+  def place(t: int, g: int):
+    assign[t] = g
+    row = costs[t]
+    for b in range(n_grades):
+      if b != g:
+        heapq.heappush(move_heaps[g][b], (row[b] - row[g], t))
+
+  inf = float("inf")
+  remaining_flow = min(n_teachers, sum(cap_left))
+  while remaining_flow > 0:
+    # 압축 그래프에서 source로부터의 최단 거리 (Bellman-Ford, 노드 G개)
+    dist = [inf] * n_grades
+    # pred[b] = (이전 학년 또는 -1(source), 이동하는 교사)
+    pred: List[Optional[tuple]] = [None] * n_grades
+    for b in range(n_grades):
+      top = peek_free(b)
+      if top is not None:
+        dist[b] = top[0]
+        pred[b] = (-1, top[1])
+
+    move_edges = []
+    for a in range(n_grades):
+      for b in range(n_grades):
+        if a != b:
+          top = peek_move(a, b)
+          if top is not None:
+            move_edges.append((a, b, top[0], top[1]))
+
+    for _ in range(n_grades - 1):
+      changed = False
+      for a, b, w, t in move_edges:
+        if dist[a] + w < dist[b]:
+          dist[b] = dist[a] + w
+          pred[b] = (a, t)
+          changed = True
+      if not changed:
+        break
+
+    # 여유 용량이 있는 학년 중 최단 거리 학년 선택
+    end = None
+    for g in range(n_grades):
+      if cap_left[g] > 0 and dist[g] < inf and (end is None or dist[g] < dist[end]):
+        end = g
+    if end is None:
+      break
+
+    # 경로를 거꾸로 따라가며 교사 이동/배정
+    cap_left[end] -= 1
+    g = end
+    while True:
+      prev, t = pred[g]
+      place(t, g)
+      if prev == -1:
+        break
+      g = prev
+    remaining_flow -= 1
+
+  return assign
@@ -0,0 +1,254 @@
+"""
+증분 재배정
+일부 교사의 희망(또는 정보)이 바뀌었을 때 전체를 다시 계산하지 않고,
+영향받는 학년 풀과 그 학년으로 옮겨 올 수 있는 교사만 다시 풀어서
+저장된 배정 결과와 달라진 행만 기록합니다.
+
+- 영향 학년: 변경 교사의 기존 배정 학년 + 새 1/2/3지망 학년 + 빈 자리가 남은 학년
+- 재배정 대상: 변경 교사 + 영향 학년에 (규정우선이 아닌 방식으로) 배정된 교사
+- 각 영향 학년의 자리 수 = 필요 담임 수 - 재배정 대상이 아닌 교사가 차지한 자리
+- 재배정은 마지막 전체 배정과 같은 방식(admin_settings.solver, 기록이 없으면 flow)으로 풀어 관리자가 고른 방식을 유지
+"""
+import logging
+from typing import Dict, Iterable, List, Set
+from sqlalchemy import select, delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.assignment.solver import assign_slots, pref_grades, rule_reference
+from app.assignment.jobs import year_lock
+from app.assignment.rules import (
+  apply_exclusions,
+  apply_priority_rules,
+  apply_rotation,
+  apply_subject_rules,
+)
+from app.data_version import bump_version
+from app.db import SessionLocal, mark_written
+from app.grade_history import load_repeated_grades, upsert_history
+from app.models import (
+  DEFAULT_SCHOOL_ID, AdminSetting, Assignment, AssignmentLog, GradeSetting, Preference, Teacher, TeacherGradeHistory,
+)
+
+logger = logging.getLogger(__name__)
+
+# 슬롯을 차지하지 않는 배정 유형 (우선 배정은 학년 정원과 무관하게 고정)
+PRIORITY_TYPE = "규정우선"
+# 배정 방식 기록이 없는 기존 결과의 재배정 방식
+DEFAULT_REASSIGN_SOLVER = "flow"
+
+
+async def reassign_incremental(
+  session: AsyncSession,
+  year: int,
+  teacher_ids: Iterable[int],
+  school_id: int = DEFAULT_SCHOOL_ID,
+) -> dict:
+  """변경된 교사 기준으로 영향받는 학년만 재배정하고 변경분만 저장 (school_id 학교 안에서)"""
+  stored: Dict[int, Assignment] = {
+    a.teacher_id: a
+    for a in (
+      await session.execute(
+        select(Assignment).where(Assignment.school_id == school_id, Assignment.year == year)
+      )
+    ).scalars().all()
+  }
+  if not stored:
+    raise ValueError(f"{year}년도 배정 결과가 없습니다. 먼저 전체 배정을 실행해주세요.")
+
+  # 다른 학교 교사 id는 무시
+  changed: Set[int] = set(
+    (
+      await session.execute(
+        select(Teacher.id).where(Teacher.school_id == school_id, Teacher.id.in_(set(teacher_ids)))
+      )
+    ).scalars().all()
+  )
+
+  settings: List[GradeSetting] = (
+    await session.execute(
+      select(GradeSetting).where(GradeSetting.school_id == school_id, GradeSetting.year == year)
+    )
+  ).scalars().all()
+  required = {s.grade: s.required_homerooms for s in settings}
+
+  changed_prefs = {
+    p.teacher_id: p
+    for p in (
+      await session.execute(
+        select(Preference).where(Preference.year == year, Preference.teacher_id.in_(changed))
+      )
+    ).scalars().all()
+  }
+
+  # 학년별 현재 점유 수 (규정우선 제외)
+  occupied: Dict[int, int] = {}
+  for a in stored.values():
+    if a.assignment_type != PRIORITY_TYPE:
+      occupied[a.assigned_grade] = occupied.get(a.assigned_grade, 0) + 1
+
+  affected: Set[int] = {g for g, n in required.items() if n > occupied.get(g, 0)}
+  for teacher_id in changed:
+    if teacher_id in stored:
+      affected.add(stored[teacher_id].assigned_grade)
+    affected.update(pref_grades(changed_prefs.get(teacher_id)))
+  affected &= set(required)
+
+  pool_ids = set(changed) | {
+    a.teacher_id
+    for a in stored.values()
+    if a.assigned_grade in affected and a.assignment_type != PRIORITY_TYPE
+  }
+
+  teachers: List[Teacher] = (
+    await session.execute(select(Teacher).where(Teacher.id.in_(pool_ids)))
+  ).scalars().all()
+  prefs_by_teacher = {
+    p.teacher_id: p
+    for p in (
+      await session.execute(
+        select(Preference).where(Preference.year == year, Preference.teacher_id.in_(pool_ids))
+      )
+    ).scalars().all()
+  }
+
+  # 전체 배정과 같은 규칙 적용
+  kept, excluded, logs = apply_exclusions(teachers, year)
+  for t in kept:
+    pref = prefs_by_teacher.get(t.id)
+    if pref:
+      t.preferred_grade_primary = pref.first_choice_grade
+      t.preferred_grade_secondary = pref.second_choice_grade
+      t.preferred_grade_third = pref.third_choice_grade
+  assigned, remaining, pri_logs = apply_priority_rules(kept, settings, year)
+  repeated_grades = await load_repeated_grades(session, year, pool_ids)
+  remaining = apply_rotation(remaining, prefs_by_teacher, repeated_grades)
+  remaining = apply_subject_rules(remaining)
+
+  # 재배정 대상이 아닌 교사가 차지한 자리를 뺀 나머지만 슬롯으로 사용
+  outside = {g: 0 for g in affected}
+  for a in stored.values():
+    if a.teacher_id not in pool_ids and a.assignment_type != PRIORITY_TYPE and a.assigned_grade in outside:
+      outside[a.assigned_grade] += 1
+  slots: List[int] = []
+  for g in sorted(affected):
+    slots.extend([g] * max(0, required[g] - outside[g]))
+  if slots:
+    solver = (
+      await session.execute(
+        select(AdminSetting.solver).where(AdminSetting.school_id == school_id, AdminSetting.year == year)
+      )
+    ).scalar()
+    assigned.extend(assign_slots(remaining, slots, prefs_by_teacher, solver or DEFAULT_REASSIGN_SOLVER))
+
+  return await _apply_diff(session, year, stored, pool_ids, assigned, sorted(affected), school_id)
+
+
+async def _apply_diff(
+  session: AsyncSession,
+  year: int,
+  stored: Dict[int, Assignment],
+  pool_ids: Set[int],
+  assigned: list,
+  affected: List[int],
+  school_id: int = DEFAULT_SCHOOL_ID,
+) -> dict:
+  """재배정 결과와 저장된 결과를 비교해 달라진 행만 INSERT/UPDATE/DELETE"""
+  new_rows: Dict[int, dict] = {
+    t.id: {
+      "school_id": t.school_id,
+      "teacher_id": t.id,
+      "year": year,
+      "assigned_grade": g,
+      "assignment_type": atype,
+      "rule_reference": rule_reference(atype, desc),
+      "description": desc,
+    }
+    for t, g, atype, desc in assigned
+  }
+
+  inserts, updates, deletes = [], [], []
+  unchanged = 0
+  for teacher_id in pool_ids:
+    old = stored.get(teacher_id)
+    new = new_rows.get(teacher_id)
+    if old and not new:
+      deletes.append(old.id)
+    elif new and not old:
+      inserts.append(new)
+    elif old and new:
+      if (old.assigned_grade, old.assignment_type, old.description) == (
+        new["assigned_grade"], new["assignment_type"], new["description"]
+      ):
+        unchanged += 1
+      else:
+        updates.append({"id": old.id, **new})
+
+  log_rows = []
+  if inserts:
+    returned = await session.execute(
+      insert(Assignment).returning(Assignment.id, Assignment.teacher_id), inserts
+    )
+    new_ids = {teacher_id: assignment_id for assignment_id, teacher_id in returned.all()}
+    log_rows.extend(
+      {"assignment_id": new_ids[r["teacher_id"]], "step": "reassign", "message": r["description"] or r["assignment_type"]}
+      for r in inserts
+    )
+  if updates:
+    await session.execute(update(Assignment), updates)
+    log_rows.extend(
+      {"assignment_id": r["id"], "step": "reassign", "message": r["description"] or r["assignment_type"]}
+      for r in updates
+    )
+  if deletes:
+    deleted = set(deletes)
+    await session.execute(delete(AssignmentLog).where(AssignmentLog.assignment_id.in_(deletes)))
+    await session.execute(delete(Assignment).where(Assignment.id.in_(deletes)))
+    await session.execute(
+      delete(TeacherGradeHistory).where(
+        TeacherGradeHistory.year == year,
+        TeacherGradeHistory.teacher_id.in_([tid for tid, a in stored.items() if a.id in deleted]),
+      )
+    )
+  if log_rows:
+    await session.execute(insert(AssignmentLog), log_rows)
+  await upsert_history(
+    session,
+    [
+      {"teacher_id": r["teacher_id"], "year": year, "grade": r["assigned_grade"]}
+      for r in inserts + updates
+    ],
+  )
+  if inserts or updates or deletes:
+    await bump_version(session, school_id, year)
+    await mark_written(session, school_id)
+  await session.commit()
+
+  return {
+    "year": year,
+    "grades": affected,
+    "pool_size": len(pool_ids),
+    "inserted": len(inserts),
+    "updated": len(updates),
+    "deleted": len(deletes),
+    "unchanged": unchanged,
+  }
+
+
+async def reassign_in_background(year: int, teacher_ids: List[int], school_id: int = DEFAULT_SCHOOL_ID):
+  """
+  희망 제출 후 백그라운드 증분 재배정
+  해당 학교·연도에 배정 결과가 있을 때만 실행하며, 같은 학교·연도의 전체 배정과 겹치지 않도록 잠금
+  """
+  async with year_lock(year, school_id):
+    async with SessionLocal() as session:
+      has_result = (
+        await session.execute(
+          select(Assignment.id).where(Assignment.school_id == school_id, Assignment.year == year).limit(1)
+        )
+      ).first()
+      if not has_result:
+        return
+      try:
+        result = await reassign_incremental(session, year, teacher_ids, school_id=school_id)
+        logger.info(f"증분 재배정 완료: {result}")
+      except Exception as e:
+        logger.error(f"증분 재배정 실패: year={year}, teacher_ids={teacher_ids}: {e}", exc_info=True)
@@ -0,0 +1,269 @@
+"""
+백그라운드 배정 작업
+- POST /admin/assign/jobs 요청은 작업(assignment_jobs) 행만 만들고 바로 반환
+- 실제 배정은 프로세스 내 워커(동시 실행 수 = settings.assign_job_workers)가 별도 세션으로 수행
+- 단계(PHASES)가 바뀔 때마다 진행률과 단계별 소요 시간을 작업 행에 기록
+- 끝나면 단계별 쿼리 수/변경 행 수 등 계측 결과(RunMetrics)를 작업 행 metrics에 저장
+- 여러 학교 일괄 배정(submit_batch_job)도 같은 작업 행으로 실행 (phase="batch", 진행률 = 끝난 학교 비율,
+  끝나면 학교별 결과를 metrics에 저장)
+- 작업이 끝날 때까지 heartbeat_at을 주기적으로 갱신하고, 워커가 죽거나 재시작되어 갱신이 끊긴
+  queued/running 작업은 시작 시와 주기적으로 실패 처리 (fail_stale_jobs)
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import func, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.assignment.engine import rerun_assignment
+from app.assignment.solver import PHASES
+from app.core.config import settings
+from app.core.metrics import RunMetrics, untracked
+from app.db import SessionLocal, engine
+from app.models import DEFAULT_SCHOOL_ID, AssignmentJob
+
+logger = logging.getLogger(__name__)
+
+# 같은 학교·연도의 배정(삭제 → 재배정)이 겹치지 않도록 (학교, 연도)별 잠금 (프로세스 안)
+_year_locks: Dict[Tuple[int, int], asyncio.Lock] = defaultdict(asyncio.Lock)
+_worker_slots: asyncio.Semaphore | None = None
+# 실행 중인 작업 태스크 참조 (GC 방지)
+_tasks: Set[asyncio.Task] = set()
+_sweeper: asyncio.Task | None = None
+# 이 주기 수만큼 heartbeat가 없으면 작업을 맡은 워커가 없는 것으로 봄
+STALE_HEARTBEATS = 3
+
+
+@asynccontextmanager
+async def year_lock(year: int, school_id: int = DEFAULT_SCHOOL_ID) -> AsyncIterator[None]:
+  """
+  같은 학교·연도의 배정을 한 번에 하나만 실행
+  PostgreSQL이면 (학교, 연도) advisory lock도 잡아 다른 워커/서버의 배정과도 겹치지 않음
+  (잠금용 연결의 트랜잭션이 끝나면 풀리므로 트랜잭션 모드 pgbouncer에서도 안전)
+  같은 프로세스의 대기자는 asyncio.Lock에서 기다려 연결을 잡고 있지 않음
+  """
+  async with _year_locks[(school_id, year)]:
+    if engine.dialect.name == "postgresql":
+      async with engine.connect() as conn:
+        await conn.execute(
+          text("SELECT pg_advisory_xact_lock(:school_id, :year)"), {"school_id": school_id, "year": year}
+        )
+        yield
+    else:
+      yield
+
+
+def _slots() -> asyncio.Semaphore:
+  global _worker_slots
+  if _worker_slots is None:
+    _worker_slots = asyncio.Semaphore(max(1, settings.assign_job_workers))
+  return _worker_slots
+
+
+async def submit_assignment_job(
+  session: AsyncSession, year: int, solver: str, school_id: int = DEFAULT_SCHOOL_ID, profile: bool = False
+) -> AssignmentJob:
+  """작업 행 생성 후 워커에 등록 (profile=True면 cProfile 결과 경로를 metrics에 기록)"""
+  job = AssignmentJob(
+    school_id=school_id, year=year, solver=solver, status="queued", progress=0, heartbeat_at=datetime.utcnow()
+  )
+  session.add(job)
+  await session.commit()
+  await session.refresh(job)
+
+  task = asyncio.create_task(_run_job(job.id, year, solver, school_id, profile))
+  _tasks.add(task)
+  task.add_done_callback(_tasks.discard)
+  return job
+
+
+async def submit_batch_job(
+  session: AsyncSession,
+  year: int,
+  solver: str,
+  school_ids: Optional[Sequence[int]] = None,
+  workers: Optional[int] = None,
+  school_id: int = DEFAULT_SCHOOL_ID,
+) -> AssignmentJob:
+  """여러 학교 일괄 배정 작업 행 생성 후 실행 등록 (작업 행은 요청한 관리자의 학교로 조회)"""
+  job = AssignmentJob(
+    school_id=school_id, year=year, solver=solver, status="queued", progress=0, heartbeat_at=datetime.utcnow()
+  )
+  session.add(job)
+  await session.commit()
+  await session.refresh(job)
+
+  task = asyncio.create_task(_run_batch_job(job.id, year, solver, list(school_ids or []), workers))
+  _tasks.add(task)
+  task.add_done_callback(_tasks.discard)
+  return job
+
+
+async def _update_job(job_id: int, **values):
+  async with SessionLocal() as session:
+    job = await session.get(AssignmentJob, job_id)
+    if job:
+      for key, value in values.items():
+        setattr(job, key, value)
+      await session.commit()
+
+
+async def _heartbeat(job_id: int):
+  while True:
+    await asyncio.sleep(settings.assign_job_heartbeat_seconds)
+    try:
+      await _update_job(job_id, heartbeat_at=datetime.utcnow())
+    except Exception as e:
+      logger.warning(f"배정 작업 heartbeat 기록 실패: job_id={job_id}: {e}")
+
+
+async def _run_job(job_id: int, year: int, solver: str, school_id: int = DEFAULT_SCHOOL_ID, profile: bool = False):
+  # 요청에서 띄운 작업이므로 요청의 SQL 집계와 분리
+  with untracked():
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+      await _execute_job(job_id, year, solver, school_id, profile)
+    finally:
+      heartbeat.cancel()
+
+
+async def _run_batch_job(job_id: int, year: int, solver: str, school_ids: List[int], workers: Optional[int]):
+  # batch가 year_lock을 쓰므로 여기서 가져옴 (순환 import 방지)
+  from app.assignment.batch import run_batch
+
+  with untracked():
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+      async def on_school(done: int, total: int):
+        await _update_job(job_id, progress=int(done * 100 / total))
+
+      await _update_job(job_id, status="running", phase="batch", started_at=datetime.utcnow())
+      try:
+        result = await run_batch(year, school_ids or None, solver=solver, workers=workers, progress=on_school)
+        await _update_job(
+          job_id,
+          status="succeeded",
+          phase="done",
+          progress=100,
+          metrics=json.dumps(result, ensure_ascii=False),
+          assigned_count=sum(s.get("assigned_count", 0) for s in result["schools"]),
+          finished_at=datetime.utcnow(),
+        )
+      except Exception as e:
+        if not isinstance(e, ValueError):
+          logger.error(f"일괄 배정 작업 실패: job_id={job_id}, year={year}: {e}", exc_info=True)
+        await _update_job(job_id, status="failed", error=str(e)[:500], finished_at=datetime.utcnow())
+    finally:
+      heartbeat.cancel()
+
+
+async def _execute_job(job_id: int, year: int, solver: str, school_id: int, profile: bool):
+  async with _slots(), year_lock(year, school_id):
+    run = RunMetrics(school_id=school_id, year=year, solver=solver, job_id=job_id)
+
+    async def on_phase(phase: str):
+      await _update_job(
+        job_id,
+        phase=phase,
+        progress=int(PHASES.index(phase) * 100 / len(PHASES)),
+        phase_timings=json.dumps(run.timings()),
+      )
+
+    await _update_job(job_id, status="running", started_at=datetime.utcnow())
+    try:
+      async with SessionLocal() as session:
+        assigned, excluded, logs = await rerun_assignment(
+          session, year, solver=solver, progress=on_phase, school_id=school_id, metrics=run, profile=profile
+        )
+      await _update_job(
+        job_id,
+        status="succeeded",
+        phase="done",
+        progress=100,
+        phase_timings=json.dumps(run.timings()),
+        metrics=json.dumps(run.result, ensure_ascii=False),
+        assigned_count=len(assigned),
+        finished_at=datetime.utcnow(),
+      )
+    except Exception as e:
+      if not isinstance(e, ValueError):
+        logger.error(f"배정 작업 실패: job_id={job_id}, year={year}: {e}", exc_info=True)
+      await _update_job(
+        job_id,
+        status="failed",
+        phase_timings=json.dumps(run.timings()),
+        metrics=json.dumps(run.result, ensure_ascii=False) if run.result else None,
+        error=str(e)[:500],
+        finished_at=datetime.utcnow(),
+      )
+
+
+
+async def fail_stale_jobs() -> int:
+  """heartbeat가 끊긴 queued/running 작업을 실패로 표시하고 건수 반환"""
+  stale_before = datetime.utcnow() - timedelta(seconds=settings.assign_job_heartbeat_seconds * STALE_HEARTBEATS)
+  now = datetime.utcnow()
+  async with SessionLocal() as session:
+    result = await session.execute(
+      update(AssignmentJob)
+      .where(
+        AssignmentJob.status.in_(("queued", "running")),
+        func.coalesce(AssignmentJob.heartbeat_at, AssignmentJob.created_at) < stale_before,
+      )
+      .values(status="failed", error="작업을 실행하던 서버가 중단되었습니다.", finished_at=now)
+    )
+    await session.commit()
+  if result.rowcount:
+    logger.warning(f"중단된 배정 작업 {result.rowcount}건을 실패로 표시")
+  return result.rowcount
+
+
+async def _sweep_loop():
+  while True:
+    try:
+      await fail_stale_jobs()
+    except Exception as e:
+      logger.error(f"중단된 배정 작업 정리 실패: {e}", exc_info=True)
+    await asyncio.sleep(settings.assign_job_heartbeat_seconds * STALE_HEARTBEATS)
+
+
+def start_stale_job_sweeper():
+  """시작 시 한 번, 이후 주기적으로 중단된 작업 정리 (워커마다 실행해도 같은 결과)"""
+  global _sweeper
+  if _sweeper is None:
+    _sweeper = asyncio.create_task(_sweep_loop())
+
+
+async def stop_stale_job_sweeper():
+  global _sweeper
+  if _sweeper is not None:
+    _sweeper.cancel()
+    try:
+      await _sweeper
+    except asyncio.CancelledError:
+      pass
+    _sweeper = None
+
+def job_to_dict(job: AssignmentJob) -> dict:
+  end = job.finished_at or datetime.utcnow()
+  elapsed = (end - job.started_at).total_seconds() if job.started_at else None
+  return {
+    "id": job.id,
+    "school_id": job.school_id,
+    "year": job.year,
+    "solver": job.solver,
+    "status": job.status,
+    "phase": job.phase,
+    "progress": job.progress,
+    "phase_timings": json.loads(job.phase_timings) if job.phase_timings else {},
+    "metrics": json.loads(job.metrics) if job.metrics else None,
+    "assigned_count": job.assigned_count,
+    "error": job.error,
+    "created_at": job.created_at,
+    "started_at": job.started_at,
+    "finished_at": job.finished_at,
+    "elapsed_seconds": elapsed,
+  }
@@ -0,0 +1,96 @@
+"""
+배정 계산용 평범한 데이터 레코드
+ORM 객체 대신 이 레코드로 계산하면 세션 없이 풀 수 있고,
+프로세스 풀 작업자에게 pickle로 넘길 수 있습니다.
+"""
+from typing import Dict, List, Optional, Set
+
+
+class TeacherRecord:
+  """배정 규칙이 읽는 교사 필드 + 계산 중 붙는 힌트(희망 학년, 배정 금지 학년)"""
+  __slots__ = (
+    "id",
+    "school_id",
+    "name",
+    "current_grade",
+    "is_subject_teacher",
+    "duty_role",
+    "special_conditions",
+    "subject",
+    "preferred_grade_primary",
+    "preferred_grade_secondary",
+    "preferred_grade_third",
+    "banned_grades",
+  )
+
+  def __init__(
+    self,
+    id: int,
+    school_id: int = 1,
+    name: str = "",
+    current_grade: Optional[int] = None,
+    is_subject_teacher: bool = False,
+    duty_role: Optional[str] = None,
+    special_conditions: Optional[str] = None,
+    subject: Optional[str] = None,
+  ):
+    self.id = id
+    self.school_id = school_id
+    self.name = name
+    self.current_grade = current_grade
+    self.is_subject_teacher = is_subject_teacher
+    self.duty_role = duty_role
+    self.special_conditions = special_conditions
+    self.subject = subject
+    self.preferred_grade_primary: Optional[int] = None
+    self.preferred_grade_secondary: Optional[int] = None
+    self.preferred_grade_third: Optional[int] = None
+    self.banned_grades: Set[int] = set()
+
+  def __repr__(self):
+    return f"TeacherRecord(id={self.id}, name={self.name!r})"
+
+
+class PreferenceRecord:
+  __slots__ = ("teacher_id", "first_choice_grade", "second_choice_grade", "third_choice_grade")
+
+  def __init__(
+    self,
+    teacher_id: int,
+    first_choice_grade: Optional[int] = None,
+    second_choice_grade: Optional[int] = None,
+    third_choice_grade: Optional[int] = None,
+  ):
+    self.teacher_id = teacher_id
+    self.first_choice_grade = first_choice_grade
+    self.second_choice_grade = second_choice_grade
+    self.third_choice_grade = third_choice_grade
+
+
+class GradeSettingRecord:
+  __slots__ = ("grade", "required_homerooms")
+
+  def __init__(self, grade: int, required_homerooms: int):
+    self.grade = grade
+    self.required_homerooms = required_homerooms
+
+
+class SchoolData:
+  """한 학교·연도의 배정 입력 전체"""
+  __slots__ = ("school_id", "year", "teachers", "settings", "prefs_by_teacher", "repeated_grades")
+
+  def __init__(
+    self,
+    school_id: int,
+    year: int,
+    teachers: List[TeacherRecord],
+    settings: List[GradeSettingRecord],
+    prefs_by_teacher: Dict[int, PreferenceRecord],
+    repeated_grades: Dict[int, Set[int]],
+  ):
+    self.school_id = school_id
+    self.year = year
+    self.teachers = teachers
+    self.settings = settings
+    self.prefs_by_teacher = prefs_by_teacher
+    self.repeated_grades = repeated_grades
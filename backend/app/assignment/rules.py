@@ -1,5 +1,7 @@
-from typing import List, Tuple, Dict
-from app.models import Teacher, GradeSetting, Preference
+import re
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Tuple, Dict, Set
+from app.assignment.records import GradeSettingRecord, PreferenceRecord, TeacherRecord
 
 EXCLUDE_PATTERNS = [
   ("휴직", "제13조: 휴직"),
@@ -32,15 +34,88 @@ PRIORITY_PATTERNS = [
 ]
 
 
-def apply_exclusions(teachers: List[Teacher], year: int):
+class KeywordMatcher:
+  """
+  여러 키워드를 하나의 정규식으로 한 번에 찾는 매처
+  lookahead로 매칭하므로 서로 겹치는 키워드(예: "출산전"의 출산/산전)도 모두 찾습니다.
+  """
+
+  def __init__(self, keywords: Iterable[str]):
+    self.keywords = list(dict.fromkeys(keywords))
+    ordered = sorted(self.keywords, key=len, reverse=True)
+    self._pattern = re.compile("(?=(" + "|".join(map(re.escape, ordered)) + "))")
+    # 한 위치에서는 가장 긴 키워드만 매칭되므로, 그 키워드로 시작하는 짧은 키워드도 함께 반환
+    self._implied = {k: {p for p in self.keywords if k.startswith(p)} for k in self.keywords}
+
+  def find(self, text: str) -> Set[str]:
+    found: Set[str] = set()
+    for m in self._pattern.finditer(text):
+      found |= self._implied[m.group(1)]
+    return found
+
+  def first(self, text: str, ordered_keys: List[str]) -> str | None:
+    """ordered_keys 순서상 가장 먼저 나오는 일치 키워드"""
+    found = self.find(text)
+    for key in ordered_keys:
+      if key in found:
+        return key
+    return None
+
+
+_EXCLUDE_REASONS = dict(EXCLUDE_PATTERNS)
+_PRIORITY_REASONS = dict(PRIORITY_PATTERNS)
+_EXCLUDE_KEYS = [key for key, _ in EXCLUDE_PATTERNS]
+_PRIORITY_KEYS = [key for key, _ in PRIORITY_PATTERNS]
+_ROLE_KEYS = list(ROLE_POINTS)
+_exclude_matcher = KeywordMatcher(_EXCLUDE_KEYS)
+_priority_matcher = KeywordMatcher(_PRIORITY_KEYS)
+_role_matcher = KeywordMatcher(_ROLE_KEYS)
+
+
+class TeacherRules(NamedTuple):
+  """교사 텍스트 필드(duty_role/special_conditions/subject) 분류 결과"""
+  exclusion: str | None  # 제13조 제외 사유
+  priority: str | None  # 제12조④ 특수 사유
+  duty_role_points: float  # 제12조② 경합 점수 (duty_role에서 ROLE_POINTS 순서상 첫 키워드)
+  role_score: float  # 배정 점수용 역할 점수 (세 필드 중 가장 높은 키워드)
+  role_detail: str
+
+
+@lru_cache(maxsize=65536)
+def classify_text(duty_role: str | None, special_conditions: str | None, subject: str | None) -> TeacherRules:
+  cond = (special_conditions or "").lower()
+  exclude_key = _exclude_matcher.first(cond, _EXCLUDE_KEYS)
+  priority_key = _priority_matcher.first(cond, _PRIORITY_KEYS)
+
+  duty_key = _role_matcher.first(duty_role, _ROLE_KEYS) if duty_role else None
+
+  role_score = 0
+  role_detail = ""
+  role_text = (duty_role or "") + " " + (special_conditions or "") + " " + (subject or "")
+  found = _role_matcher.find(role_text)
+  for key in _ROLE_KEYS:
+    if key in found and ROLE_POINTS[key] > role_score:
+      role_score = ROLE_POINTS[key]
+      role_detail = key
+
+  return TeacherRules(
+    exclusion=_EXCLUDE_REASONS[exclude_key] if exclude_key else None,
+    priority=_PRIORITY_REASONS[priority_key] if priority_key else None,
+    duty_role_points=ROLE_POINTS[duty_key] if duty_key else 0.0,
+    role_score=role_score,
+    role_detail=role_detail,
+  )
+
+
+def classify(t: TeacherRecord) -> TeacherRules:
+  """교사를 제외/우선/역할 기준으로 한 번에 분류 (텍스트 필드 기준 캐시)"""
+  return classify_text(t.duty_role, t.special_conditions, t.subject)
+
+
+def apply_exclusions(teachers: List[TeacherRecord], year: int):
   kept, excluded, logs = [], [], []
   for t in teachers:
-    cond = (t.special_conditions or "").lower()
-    reason = None
-    for key, msg in EXCLUDE_PATTERNS:
-      if key in cond:
-        reason = msg
-        break
+    reason = classify(t).exclusion
     if reason:
       excluded.append(t)
       logs.append((t.id, "exclude", reason))
@@ -49,21 +124,16 @@ def apply_exclusions(teachers: List[Teacher], year: int):
   return kept, excluded, logs
 
 
-def apply_priority_rules(teachers: List[Teacher], settings: List[GradeSetting], year: int):
-  assigned: List[Tuple[Teacher, int, str, str]] = []
-  remaining: List[Teacher] = teachers[:]
+def apply_priority_rules(teachers: List[TeacherRecord], settings: List[GradeSettingRecord], year: int):
+  assigned: List[Tuple[TeacherRecord, int, str, str]] = []
+  remaining: List[TeacherRecord] = teachers[:]
   logs = []
 
   # 1) 특수 사유 우선 (제12조④)
   pri_candidates = []
   still = []
   for t in remaining:
-    reason = None
-    cond = (t.special_conditions or "").lower()
-    for key, msg in PRIORITY_PATTERNS:
-      if key in cond:
-        reason = msg
-        break
+    reason = classify(t).priority
     if reason:
       pri_candidates.append((t, reason))
     else:
@@ -98,19 +168,9 @@ def apply_priority_rules(teachers: List[Teacher], settings: List[GradeSetting],
 
   # 2) 업무부장/학년부장/교과전담 경합 시 점수 높은 순 (제12조②)
   # duty_role에 ROLE_POINTS 키워드를 포함한 교사만 선별
-  def role_score(t: Teacher) -> float:
-    if t.duty_role:
-      for k, v in ROLE_POINTS.items():
-        if k in t.duty_role:
-          return v
-    return 0.0
-
-  role_sorted = sorted(
-    [t for t in remaining if role_score(t) > 0],
-    key=lambda x: role_score(x),
-    reverse=True,
-  )
-  remaining = [t for t in remaining if role_score(t) == 0]
+  role_scores = [(t, classify(t).duty_role_points) for t in remaining]
+  role_sorted = [t for t, score in sorted(role_scores, key=lambda x: x[1], reverse=True) if score > 0]
+  remaining = [t for t, score in role_scores if score == 0]
 
   for t in role_sorted:
     # 배정 학년은 1지망→2지망→3지망 순으로 시도, 없으면 current_grade 유지
@@ -144,9 +204,13 @@ def apply_priority_rules(teachers: List[Teacher], settings: List[GradeSetting],
   return assigned, remaining, logs
 
 
-def apply_rotation(teachers: List[Teacher], prefs_by_teacher: Dict[int, Preference]):
-  import json
-  updated: List[Teacher] = []
+def apply_rotation(
+  teachers: List[TeacherRecord],
+  prefs_by_teacher: Dict[int, PreferenceRecord],
+  repeated_grades: Dict[int, Set[int]] | None = None,
+):
+  repeated_grades = repeated_grades or {}
+  updated: List[TeacherRecord] = []
   for t in teachers:
     banned = set()
     
@@ -164,32 +228,16 @@ def apply_rotation(teachers: List[Teacher], prefs_by_teacher: Dict[int, Preferen
       if not (t.current_grade in {1, 6} and wants_same):
         banned.add(t.current_grade)
     
-    # 2. 동일 학년 2번 제한 (본교 근무 기간 동안)
-    if t.grade_history:
-      try:
-        history = json.loads(t.grade_history) if isinstance(t.grade_history, str) else t.grade_history
-        # 각 학년별로 몇 번 담임했는지 카운트
-        grade_counts: Dict[int, int] = {}
-        for entry in history:
-          if isinstance(entry, dict) and "grade" in entry:
-            grade = entry["grade"]
-            grade_counts[grade] = grade_counts.get(grade, 0) + 1
-        
-        # 2번 이상 담임한 학년은 제외
-        for grade, count in grade_counts.items():
-          if count >= 2:
-            banned.add(grade)
-      except (json.JSONDecodeError, TypeError, KeyError):
-        # JSON 파싱 실패 시 무시
-        pass
+    # 2. 동일 학년 2번 제한 (본교 근무 기간 동안, teacher_grade_history 집계 결과)
+    banned.update(repeated_grades.get(t.id, ()))
     
     t.banned_grades = banned  # type: ignore[attr-defined]
     updated.append(t)
   return updated
 
 
-def apply_subject_rules(teachers: List[Teacher]):
-  updated: List[Teacher] = []
+def apply_subject_rules(teachers: List[TeacherRecord]):
+  updated: List[TeacherRecord] = []
   for t in teachers:
     if t.is_subject_teacher:
       # 교과전담은 기본적으로 담임 배제, 필요 시 관리자가 풀도록
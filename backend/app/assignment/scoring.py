@@ -0,0 +1,109 @@
+"""
+배정 점수 계산
+- score_candidate: (교사, 학년) 1쌍 점수
+- score_matrix: 교사 × 학년 점수 행렬을 NumPy 브로드캐스팅으로 한 번에 계산
+  (교사별 역할 점수와 지망 순위는 교사당 한 번만 계산)
+"""
+from typing import List, Sequence, Tuple
+import numpy as np
+from app.assignment.rules import classify
+
+# 학년 가중치
+GRADE_WEIGHTS = {6: 6, 1: 5, 5: 4, 3: 3, 4: 3, 2: 2}
+# 1/2/3지망 점수
+HOPE_POINTS = (10, 5, 2)
+# 배정 금지 학년 감점
+BANNED_PENALTY = -999
+
+
+def role_points(teacher) -> Tuple[float, str]:
+  """역할 점수: duty_role/special_conditions/subject 텍스트에서 가장 높은 ROLE_POINTS 키워드"""
+  rules = classify(teacher)
+  return rules.role_score, rules.role_detail
+
+
+def _details(hope_rank: int, grade: int, role_score, role_detail: str, banned: bool) -> dict:
+  hope_score = HOPE_POINTS[hope_rank - 1] if hope_rank else 0
+  hope_detail = f"{hope_rank}지망" if hope_rank else ""
+  grade_weight = GRADE_WEIGHTS.get(grade, 0)
+  penalty = BANNED_PENALTY if banned else 0
+  return {
+    "hope_score": hope_score,
+    "hope_detail": hope_detail,
+    "grade_weight": grade_weight,
+    "role_score": role_score,
+    "role_detail": role_detail,
+    "penalty": penalty,
+    "total_score": hope_score + grade_weight + role_score + penalty,
+  }
+
+
+def _hope_rank(grade: int, prefs: Sequence[int]) -> int:
+  for idx, pref in enumerate(prefs[:len(HOPE_POINTS)]):
+    if grade == pref:
+      return idx + 1
+  return 0
+
+
+def score_candidate(teacher, grade: int, prefs: list[int]) -> tuple[int, dict]:
+  """점수 계산 및 상세 내역 반환"""
+  role_score, role_detail = role_points(teacher)
+  banned = grade in getattr(teacher, "banned_grades", set())
+  details = _details(_hope_rank(grade, prefs), grade, role_score, role_detail, banned)
+  return details["total_score"], details
+
+
+class ScoreMatrix:
+  """
+  교사 × 학년 점수 행렬
+  total[i, j]는 score_candidate(teachers[i], grades[j], prefs[i])의 총점과 같고,
+  상세 내역은 details(i, j)로 필요한 칸만 만들어 씁니다.
+  """
+
+  def __init__(self, grades: List[int], hope_rank: np.ndarray, role: List[Tuple[float, str]], banned: np.ndarray):
+    self.grades = grades
+    self.hope_rank = hope_rank
+    self.role = role
+    self.banned = banned
+    hope_points = np.array((0,) + HOPE_POINTS, dtype=np.float64)
+    grade_weight = np.array([GRADE_WEIGHTS.get(g, 0) for g in grades], dtype=np.float64)
+    role_score = np.array([score for score, _ in role], dtype=np.float64)
+    self.total = (
+      hope_points[hope_rank]
+      + grade_weight[np.newaxis, :]
+      + role_score[:, np.newaxis]
+      + np.where(banned, BANNED_PENALTY, 0)
+    )
+
+  def details(self, i: int, j: int) -> dict:
+    role_score, role_detail = self.role[i]
+    return _details(int(self.hope_rank[i, j]), self.grades[j], role_score, role_detail, bool(self.banned[i, j]))
+
+
+def score_matrix(teachers: Sequence, grades: Sequence[int], prefs: Sequence[Sequence[int]]) -> ScoreMatrix:
+  """
+  teachers[i]의 지망 목록 prefs[i]를 받아 교사 × grades 점수 행렬 계산
+  """
+  grades = list(grades)
+  n = len(teachers)
+  grade_arr = np.array(grades, dtype=np.int64)
+
+  # 지망 배열 (미입력은 -1), 앞선 지망이 우선하도록 3지망부터 덮어씀
+  pref_arr = np.full((n, len(HOPE_POINTS)), -1, dtype=np.int64)
+  for i, p in enumerate(prefs):
+    p = list(p)[:len(HOPE_POINTS)]
+    pref_arr[i, :len(p)] = p
+  hope_rank = np.zeros((n, len(grades)), dtype=np.int64)
+  for k in reversed(range(len(HOPE_POINTS))):
+    hope_rank = np.where(pref_arr[:, k, np.newaxis] == grade_arr[np.newaxis, :], k + 1, hope_rank)
+
+  grade_index = {g: j for j, g in enumerate(grades)}
+  banned = np.zeros((n, len(grades)), dtype=bool)
+  for i, t in enumerate(teachers):
+    for g in getattr(t, "banned_grades", ()):
+      j = grade_index.get(g)
+      if j is not None:
+        banned[i, j] = True
+
+  role = [role_points(t) for t in teachers]
+  return ScoreMatrix(grades, hope_rank, role, banned)
@@ -0,0 +1,208 @@
+"""
+배정 계산 (순수 로직, DB/ORM 의존 없음)
+교사/희망/학급 설정은 속성만 읽으므로 records 모듈의 레코드나 ORM 객체 모두 사용할 수 있습니다.
+백엔드(engine.py)와 엑셀 자동화 스크립트가 이 모듈을 함께 사용합니다.
+"""
+from typing import Generator, List
+import numpy as np
+from app.assignment.rules import (
+  apply_exclusions,
+  apply_priority_rules,
+  apply_rotation,
+  apply_subject_rules,
+)
+from app.assignment.scoring import score_matrix
+from app.assignment.flow import solve_min_cost_assignment
+from app.assignment.records import PreferenceRecord, SchoolData, TeacherRecord
+
+# 지원하는 솔버: greedy(기존 1/2/3지망 순차 + 점수 greedy), flow(최소비용 유량 최적 배정)
+SOLVERS = ("greedy", "flow")
+
+# 배정 단계 (진행률 보고용, 순서대로 진행)
+PHASES = ("exclusions", "priority", "rotation", "choice", "scoring", "persistence")
+
+
+def pref_grades(pref: PreferenceRecord | None) -> list[int]:
+  """1/2/3지망 학년 목록 (미입력 지망은 제외)"""
+  if not pref:
+    return []
+  prefs = [
+    pref.first_choice_grade,
+    pref.second_choice_grade,
+    pref.third_choice_grade,
+  ]
+  return [p for p in prefs if p is not None]
+
+
+def _score_description(details: dict) -> str:
+  """점수 상세 내역 구성"""
+  desc_parts = []
+  if details["hope_detail"]:
+    desc_parts.append(f"희망: {details['hope_detail']}({details['hope_score']}점)")
+  desc_parts.append(f"학년가중치: {details['grade_weight']}점")
+  if details["role_detail"]:
+    desc_parts.append(f"역할: {details['role_detail']}({details['role_score']}점)")
+  desc_parts.append(f"총점: {details['total_score']}점")
+  return " | ".join(desc_parts)
+
+
+def assign_by_flow(remaining: List[TeacherRecord], slots: List[int], prefs_by_teacher: dict) -> list:
+  """
+  남은 교사와 슬롯을 최소비용 유량으로 배정합니다.
+  score_candidate 점수의 총합이 최대가 되도록 전역 최적해를 구하므로
+  교사 처리 순서에 따라 결과가 달라지지 않습니다.
+  """
+  grades = sorted(set(slots))
+  capacities = [slots.count(g) for g in grades]
+  teacher_prefs = [pref_grades(prefs_by_teacher.get(t.id)) for t in remaining]
+  matrix = score_matrix(remaining, grades, teacher_prefs)
+  solution = solve_min_cost_assignment((-matrix.total).tolist(), capacities)
+
+  assigned = []
+  for i, (t, prefs, g_idx) in enumerate(zip(remaining, teacher_prefs, solution)):
+    if g_idx is None:
+      continue
+    g = grades[g_idx]
+    banned = getattr(t, "banned_grades", set())
+    if g in prefs and g not in banned:
+      hope_rank = f"{prefs.index(g)+1}지망"
+      desc = f"{hope_rank} 반영 (희망 학년: {g}학년)"
+      assigned.append((t, g, hope_rank, desc))
+    else:
+      assigned.append((t, g, "조정", _score_description(matrix.details(i, g_idx))))
+  return assigned
+
+
+def assign_by_choice(remaining: List[TeacherRecord], slots: List[int], prefs_by_teacher: dict) -> tuple:
+  """1/2/3 지망 순서로 배정하고 배정한 자리를 slots에서 뺌 → (배정, 남은 교사)"""
+  assigned = []
+  for choice_idx in [0, 1, 2]:
+    still = []
+    for t in remaining:
+      prefs = pref_grades(prefs_by_teacher.get(t.id))
+      if choice_idx < len(prefs) and prefs[choice_idx] in slots and prefs[choice_idx] not in getattr(t, "banned_grades", set()):
+        g = prefs[choice_idx]
+        hope_rank = f"{choice_idx+1}지망"
+        desc = f"{hope_rank} 반영 (희망 학년: {g}학년)"
+        assigned.append((t, g, hope_rank, desc))
+        slots.remove(g)
+      else:
+        still.append(t)
+    remaining = still
+  return assigned, remaining
+
+
+def assign_by_score(remaining: List[TeacherRecord], slots: List[int], prefs_by_teacher: dict) -> list:
+  """남은 슬롯을 점수 높은 교사부터 배정하고 배정한 자리를 slots에서 뺌 (greedy)"""
+  scored = []
+  if remaining and slots:
+    grades = sorted(set(slots))
+    matrix = score_matrix(remaining, grades, [pref_grades(prefs_by_teacher.get(t.id)) for t in remaining])
+    best_idx = matrix.total.argmax(axis=1)
+    best_scores = matrix.total[np.arange(len(remaining)), best_idx]
+    for i, t in enumerate(remaining):
+      j = int(best_idx[i])
+      scored.append((t, grades[j], float(best_scores[i]), matrix.details(i, j)))
+  scored.sort(key=lambda x: x[2], reverse=True)
+  assigned = []
+  for t, g, sc, details in scored:
+    if g in slots:
+      assigned.append((t, g, "조정", _score_description(details)))
+      slots.remove(g)
+  return assigned
+
+
+def assign_slots(remaining: List[TeacherRecord], slots: List[int], prefs_by_teacher: dict, solver: str = "greedy") -> list:
+  """규칙 적용 후 남은 교사를 solver 방식으로 슬롯에 배정 (증분 재배정이 전체 배정과 같은 방식으로 풀도록)"""
+  if solver == "flow":
+    return assign_by_flow(remaining, slots, prefs_by_teacher)
+  slots = list(slots)
+  assigned, remaining = assign_by_choice(remaining, slots, prefs_by_teacher)
+  return assigned + assign_by_score(remaining, slots, prefs_by_teacher)
+
+
+def rule_reference(atype: str, desc: str | None) -> str | None:
+  """배정 유형/설명으로 근거 규정 결정"""
+  rule_ref = None
+  if "규정우선" in atype:
+    if "제12조④" in (desc or ""):
+      rule_ref = "제12조④ (특수 사유 우선 배정)"
+    elif "제12조②" in (desc or ""):
+      rule_ref = "제12조② (역할 우선 배정)"
+    elif "제13조" in (desc or ""):
+      rule_ref = "제13조 (배정 제외)"
+  elif "1지망" in atype or "2지망" in atype or "3지망" in atype:
+    rule_ref = "제11조 (희망 학년 반영)"
+  elif "조정" in atype:
+    rule_ref = "제12조① (학년 순환 원칙) + 점수 기반 조정"
+  return rule_ref
+
+
+def solve_phases(data: SchoolData, solver: str = "greedy") -> Generator[str, None, tuple]:
+  """
+  배정 계산 (DB 접근 없음)
+  각 단계(PHASES)를 시작할 때 단계 이름을 yield 하고, 끝나면 (assigned, excluded, logs)를 반환합니다.
+  """
+  if solver not in SOLVERS:
+    raise ValueError(f"지원하지 않는 배정 방식입니다: {solver}")
+  year = data.year
+  settings = data.settings
+  teachers = data.teachers
+  prefs_by_teacher = data.prefs_by_teacher
+
+  if not settings:
+    raise ValueError(f"{year}년도 학급 설정이 없습니다. 먼저 학급 설정을 입력해주세요.")
+  if not teachers:
+    raise ValueError("교사 데이터가 없습니다.")
+
+  yield "exclusions"
+  kept, excluded, logs_all = apply_exclusions(teachers, year)
+  # 희망 정보를 teacher 객체에 힌트로 붙여 우선배정 활용
+  for t in kept:
+    pref = prefs_by_teacher.get(t.id)
+    if pref:
+      t.preferred_grade_primary = pref.first_choice_grade
+      t.preferred_grade_secondary = pref.second_choice_grade
+      t.preferred_grade_third = pref.third_choice_grade
+  yield "priority"
+  assigned, remaining, pri_logs = apply_priority_rules(kept, settings, year)
+  logs_all.extend(pri_logs)
+
+  yield "rotation"
+  remaining = apply_rotation(remaining, prefs_by_teacher, data.repeated_grades)
+  remaining = apply_subject_rules(remaining)
+
+  # 슬롯 풀 생성
+  slots: List[int] = []
+  for s in settings:
+    for _ in range(s.required_homerooms):
+      slots.append(s.grade)
+  
+  if not slots:
+    raise ValueError("필요 담임 수가 0입니다. 학급 설정에서 필요 담임 수를 입력해주세요.")
+
+  if solver == "flow":
+    # 1/2/3지망 + 점수 기반 배정을 한 번에 최적화
+    yield "scoring"
+    assigned.extend(assign_by_flow(remaining, slots, prefs_by_teacher))
+  else:
+    # 1/2/3 지망 우선 배정
+    yield "choice"
+    chosen, remaining = assign_by_choice(remaining, slots, prefs_by_teacher)
+    assigned.extend(chosen)
+
+    # 남은 슬롯 점수 기반 배정 (greedy)
+    yield "scoring"
+    assigned.extend(assign_by_score(remaining, slots, prefs_by_teacher))
+
+  return assigned, excluded, logs_all
+
+
+def solve_assignment(data: SchoolData, solver: str = "greedy") -> tuple:
+  """단계 보고 없이 끝까지 계산 (프로세스 풀 작업자에서 호출)"""
+  phases = solve_phases(data, solver)
+  while True:
+    try:
+      next(phases)
+    except StopIteration as done:
+      return done.value
@@ -0,0 +1,90 @@
+"""
+배정 결과 내보내기 (CSV / XLSX)
+- session.stream() + yield_per로 서버 측 커서에서 조금씩 읽어 바로 내보냄
+- 요청 세션은 응답 전송 전에 닫히므로 스트리밍 동안 쓸 세션을 따로 엶 (읽기 복제본 라우팅 적용)
+- CSV는 csv 모듈로 인용 처리(설명에 쉼표/줄바꿈이 있어도 행이 깨지지 않음)
+- XLSX는 openpyxl write-only 모드로 임시 파일에 쓴 뒤 청크 단위로 전송 (zip 형식이라 완성 후 전송)
+"""
+import csv
+import io
+import os
+import tempfile
+from typing import AsyncIterator, Iterable
+from openpyxl import Workbook
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from app.db import read_sessionmaker
+from app.models import DEFAULT_SCHOOL_ID, Assignment, Teacher
+
+EXPORT_FORMATS = ("csv", "xlsx")
+EXPORT_HEADERS = ["teacher_id", "teacher_name", "assigned_grade", "assignment_type", "rule_reference", "description"]
+# 서버 측 커서에서 한 번에 가져올 행 수
+EXPORT_BATCH_SIZE = 1000
+# XLSX 파일 전송 청크 크기
+FILE_CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+  "csv": "text/csv; charset=utf-8",
+  "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _export_stmt(year: int, school_id: int):
+  return (
+    select(
+      Assignment.teacher_id,
+      Teacher.name,
+      Assignment.assigned_grade,
+      Assignment.assignment_type,
+      Assignment.rule_reference,
+      Assignment.description,
+    )
+    .join(Teacher, Teacher.id == Assignment.teacher_id)
+    .where(Assignment.school_id == school_id, Assignment.year == year)
+    .order_by(Assignment.assigned_grade, Teacher.name)
+    .execution_options(yield_per=EXPORT_BATCH_SIZE)
+  )
+
+
+async def _iter_batches(year: int, school_id: int) -> AsyncIterator[Iterable[tuple]]:
+  async with (await read_sessionmaker(school_id))() as session:
+    result = await session.stream(_export_stmt(year, school_id))
+    async for batch in result.partitions():
+      yield batch
+
+
+async def stream_csv(year: int, school_id: int = DEFAULT_SCHOOL_ID) -> AsyncIterator[bytes]:
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(EXPORT_HEADERS)
+  yield buffer.getvalue().encode("utf-8")
+  async for batch in _iter_batches(year, school_id):
+    buffer.seek(0)
+    buffer.truncate()
+    writer.writerows(batch)
+    yield buffer.getvalue().encode("utf-8")
+
+
+async def stream_xlsx(year: int, school_id: int = DEFAULT_SCHOOL_ID) -> AsyncIterator[bytes]:
+  wb = Workbook(write_only=True)
+  ws = wb.create_sheet(title=f"{year}")
+  ws.append(EXPORT_HEADERS)
+  async for batch in _iter_batches(year, school_id):
+    for row in batch:
+      ws.append(list(row))
+
+  fd, path = tempfile.mkstemp(suffix=".xlsx")
+  os.close(fd)
+  try:
+    await run_in_threadpool(wb.save, path)
+    with open(path, "rb") as f:
+      while chunk := await run_in_threadpool(f.read, FILE_CHUNK_SIZE):
+        yield chunk
+  finally:
+    os.remove(path)
+
+
+def export_stream(year: int, fmt: str, school_id: int = DEFAULT_SCHOOL_ID) -> AsyncIterator[bytes]:
+  if fmt not in EXPORT_FORMATS:
+    raise ValueError(f"지원하지 않는 형식입니다: {fmt} (가능: {', '.join(EXPORT_FORMATS)})")
+  return stream_xlsx(year, school_id) if fmt == "xlsx" else stream_csv(year, school_id)
@@ -8,10 +8,51 @@ class Settings(BaseSettings):
   db_url: str = Field("sqlite+aiosqlite:///./dev.db", env="DATABASE_URL")
   admin_password: str = Field("admin1234", env="ADMIN_PASSWORD")  # 프로덕션에서는 최소 8자 권장
   teacher_password: str = Field("teacher1234", env="TEACHER_PASSWORD")  # 프로덕션에서는 최소 8자 권장
+  district_admin_password: str = ""  # 교육청(여러 학교) 관리자 비밀번호. 비어 있으면 비활성
   jwt_algorithm: str = "HS256"
   access_token_expire_minutes: int = 60 * 24
+  token_cache_size: int = 10000  # 검증된 토큰 캐시 크기 (0이면 캐시 안 함)
+  token_cache_seconds: int = 300  # 검증된 토큰을 다시 검증하지 않는 시간(초)
+  token_version_cache_seconds: float = 5.0  # DB의 학교/교사 토큰 버전을 다시 읽지 않는 시간(초). 무효화가 다른 워커에 반영되는 최대 지연
+  auto_migrate: bool = True  # 서버 시작 시 테이블 생성/마이그레이션 (운영에서는 false로 두고 python -m app.migrate를 한 번 실행)
+  ready_timeout: float = 2.0  # /ready의 DB 확인 제한 시간(초)
+  database_read_url: str = ""  # 읽기 전용 복제본 (관리자 조회/내보내기용). 비어 있으면 기본 DB 사용
+  read_your_writes_seconds: float = 30.0  # 관리자가 데이터를 바꾼 뒤 이 시간(초) 동안은 기본 DB에서 읽음
+  read_your_writes_check_seconds: float = 2.0  # 다른 워커의 쓰기 기한을 기본 DB에서 다시 확인하는 주기(초, 학교별)
+  # 연결 풀 (SQLite에는 적용하지 않음)
+  db_pool_size: int = 5
+  db_max_overflow: int = 10
+  db_pool_timeout: float = 30.0  # 연결을 기다리는 최대 시간(초)
+  db_pool_recycle: int = 1800  # 이 시간(초)이 지난 연결은 새로 맺음 (-1이면 사용 안 함)
+  db_pool_pre_ping: bool = True  # 체크아웃 시 연결 확인 (끊긴 연결 자동 교체)
+  db_statement_cache_size: int = 100  # asyncpg prepared statement 캐시 크기
+  db_transaction_pooler: bool = False  # pgbouncer/Supavisor 트랜잭션 모드(포트 6543 등) 사용 시 True
+  rate_limit_backend: str = "memory"  # memory: 워커별 메모리, sqlite: rate_limit_db 파일을 워커들이 공유
+  rate_limit_db: str = "./rate_limit.db"
+  rate_limit_sweep_seconds: float = 60.0  # 지난 윈도우의 카운터를 정리하는 주기(초)
   google_client_id: str = Field("", env="GOOGLE_CLIENT_ID")
   google_client_secret: str = Field("", env="GOOGLE_CLIENT_SECRET")
+  google_token_mode: str = "userinfo"  # userinfo: Access Token으로 사용자 정보 조회, id_token: ID 토큰 서명을 JWKS로 직접 검증
+  google_userinfo_url: str = "https://www.googleapis.com/oauth2/v2/userinfo"
+  google_jwks_url: str = "https://www.googleapis.com/oauth2/v3/certs"
+  google_issuers: str = "https://accounts.google.com,accounts.google.com"  # id_token 모드에서 허용할 iss (쉼표 구분)
+  google_userinfo_cache_seconds: float = 60.0  # 같은 Access Token의 userinfo 결과 캐시 시간(초, 0이면 캐시 안 함)
+  google_userinfo_cache_size: int = 10000
+  google_jwks_cache_seconds: float = 3600.0  # JWKS 공개키 캐시 시간(초)
+  google_http_timeout: float = 10.0
+  google_http_max_connections: int = 20  # 구글 API 공유 클라이언트의 최대 연결 수 (keep-alive 유지)
+  assign_job_workers: int = 2  # 동시에 실행할 백그라운드 배정 작업 수
+  assign_job_heartbeat_seconds: float = 10.0  # 배정 작업 생존 표시 주기(초). 3주기 동안 갱신이 없으면 실패로 정리
+  batch_workers: int = 0  # 여러 학교 일괄 배정 프로세스 수 (0이면 CPU 수)
+  preference_buffer_enabled: bool = True  # 동시에 들어온 희망 제출을 묶어 한 번에 저장 (False면 요청마다 따로 저장)
+  preference_flush_batch: int = 200  # 한 번에 저장하는 최대 제출 수
+  auto_reassign_on_submit: bool = False  # 배정 결과가 있는 연도에 희망이 저장되면 해당 교사 기준으로 증분 재배정
+  closed_status_cache_seconds: float = 2.0  # 희망 제출이 열려 있음을 캐시하는 시간(초). 마감은 저장할 때 다시 확인
+  metrics_sinks: str = "log,prometheus"  # 배정 계측을 내보낼 곳 (쉼표 구분: log, prometheus)
+  profile_dir: str = "./profiles"  # ?profile=true 배정 실행의 cProfile 결과 저장 폴더
+  response_cache_size: int = 256  # 관리자 조회 응답 캐시 개수 ((엔드포인트, 학교, 연도, 데이터 버전)별, 0이면 캐시 안 함)
+  slow_request_ms: int = 1000  # 이 시간(ms) 이상 걸린 요청은 경고 로그
+  slow_request_queries: int = 50  # 이 횟수 이상 SQL을 실행한 요청은 경고 로그
   allowed_origins: str = Field(
     "http://localhost:5173,http://localhost:5174,http://localhost:5175,http://127.0.0.1:5175",
     env="ALLOWED_ORIGINS"
@@ -0,0 +1,150 @@
+"""
+구글 로그인 토큰 검증
+- 앱 전체에서 HTTP 클라이언트 1개를 공유해 googleapis 연결(keep-alive)을 재사용
+  (startup에서 start_http_client, shutdown에서 close_http_client)
+- userinfo 모드: access token → userinfo 결과를 google_userinfo_cache_seconds 동안 캐시
+- id_token 모드: ID 토큰 서명을 캐시해 둔 JWKS 공개키로 직접 검증 (요청마다 외부 호출 없음)
+- userinfo/JWKS 주소는 설정으로 바꿀 수 있어 로컬 스텁 서버로 시험 가능
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import logging
+import httpx
+import jwt
+from fastapi import HTTPException
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+# sha256(access token) → (캐시 만료 시각(monotonic), userinfo)
+_userinfo_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
+# (받아온 시각(monotonic), kid → 공개키)
+_jwks: Tuple[float, Dict[str, jwt.PyJWK]] = (float("-inf"), {})
+_jwks_lock = asyncio.Lock()
+# 모르는 kid가 와도 이 시간(초) 안에는 JWKS를 다시 받지 않음 (임의 kid로 외부 호출을 유발하지 못하도록)
+JWKS_MIN_REFRESH_SECONDS = 60
+
+
+def start_http_client():
+  global _client
+  if _client is None:
+    _client = httpx.AsyncClient(
+      timeout=settings.google_http_timeout,
+      limits=httpx.Limits(
+        max_connections=settings.google_http_max_connections,
+        max_keepalive_connections=settings.google_http_max_connections,
+      ),
+    )
+  return _client
+
+
+async def close_http_client():
+  global _client
+  if _client is not None:
+    await _client.aclose()
+    _client = None
+
+
+def http_client() -> httpx.AsyncClient:
+  """공유 HTTP 클라이언트 (startup 전에 불린 경우 여기서 생성)"""
+  return _client or start_http_client()
+
+
+async def fetch_userinfo(access_token: str) -> dict:
+  """access token으로 구글 userinfo 조회 (같은 토큰은 캐시 결과 사용)"""
+  key = hashlib.sha256(access_token.encode()).hexdigest()
+  now = time.monotonic()
+  cached = _userinfo_cache.get(key)
+  if cached and cached[0] > now:
+    _userinfo_cache.move_to_end(key)
+    return cached[1]
+
+  resp = await http_client().get(
+    settings.google_userinfo_url,
+    headers={"Authorization": f"Bearer {access_token}"},
+  )
+  if resp.status_code != 200:
+    logger.error(f"Google API error: {resp.status_code}, {resp.text[:500] if resp.text else 'No error message'}")
+    raise HTTPException(status_code=401, detail=f"Invalid Google token: {resp.status_code}")
+  user_info = resp.json()
+
+  if settings.google_userinfo_cache_seconds > 0:
+    _userinfo_cache[key] = (now + settings.google_userinfo_cache_seconds, user_info)
+    while len(_userinfo_cache) > settings.google_userinfo_cache_size:
+      _userinfo_cache.popitem(last=False)
+  return user_info
+
+
+async def _load_jwks() -> Dict[str, jwt.PyJWK]:
+  global _jwks
+  resp = await http_client().get(settings.google_jwks_url)
+  resp.raise_for_status()
+  keys = {}
+  for data in resp.json().get("keys", []):
+    try:
+      key = jwt.PyJWK(data)
+    except jwt.PyJWTError:
+      # 지원하지 않는 형식의 키는 건너뜀
+      continue
+    keys[key.key_id] = key
+  _jwks = (time.monotonic(), keys)
+  return keys
+
+
+def _jwks_stale(kid: str) -> bool:
+  fetched_at, keys = _jwks
+  age = time.monotonic() - fetched_at
+  # 캐시 만료, 또는 구글이 키를 교체해 모르는 kid가 온 경우 다시 받아옴
+  return age >= settings.google_jwks_cache_seconds or (kid not in keys and age >= JWKS_MIN_REFRESH_SECONDS)
+
+
+async def _signing_key(kid: str) -> jwt.PyJWK:
+  if _jwks_stale(kid):
+    async with _jwks_lock:
+      # 기다리는 동안 다른 요청이 받아 왔으면 그대로 사용
+      if _jwks_stale(kid):
+        await _load_jwks()
+  keys = _jwks[1]
+  if kid not in keys:
+    raise HTTPException(status_code=401, detail="Invalid Google token: unknown signing key")
+  return keys[kid]
+
+
+async def verify_id_token(id_token: str) -> dict:
+  """
+  구글 ID 토큰을 JWKS 공개키로 검증하고 userinfo와 같은 형태(id, email, name)로 반환
+  aud는 GOOGLE_CLIENT_ID, iss는 google_issuers 중 하나, email이 있고 email_verified가 true여야 함
+  """
+  try:
+    kid = jwt.get_unverified_header(id_token).get("kid")
+  except jwt.PyJWTError:
+    raise HTTPException(status_code=401, detail="Invalid Google token")
+  key = await _signing_key(kid)
+  try:
+    claims = jwt.decode(
+      id_token,
+      key.key,
+      algorithms=["RS256"],
+      audience=settings.google_client_id,
+    )
+  except jwt.PyJWTError as e:
+    raise HTTPException(status_code=401, detail=f"Invalid Google token: {e}")
+  if claims.get("iss") not in settings.google_issuers.split(","):
+    raise HTTPException(status_code=401, detail="Invalid Google token: issuer")
+  # 이메일로도 명단과 연결하므로 확인된 이메일이 있는 토큰만 받음
+  if not claims.get("email") or claims.get("email_verified") is not True:
+    raise HTTPException(status_code=401, detail="Invalid Google token: email not verified")
+  return {"id": claims.get("sub"), "email": claims.get("email"), "name": claims.get("name")}
+
+
+async def verify_google_token(token: str) -> dict:
+  """google_token_mode에 따라 구글 토큰 검증 (userinfo 또는 id_token)"""
+  if settings.google_token_mode == "id_token":
+    return await verify_id_token(token)
+  return await fetch_userinfo(token)
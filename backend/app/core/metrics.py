@@ -0,0 +1,403 @@
+"""
+계측(metrics)
+- track_queries: 현재 실행 흐름(contextvar)에서 실행된 SQL 수/DB 시간/조회·변경 행 수 집계
+  (모든 Engine의 cursor 이벤트에 연결되며, 집계 중이 아닐 때는 아무것도 하지 않음)
+- REGISTRY: 프로세스 내 Prometheus 형식 카운터/히스토그램 (/metrics에서 출력)
+- RunMetrics: 배정 실행 1회의 단계별 소요 시간·쿼리 수·변경 행 수를 모아 싱크로 내보냄
+- QueryMetricsMiddleware: 요청별 SQL 집계를 Server-Timing 헤더/히스토그램으로 내보내고 느린 요청 로그
+싱크는 settings.metrics_sinks(쉼표 구분: log, prometheus)로 선택합니다.
+"""
+import bisect
+import cProfile
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Protocol, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+logger = logging.getLogger("app.metrics")
+
+
+class QueryStats:
+  """SQL 실행 집계. parent가 있으면 같은 값을 위로도 더함 (요청 > 배정 실행 > 단계)"""
+  __slots__ = ("queries", "db_seconds", "rows_returned", "rows_written", "parent")
+
+  def __init__(self, parent: Optional["QueryStats"] = None):
+    self.queries = 0
+    self.db_seconds = 0.0
+    self.rows_returned = 0
+    self.rows_written = 0
+    self.parent = parent
+
+  def add(self, seconds: float, rows_returned: int, rows_written: int):
+    stats = self
+    while stats is not None:
+      stats.queries += 1
+      stats.db_seconds += seconds
+      stats.rows_returned += rows_returned
+      stats.rows_written += rows_written
+      stats = stats.parent
+
+  def as_dict(self) -> dict:
+    return {
+      "queries": self.queries,
+      "db_seconds": round(self.db_seconds, 4),
+      "rows_returned": self.rows_returned,
+      "rows_written": self.rows_written,
+    }
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries(inherit: bool = True) -> Iterator[QueryStats]:
+  """
+  블록 안에서 실행된 SQL 집계
+  inherit=False면 바깥 집계에 더하지 않음 (요청에서 띄운 백그라운드 작업 등)
+  """
+  stats = QueryStats(_current_stats.get() if inherit else None)
+  token = _current_stats.set(stats)
+  try:
+    yield stats
+  finally:
+    _current_stats.reset(token)
+
+
+@contextmanager
+def untracked() -> Iterator[None]:
+  """블록 안의 SQL은 집계하지 않음 (진행률 기록 등 계측 대상이 아닌 쿼리)"""
+  token = _current_stats.set(None)
+  try:
+    yield
+  finally:
+    _current_stats.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  # insertmanyvalues는 배치마다 호출되므로 첫 배치 시작 시각만 기록
+  if context is not None and _current_stats.get() is not None and not hasattr(context, "_metrics_started"):
+    context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  stats = _current_stats.get()
+  if stats is None or context is None:
+    return
+  started = getattr(context, "_metrics_started", None)
+  seconds = time.perf_counter() - started if started is not None else 0.0
+  written = 0
+  if context.isinsert or context.isupdate or context.isdelete:
+    # RETURNING이 있으면 rowcount가 -1이므로 파라미터 행 수로 대신함
+    written = cursor.rowcount if cursor.rowcount >= 0 else (len(parameters) if executemany else 1)
+  # 비동기 드라이버 어댑터(aiosqlite/asyncpg)는 실행 시 결과 행을 미리 받아 둠 (서버 측 커서는 0으로 셈)
+  buffered = getattr(cursor, "_rows", None) if cursor.description else None
+  returned = len(buffered) if buffered is not None else 0
+  stats.add(seconds, returned, written)
+
+
+# ---------------------------------------------------------------------------
+# Prometheus 형식 레지스트리
+# ---------------------------------------------------------------------------
+
+LabelValues = Tuple[str, ...]
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+  return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+  pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+  if extra:
+    pairs.append(extra)
+  return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+  def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+    self.name, self.help, self.labels = name, help_text, tuple(labels)
+    self.values: Dict[LabelValues, float] = {}
+
+  def inc(self, amount: float = 1.0, **labels):
+    key = tuple(str(labels.get(n, "")) for n in self.labels)
+    self.values[key] = self.values.get(key, 0.0) + amount
+
+  def render(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+    for key, value in sorted(self.values.items()):
+      lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+    return lines
+
+
+class Histogram:
+  def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+    self.name, self.help, self.labels = name, help_text, tuple(labels)
+    self.buckets = tuple(sorted(buckets))
+    # 라벨 → (버킷별 개수, 합계, 전체 개수)
+    self.values: Dict[LabelValues, list] = {}
+
+  def observe(self, value: float, **labels):
+    key = tuple(str(labels.get(n, "")) for n in self.labels)
+    entry = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+    idx = bisect.bisect_left(self.buckets, value)
+    if idx < len(self.buckets):
+      entry[0][idx] += 1
+    entry[1] += value
+    entry[2] += 1
+
+  def render(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+    for key, (counts, total, count) in sorted(self.values.items()):
+      cumulative = 0
+      for bound, n in zip(self.buckets, counts):
+        cumulative += n
+        le = 'le="%s"' % bound
+        lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+      le = 'le="+Inf"'
+      lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {count}")
+      lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+      lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+    return lines
+
+
+class Gauge:
+  def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+    self.name, self.help, self.labels = name, help_text, tuple(labels)
+    self.values: Dict[LabelValues, float] = {}
+
+  def set(self, value: float, **labels):
+    self.values[tuple(str(labels.get(n, "")) for n in self.labels)] = value
+
+  def render(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+    for key, value in sorted(self.values.items()):
+      lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+    return lines
+
+
+class Registry:
+  def __init__(self):
+    self.metrics: Dict[str, Counter | Gauge | Histogram] = {}
+
+  def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+    return self.metrics.setdefault(name, Counter(name, help_text, labels))
+
+  def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+    return self.metrics.setdefault(name, Gauge(name, help_text, labels))
+
+  def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return self.metrics.setdefault(name, Histogram(name, help_text, labels, buckets))
+
+  def render(self) -> str:
+    lines: List[str] = []
+    for metric in self.metrics.values():
+      lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+ASSIGN_PHASE_SECONDS = REGISTRY.histogram("assign_phase_seconds", "배정 단계별 소요 시간(초)", ("phase", "solver"))
+ASSIGN_PHASE_QUERIES = REGISTRY.counter("assign_phase_queries_total", "배정 단계별 SQL 실행 수", ("phase", "solver"))
+ASSIGN_PHASE_ROWS = REGISTRY.counter("assign_phase_rows_written_total", "배정 단계별 변경 행 수", ("phase", "solver"))
+ASSIGN_RUNS = REGISTRY.counter("assign_runs_total", "배정 실행 수", ("solver", "status"))
+DB_POOL = REGISTRY.gauge("db_pool", "DB 연결 풀 상태 (/metrics 요청 시 갱신)", ("engine", "stat"))
+ASSIGN_TEACHERS = REGISTRY.counter("assign_teachers_processed_total", "배정에서 처리한 교사 수", ("solver",))
+
+
+# ---------------------------------------------------------------------------
+# 싱크
+# ---------------------------------------------------------------------------
+
+class MetricsSink(Protocol):
+  def emit(self, run: dict) -> None: ...
+
+
+class LogSink:
+  """실행 1회를 JSON 한 줄로 로그 기록"""
+
+  def emit(self, run: dict) -> None:
+    logger.info(json.dumps(run, ensure_ascii=False))
+
+
+class PrometheusSink:
+  """REGISTRY에 누적 (/metrics로 수집)"""
+
+  def emit(self, run: dict) -> None:
+    solver = run.get("solver", "")
+    for phase, values in run["phases"].items():
+      ASSIGN_PHASE_SECONDS.observe(values["seconds"], phase=phase, solver=solver)
+      ASSIGN_PHASE_QUERIES.inc(values["queries"], phase=phase, solver=solver)
+      ASSIGN_PHASE_ROWS.inc(values["rows_written"], phase=phase, solver=solver)
+    ASSIGN_RUNS.inc(solver=solver, status=run["status"])
+    ASSIGN_TEACHERS.inc(run["counts"].get("teachers", 0), solver=solver)
+
+
+SINKS: Dict[str, MetricsSink] = {"log": LogSink(), "prometheus": PrometheusSink()}
+
+
+def configured_sinks() -> List[MetricsSink]:
+  names = [n.strip() for n in settings.metrics_sinks.split(",") if n.strip()]
+  return [SINKS[n] for n in names if n in SINKS]
+
+
+def prometheus_enabled() -> bool:
+  return any(isinstance(s, PrometheusSink) for s in configured_sinks())
+
+
+class RunMetrics:
+  """
+  배정 실행 1회 계측
+  phase(name)으로 단계를 넘길 때마다 이전 단계의 소요 시간과 SQL 집계를 마감하고,
+  finish()에서 설정된 싱크로 내보냅니다.
+  """
+
+  def __init__(self, **labels):
+    self.labels = labels
+    self.phases: Dict[str, dict] = {}
+    self.counts: Dict[str, int] = {}
+    self.total = QueryStats(_current_stats.get())
+    self.profile_path: Optional[str] = None
+    self.result: Optional[dict] = None
+    self._phase: Optional[str] = None
+    self._stats: Optional[QueryStats] = None
+    self._token = None
+    self._started = time.perf_counter()
+    self._phase_started = self._started
+
+  def _close_phase(self):
+    if self._phase is None:
+      return
+    _current_stats.reset(self._token)
+    self.phases[self._phase] = {
+      "seconds": round(time.perf_counter() - self._phase_started, 4),
+      **self._stats.as_dict(),
+    }
+    self._phase = self._stats = self._token = None
+
+  def phase(self, name: str):
+    """이전 단계를 마감하고 name 단계 시작"""
+    self._close_phase()
+    self._phase, self._phase_started = name, time.perf_counter()
+    self._stats = QueryStats(self.total)
+    self._token = _current_stats.set(self._stats)
+
+  def count(self, **counts: int):
+    self.counts.update(counts)
+
+  def timings(self) -> Dict[str, float]:
+    """마감된 단계별 소요 시간(초)"""
+    return {name: values["seconds"] for name, values in self.phases.items()}
+
+  def finish(self, status: str = "succeeded", sinks: Optional[Sequence[MetricsSink]] = None) -> dict:
+    self._close_phase()
+    run = self.result = self.as_dict(status)
+    for sink in configured_sinks() if sinks is None else sinks:
+      try:
+        sink.emit(run)
+      except Exception as e:
+        logger.warning(f"metrics sink 실패: {e}")
+    return run
+
+  def as_dict(self, status: str = "succeeded") -> dict:
+    run = {
+      **self.labels,
+      "status": status,
+      "seconds": round(time.perf_counter() - self._started, 4),
+      "phases": self.phases,
+      "counts": self.counts,
+      **self.total.as_dict(),
+    }
+    if self.profile_path:
+      run["profile"] = self.profile_path
+    return run
+
+
+@contextmanager
+def profiled(run: RunMetrics, enabled: bool = True) -> Iterator[None]:
+  """
+  enabled면 블록 실행을 cProfile로 기록해 settings.profile_dir에 .prof(pstats) 파일로 저장
+  프로파일러는 스레드 단위이므로 같은 이벤트 루프의 다른 요청도 함께 기록될 수 있습니다.
+  """
+  if not enabled:
+    yield
+    return
+  profile = cProfile.Profile()
+  profile.enable()
+  try:
+    yield
+  finally:
+    profile.disable()
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    name = "_".join(str(v) for v in run.labels.values())
+    path = os.path.join(settings.profile_dir, f"assign_{name}_{time.strftime('%Y%m%d-%H%M%S')}.prof")
+    profile.dump_stats(path)
+    run.profile_path = path
+
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("http_request_seconds", "요청 처리 시간(초)", ("method", "route"))
+HTTP_REQUEST_DB_SECONDS = REGISTRY.histogram("http_request_db_seconds", "요청당 DB 시간(초)", ("method", "route"))
+HTTP_REQUEST_QUERIES = REGISTRY.histogram(
+  "http_request_queries", "요청당 SQL 실행 수", ("method", "route"), buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+
+
+def _route_label(scope) -> str:
+  """경로 패턴 (/admin/assign/jobs/{job_id}); 라우팅되지 않은 요청은 하나로 묶음"""
+  route = scope.get("route")
+  return getattr(route, "path", None) or "unmatched"
+
+
+class QueryMetricsMiddleware:
+  """
+  요청별 SQL 수/DB 시간/조회·변경 행 수 집계 (ASGI 미들웨어)
+  - 응답 헤더: Server-Timing: db;dur=..;desc="N queries, M rows", app;dur=..
+    (스트리밍 응답은 헤더를 보내는 시점까지의 값)
+  - 응답 본문까지 끝나면 히스토그램에 기록하고, 기준을 넘은 요청은 경고 로그
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    started = time.perf_counter()
+    with track_queries(inherit=False) as stats:
+      async def send_with_timing(message):
+        if message["type"] == "http.response.start":
+          elapsed_ms = (time.perf_counter() - started) * 1000
+          timing = (
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries, {stats.rows_returned} rows", '
+            f"app;dur={elapsed_ms:.1f}"
+          )
+          message.setdefault("headers", [])
+          message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+        await send(message)
+
+      try:
+        await self.app(scope, receive, send_with_timing)
+      finally:
+        self._record(scope, time.perf_counter() - started, stats)
+
+  def _record(self, scope, seconds: float, stats: QueryStats):
+    method, route = scope["method"], _route_label(scope)
+    HTTP_REQUEST_SECONDS.observe(seconds, method=method, route=route)
+    HTTP_REQUEST_DB_SECONDS.observe(stats.db_seconds, method=method, route=route)
+    HTTP_REQUEST_QUERIES.observe(stats.queries, method=method, route=route)
+    if seconds * 1000 >= settings.slow_request_ms or stats.queries >= settings.slow_request_queries:
+      logger.warning(
+        f"느린 요청: {method} {scope['path']} {seconds * 1000:.0f}ms, "
+        f"쿼리 {stats.queries}회 (DB {stats.db_seconds * 1000:.0f}ms), "
+        f"조회 {stats.rows_returned}행, 변경 {stats.rows_written}행"
+      )
@@ -0,0 +1,138 @@
+"""
+요청 수 제한 (sliding window counter)
+키마다 (현재 윈도우 번호, 현재 윈도우 요청 수, 직전 윈도우 요청 수)만 저장하고,
+직전 윈도우 수를 지나간 비율만큼 줄여 더한 값으로 판단합니다. 요청 1건당 O(1).
+
+  추정 요청 수 = 직전 윈도우 수 × (1 - 현재 윈도우 경과 비율) + 현재 윈도우 수
+
+백엔드 (settings.rate_limit_backend)
+- memory: 프로세스 메모리. 워커마다 따로 셈
+- sqlite: 파일(settings.rate_limit_db) 하나를 같은 서버의 워커들이 함께 사용
+두 윈도우 이상 지난 키는 주기적으로(rate_limit_sweep_seconds) 삭제합니다.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _slide(
+  now: float, window_seconds: float, state: Tuple[int, int, int] | None
+) -> Tuple[int, int, int, float]:
+  """저장된 상태를 현재 윈도우 기준으로 옮김 → (윈도우 번호, 현재 수, 직전 수, 추정 요청 수)"""
+  index = math.floor(now / window_seconds)
+  current, previous = 0, 0
+  if state:
+    stored_index, stored_current, stored_previous = state
+    if stored_index == index:
+      current, previous = stored_current, stored_previous
+    elif stored_index == index - 1:
+      previous = stored_current
+  elapsed = now / window_seconds - index
+  return index, current, previous, previous * (1 - elapsed) + current
+
+
+class MemoryRateLimiter:
+  def __init__(self):
+    # 키 → [윈도우 번호, 현재 수, 직전 수, 윈도우 길이(초)]
+    self._store: Dict[str, List] = {}
+    self._lock = threading.Lock()
+    self._last_sweep = time.monotonic()
+
+  def hit(self, key: str, max_requests: int, window_seconds: float) -> bool:
+    now = time.time()
+    with self._lock:
+      entry = self._store.get(key)
+      index, current, previous, estimate = _slide(now, window_seconds, tuple(entry[:3]) if entry else None)
+      allowed = estimate < max_requests
+      if allowed:
+        current += 1
+      self._store[key] = [index, current, previous, window_seconds]
+      self._maybe_sweep(now)
+    return allowed
+
+  def _maybe_sweep(self, now: float):
+    if time.monotonic() - self._last_sweep < settings.rate_limit_sweep_seconds:
+      return
+    self._last_sweep = time.monotonic()
+    expired = [key for key, (index, _, _, window) in self._store.items() if (index + 2) * window <= now]
+    for key in expired:
+      del self._store[key]
+
+  def reset(self):
+    with self._lock:
+      self._store.clear()
+
+
+class SqliteRateLimiter:
+  """
+  SQLite 파일 공유 카운터 (같은 서버의 워커 여러 개가 같은 제한을 적용)
+  키 1건을 BEGIN IMMEDIATE 트랜잭션으로 읽고 써서 워커끼리 동시에 갱신해도 수가 어긋나지 않음
+  """
+
+  def __init__(self, path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+    self._conn.execute("PRAGMA journal_mode=WAL")
+    self._conn.execute("PRAGMA synchronous=NORMAL")
+    self._conn.execute(
+      "CREATE TABLE IF NOT EXISTS rate_limits ("
+      " key TEXT PRIMARY KEY, window_index INTEGER NOT NULL, current_count INTEGER NOT NULL,"
+      " previous_count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+    )
+    self._lock = threading.Lock()
+    self._last_sweep = time.monotonic()
+
+  def hit(self, key: str, max_requests: int, window_seconds: float) -> bool:
+    now = time.time()
+    with self._lock:
+      self._conn.execute("BEGIN IMMEDIATE")
+      try:
+        row = self._conn.execute(
+          "SELECT window_index, current_count, previous_count FROM rate_limits WHERE key = ?", (key,)
+        ).fetchone()
+        index, current, previous, estimate = _slide(now, window_seconds, row)
+        allowed = estimate < max_requests
+        if allowed:
+          current += 1
+        self._conn.execute(
+          "INSERT INTO rate_limits (key, window_index, current_count, previous_count, expires_at) VALUES (?, ?, ?, ?, ?)"
+          " ON CONFLICT (key) DO UPDATE SET window_index = excluded.window_index, current_count = excluded.current_count,"
+          " previous_count = excluded.previous_count, expires_at = excluded.expires_at",
+          (key, index, current, previous, (index + 2) * window_seconds),
+        )
+        if time.monotonic() - self._last_sweep >= settings.rate_limit_sweep_seconds:
+          self._last_sweep = time.monotonic()
+          self._conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        self._conn.execute("COMMIT")
+      except Exception:
+        self._conn.execute("ROLLBACK")
+        raise
+    return allowed
+
+  def reset(self):
+    with self._lock:
+      self._conn.execute("DELETE FROM rate_limits")
+
+
+_limiter = None
+
+
+def get_rate_limiter():
+  """settings.rate_limit_backend에 맞는 제한기 (프로세스에서 1개)"""
+  global _limiter
+  if _limiter is None:
+    if settings.rate_limit_backend == "sqlite":
+      _limiter = SqliteRateLimiter(settings.rate_limit_db)
+    else:
+      if settings.rate_limit_backend != "memory":
+        logger.warning(f"알 수 없는 rate_limit_backend: {settings.rate_limit_backend} (memory 사용)")
+      _limiter = MemoryRateLimiter()
+  return _limiter
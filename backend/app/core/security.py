@@ -1,18 +1,30 @@
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
+from app.db import SessionLocal
+from app.models import DEFAULT_SCHOOL_ID, School, Teacher
 
 
 security_scheme = HTTPBearer()
 
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def create_access_token(data: dict, school: School, teacher: Optional[Teacher] = None, expires_delta: Optional[timedelta] = None):
+  """토큰 발급. ver = 학교의 토큰 버전, 교사 토큰이면 tver = 교사의 토큰 버전"""
   to_encode = data.copy()
   expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
-  to_encode.update({"exp": expire})
+  to_encode.update({"exp": expire, "ver": school.token_version or 1})
+  if teacher is not None:
+    to_encode["tver"] = teacher.token_version or 1
   return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
 
 
@@ -23,29 +35,158 @@ def decode_token(token: str):
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security_scheme)):
-  try:
-    payload = decode_token(credentials.credentials)
-    
-    # 토큰 페이로드 검증
-    if not isinstance(payload, dict):
-      raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    
-    # role 검증
-    role = payload.get("role")
-    if role not in ["admin", "teacher"]:
+def _validate_claims(payload) -> dict:
+  """서명 검증된 페이로드 → principal (role, school_id, teacher_id/district, ver, exp)"""
+  # 토큰 페이로드 검증
+  if not isinstance(payload, dict):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+  
+  # role 검증
+  role = payload.get("role")
+  if role not in ["admin", "teacher"]:
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+  
+  # teacher_id 검증 (teacher 역할인 경우)
+  if role == "teacher":
+    teacher_id = payload.get("teacher_id")
+    if not teacher_id or not isinstance(teacher_id, int):
       raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    
-    # teacher_id 검증 (teacher 역할인 경우)
-    if role == "teacher":
-      teacher_id = payload.get("teacher_id")
-      if not teacher_id or not isinstance(teacher_id, int):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    
-    return payload  # contains role, teacher_id (for teacher role)
+  
+  # school_id 검증 (school_id가 없는 기존 토큰은 기본 학교)
+  school_id = payload.setdefault("school_id", DEFAULT_SCHOOL_ID)
+  if not isinstance(school_id, int):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+  
+  # ver/tver가 없는 기존 토큰은 1
+  payload.setdefault("ver", 1)
+  if role == "teacher":
+    payload.setdefault("tver", 1)
+  return payload  # contains role, school_id, teacher_id (for teacher role)
+
+
+# 검증된 토큰 캐시: sha256(토큰) → (캐시 만료 시각(monotonic), principal). 오래 안 쓴 것부터 삭제(LRU)
+_token_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
+
+# DB의 토큰 버전 캐시: ("school" | "teacher", id) → (캐시 만료 시각(monotonic), 버전)
+_version_cache: Dict[Tuple[str, int], Tuple[float, int]] = {}
+
+
+async def _token_versions(school_id: int, teacher_id: Optional[int]) -> Tuple[int, Optional[int]]:
+  """학교/교사의 현재 토큰 버전 (token_version_cache_seconds 동안 캐시, 없는 교사는 None)"""
+  now = time.monotonic()
+  wanted = {("school", school_id): School}
+  if teacher_id:
+    wanted[("teacher", teacher_id)] = Teacher
+  missing = {key: model for key, model in wanted.items() if _version_cache.get(key, (0, 0))[0] <= now}
+  if missing:
+    async with SessionLocal() as session:
+      for (kind, row_id), model in missing.items():
+        found = (await session.execute(select(model.id, model.token_version).where(model.id == row_id))).first()
+        if found is None:
+          _version_cache.pop((kind, row_id), None)
+          continue
+        _version_cache[(kind, row_id)] = (now + settings.token_version_cache_seconds, found.token_version or 1)
+  school = _version_cache.get(("school", school_id))
+  teacher = _version_cache.get(("teacher", teacher_id)) if teacher_id else None
+  # 삭제된 학교의 토큰은 거부
+  return (school[1] if school else float("inf")), (teacher[1] if teacher else None)
+
+
+async def revoke_tokens(session: AsyncSession, school_id: int, teacher_id: Optional[int] = None):
+  """
+  학교(teacher_id가 없으면) 또는 교사 한 명에게 발급된 토큰 무효화 (commit은 호출한 쪽에서)
+  이 워커에는 바로, 다른 워커에는 token_version_cache_seconds 안에 반영
+  """
+  if teacher_id:
+    model, key = Teacher, ("teacher", teacher_id)
+  else:
+    model, key = School, ("school", school_id)
+  await session.execute(
+    update(model).where(model.id == key[1]).values(token_version=func.coalesce(model.token_version, 1) + 1)
+  )
+  _version_cache.pop(key, None)
+
+
+def verify_token(token: str) -> dict:
+  """
+  토큰 서명·클레임 검증 (결과를 token_cache_seconds 동안, 토큰 만료 전까지 캐시)
+  토큰 버전(ver/tver)은 캐시와 상관없이 get_current_user에서 매번 DB의 버전과 비교합니다.
+  """
+  key = hashlib.sha256(token.encode()).hexdigest()
+  now = time.monotonic()
+  cached = _token_cache.get(key)
+  if cached and cached[0] > now:
+    _token_cache.move_to_end(key)
+    principal = cached[1]
+  else:
+    principal = _validate_claims(decode_token(token))
+    ttl = min(settings.token_cache_seconds, principal.get("exp", 0) - time.time())
+    if ttl > 0 and settings.token_cache_size > 0:
+      _token_cache[key] = (now + ttl, principal)
+      _token_cache.move_to_end(key)
+      while len(_token_cache) > settings.token_cache_size:
+        _token_cache.popitem(last=False)
+  return principal
+
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security_scheme)):
+  """
+  요청의 principal (role, school_id, teacher_id 등)
+  토큰의 ver/tver가 학교/교사의 현재 토큰 버전보다 낮으면(무효화된 토큰) 401
+  요청마다 복사본을 돌려주고 request.state.user에도 넣어 둡니다 (같은 요청의 다른 코드에서 재사용).
+  """
+  try:
+    principal = dict(verify_token(credentials.credentials))
   except HTTPException:
     raise
-  except Exception as e:
+  except Exception:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+  school_version, teacher_version = await _token_versions(principal["school_id"], principal.get("teacher_id"))
+  if principal["ver"] < school_version or (
+    principal["role"] == "teacher" and (teacher_version is None or principal["tver"] < teacher_version)
+  ):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+  request.state.user = principal
+  return principal
+
+
+# 학교별 비밀번호 해시 (PBKDF2-SHA256, "pbkdf2_sha256$반복 수$salt$hash")
+PASSWORD_HASH_ITERATIONS = 260000
+
+
+def hash_password(password: str) -> str:
+  salt = os.urandom(16).hex()
+  digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), PASSWORD_HASH_ITERATIONS).hex()
+  return f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${salt}${digest}"
+
+
+def verify_password(password: str, hashed: str) -> bool:
+  try:
+    scheme, iterations, salt, digest = hashed.split("$")
+  except ValueError:
+    return False
+  if scheme != "pbkdf2_sha256":
+    return False
+  candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), int(iterations)).hex()
+  return hmac.compare_digest(candidate, digest)
+
+
+def school_password_ok(school, role: str, password: str) -> bool:
+  """
+  학교 비밀번호 확인 (role: admin/teacher)
+  학교에 비밀번호가 설정되어 있으면 그 비밀번호만, 없으면 기본 학교에 한해 전역 ADMIN_PASSWORD/TEACHER_PASSWORD
+  (전역 비밀번호로 다른 학교에 로그인할 수 없음)
+  """
+  hashed = school.admin_password_hash if role == "admin" else school.teacher_password_hash
+  if hashed:
+    return verify_password(password, hashed)
+  if school.id != DEFAULT_SCHOOL_ID:
+    return False
+  expected = settings.admin_password if role == "admin" else settings.teacher_password
+  return hmac.compare_digest(password.encode(), expected.encode())
 
 
+def school_of(user: dict) -> int:
+  """토큰의 학교(테넌트) id"""
+  return user.get("school_id") or DEFAULT_SCHOOL_ID
@@ -5,19 +5,25 @@
 - 보안 헬퍼 함수
 """
 from functools import lru_cache
-from typing import Dict, Optional
-from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import Optional
+from datetime import datetime
+import logging
 import re
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.rate_limit import get_rate_limiter
 
+logger = logging.getLogger(__name__)
 
-# Rate limiting을 위한 간단한 인메모리 저장소 (프로덕션에서는 Redis 사용 권장)
-_rate_limit_store: Dict[str, list] = defaultdict(list)
 
+def _hit(identifier: str, max_requests: int, window_seconds: int) -> bool:
+    return get_rate_limiter().hit(identifier, max_requests, window_seconds)
 
-def check_rate_limit(identifier: str, max_requests: int = 5, window_seconds: int = 60) -> bool:
+
+async def check_rate_limit(identifier: str, max_requests: int = 5, window_seconds: int = 60) -> bool:
     """
-    Rate limiting 체크
+    Rate limiting 체크 (sliding window counter, 백엔드는 settings.rate_limit_backend)
+    sqlite 백엔드는 다른 워커의 쓰기 잠금을 기다릴 수 있으므로 스레드풀에서 실행해 이벤트 루프를 막지 않음
     - identifier: IP 주소 또는 사용자 ID
     - max_requests: 허용할 최대 요청 수
     - window_seconds: 시간 윈도우 (초)
@@ -26,20 +32,14 @@ def check_rate_limit(identifier: str, max_requests: int = 5, window_seconds: int
         True: 요청 허용
         False: 요청 거부 (rate limit 초과)
     """
-    now = datetime.now()
-    window_start = now - timedelta(seconds=window_seconds)
-    
-    # 오래된 기록 제거
-    requests = _rate_limit_store[identifier]
-    requests[:] = [req_time for req_time in requests if req_time > window_start]
-    
-    # 요청 수 체크
-    if len(requests) >= max_requests:
-        return False
-    
-    # 새 요청 기록
-    requests.append(now)
-    return True
+    try:
+        if settings.rate_limit_backend == "sqlite":
+            return await run_in_threadpool(_hit, identifier, max_requests, window_seconds)
+        return _hit(identifier, max_requests, window_seconds)
+    except Exception as e:
+        # 제한 저장소 장애로 로그인 자체가 막히지 않도록 허용
+        logger.error(f"Rate limit check failed: {e}")
+        return True
 
 
 def sanitize_string(value: Optional[str], max_length: int = 1000) -> Optional[str]:
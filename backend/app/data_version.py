@@ -0,0 +1,87 @@
+"""
+관리자 조회 ETag / 응답 캐시
+- 희망·설정·배정을 바꾸는 곳에서 같은 트랜잭션으로 data_versions의 (학교, 연도) 버전을 1 올림
+  교사 명단처럼 연도와 무관한 변경은 (학교, 0)을 올림
+- 조회는 버전(기본키 조회 1회)을 먼저 읽고 ETag = 엔드포인트·학교·연도·버전
+  If-None-Match가 같으면 데이터를 조회/직렬화하지 않고 304
+- 직렬화한 응답은 (엔드포인트, 학교, 연도, 버전) 키로 프로세스 메모리에 캐시
+버전이 DB에 있으므로 워커가 여러 개여도 다른 워커의 변경을 바로 반영합니다.
+버전을 데이터보다 먼저 읽으므로, 캐시된 응답은 항상 그 버전 이후의 데이터입니다.
+"""
+from collections import OrderedDict
+from typing import Awaitable, Callable, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db import dialect_insert
+from app.models import DataVersion
+
+# 연도와 무관한 학교 전체 데이터의 버전 행
+SCHOOL_WIDE = 0
+
+_response_cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+
+
+async def bump_version(session: AsyncSession, school_id: int, year: int = SCHOOL_WIDE):
+  """데이터 버전 1 증가 (commit은 호출한 쪽에서, 변경과 같은 트랜잭션으로)"""
+  table = DataVersion.__table__
+  stmt = dialect_insert(table, session.bind.dialect.name)
+  await session.execute(
+    stmt.on_conflict_do_update(index_elements=["school_id", "year"], set_={"version": table.c.version + 1}),
+    {"school_id": school_id, "year": year, "version": 1},
+  )
+
+
+async def current_version(session: AsyncSession, school_id: int, year: int) -> str:
+  """'학교 전체 버전.연도 버전' (행이 없으면 0)"""
+  rows = dict(
+    (
+      await session.execute(
+        select(DataVersion.year, DataVersion.version).where(
+          DataVersion.school_id == school_id, DataVersion.year.in_((SCHOOL_WIDE, year))
+        )
+      )
+    ).all()
+  )
+  return f"{rows.get(SCHOOL_WIDE, 0)}.{rows.get(year, 0)}"
+
+
+def _matches(request: Request, etag: str) -> bool:
+  header = request.headers.get("if-none-match")
+  if not header:
+    return False
+  candidates = [value.strip() for value in header.split(",")]
+  # If-None-Match는 약한 비교 (W/ 접두어 무시)
+  return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+
+async def versioned_json(
+  request: Request,
+  session: AsyncSession,
+  endpoint: str,
+  school_id: int,
+  year: int,
+  build: Callable[[], Awaitable[object]],
+) -> Response:
+  """ETag를 붙인 JSON 응답. 클라이언트가 같은 버전을 갖고 있으면 304, 캐시에 있으면 build 없이 반환"""
+  version = await current_version(session, school_id, year)
+  etag = f'"{endpoint}-{school_id}-{year}-{version}"'
+  # no-cache: 브라우저가 캐시를 쓰기 전에 항상 If-None-Match로 확인
+  headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+  if _matches(request, etag):
+    return Response(status_code=304, headers=headers)
+
+  key = (endpoint, school_id, year, version)
+  body = _response_cache.get(key)
+  if body is None:
+    body = JSONResponse(jsonable_encoder(await build())).body
+    if settings.response_cache_size > 0:
+      _response_cache[key] = body
+      while len(_response_cache) > settings.response_cache_size:
+        _response_cache.popitem(last=False)
+  else:
+    _response_cache.move_to_end(key)
+  return Response(content=body, media_type="application/json", headers=headers)
@@ -1,22 +1,179 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+import time
+from typing import Dict
+from uuid import uuid4
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
 
 
-engine = create_async_engine(settings.db_url, echo=False, future=True)
+class TimedQueuePool(AsyncAdaptedQueuePool):
+  """연결 체크아웃 대기 시간과 타임아웃 횟수를 기록하는 풀"""
+
+  def __init__(self, *args, **kw):
+    super().__init__(*args, **kw)
+    self.checkouts = 0
+    self.wait_seconds = 0.0
+    self.max_wait_seconds = 0.0
+    self.timeouts = 0
+
+  def _do_get(self):
+    started = time.perf_counter()
+    try:
+      return super()._do_get()
+    except exc.TimeoutError:
+      self.timeouts += 1
+      raise
+    finally:
+      waited = time.perf_counter() - started
+      self.checkouts += 1
+      self.wait_seconds += waited
+      self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+def engine_options(url: str) -> dict:
+  """
+  Settings의 풀 설정 → create_async_engine 인자
+  SQLite는 풀 설정을 넘기지 않고 SQLAlchemy 기본값을 유지합니다.
+  db_transaction_pooler면 pgbouncer/Supavisor 트랜잭션 모드처럼 트랜잭션마다 서버 연결이 바뀌는 환경에 맞춰
+  asyncpg prepared statement 캐시를 끄고 statement 이름이 겹치지 않도록 합니다.
+  """
+  if url.startswith("sqlite"):
+    return {}
+  options = {
+    "poolclass": TimedQueuePool,
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
+    "pool_recycle": settings.db_pool_recycle,
+    "pool_pre_ping": settings.db_pool_pre_ping,
+  }
+  if url.startswith("postgresql+asyncpg"):
+    connect_args = {"prepared_statement_cache_size": settings.db_statement_cache_size}
+    if settings.db_transaction_pooler:
+      connect_args.update(
+        statement_cache_size=0,
+        prepared_statement_cache_size=0,
+        prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+      )
+    options["connect_args"] = connect_args
+  return options
+
+
+engine = create_async_engine(settings.db_url, echo=False, future=True, **engine_options(settings.db_url))
 SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# 읽기 전용 복제본 (database_read_url이 없으면 기본 DB를 그대로 사용)
+if settings.database_read_url:
+  read_engine = create_async_engine(
+    settings.database_read_url, echo=False, future=True, **engine_options(settings.database_read_url)
+  )
+  ReadSessionLocal = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False, info={"read_only": True}
+  )
+else:
+  read_engine = engine
+  ReadSessionLocal = SessionLocal
+
+# 학교별 "방금 쓴" 기한(epoch 초): 이 시각까지는 복제 지연을 피해 기본 DB에서 읽음
+# 워커 사이에는 기본 DB의 schools.read_primary_until로 공유하고, 여기에는 이 워커가 아는 값만 둠
+_recent_writes: Dict[int, float] = {}
+# 학교별로 기본 DB에서 기한을 마지막으로 확인한 시각(monotonic)
+_checked_at: Dict[int, float] = {}
+
 
 class Base(DeclarativeBase):
   pass
 
 
+def dialect_insert(table, dialect_name: str):
+  """ON CONFLICT(upsert) 구문을 지원하는 dialect별 insert 생성 (PostgreSQL / SQLite)"""
+  if dialect_name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert
+  else:
+    from sqlalchemy.dialects.sqlite import insert
+  return insert(table)
+
+
 async def get_session() -> AsyncSession:
   async with SessionLocal() as session:
     yield session
 
 
+async def mark_written(session: AsyncSession, school_id: int):
+  """
+  school_id 학교 데이터를 바꾸는 트랜잭션에서 호출 → 커밋되면 read_your_writes_seconds 동안 읽기도 기본 DB로
+  기한은 같은 트랜잭션으로 schools.read_primary_until에 기록해 다른 워커와 공유
+  (별도 트랜잭션 없음, 실패해 롤백되면 남지 않음. 복제본이 없으면 아무것도 하지 않음)
+  """
+  if ReadSessionLocal is SessionLocal:
+    return
+  until = time.time() + settings.read_your_writes_seconds
+  await session.execute(
+    text("UPDATE schools SET read_primary_until = :until WHERE id = :school_id"),
+    {"until": until, "school_id": school_id},
+  )
+  session.info.setdefault("written_schools", {})[school_id] = until
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writes(session: Session):
+  # 커밋된 기한만 이 워커의 메모리에 반영
+  _recent_writes.update(session.info.pop("written_schools", {}))
 
 
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session: Session):
+  session.info.pop("written_schools", None)
+
+
+async def read_sessionmaker(school_id: int) -> async_sessionmaker:
+  """
+  읽기 요청에 쓸 세션 팩토리 (복제본이 없거나 최근에 쓴 학교면 기본 DB)
+  다른 워커의 쓰기는 학교별로 read_your_writes_check_seconds마다 한 번만 기본 DB에서 확인
+  (기본 키 조회 1회. 그 사이에는 이 워커가 아는 기한만 보고 복제본 사용)
+  """
+  if ReadSessionLocal is SessionLocal:
+    return SessionLocal
+  now = time.time()
+  if _recent_writes.get(school_id, 0) > now:
+    return SessionLocal
+  checked_at = _checked_at.get(school_id)
+  if checked_at is not None and time.monotonic() - checked_at < settings.read_your_writes_check_seconds:
+    return ReadSessionLocal
+  _checked_at[school_id] = time.monotonic()
+  async with SessionLocal() as session:
+    until = (
+      await session.execute(
+        text("SELECT read_primary_until FROM schools WHERE id = :school_id"), {"school_id": school_id}
+      )
+    ).scalar()
+  if until and until > now:
+    _recent_writes[school_id] = until
+    return SessionLocal
+  _recent_writes.pop(school_id, None)
+  return ReadSessionLocal
+
 
+def pool_stats(target: AsyncEngine = engine) -> dict:
+  """연결 풀 상태 (체크아웃 수, overflow, 대기 시간)"""
+  pool = target.pool
+  stats = {"pool": type(pool).__name__}
+  if isinstance(pool, QueuePool):
+    stats.update(
+      size=pool.size(),
+      checked_out=pool.checkedout(),
+      checked_in=pool.checkedin(),
+      overflow=max(0, pool.overflow()),
+      max_overflow=pool._max_overflow,
+    )
+  if isinstance(pool, TimedQueuePool):
+    stats.update(
+      checkouts=pool.checkouts,
+      wait_seconds_total=round(pool.wait_seconds, 4),
+      max_wait_seconds=round(pool.max_wait_seconds, 4),
+      timeouts=pool.timeouts,
+    )
+  return stats
 
@@ -0,0 +1,120 @@
+"""
+교사 학년 이력(teacher_grade_history) 조회/저장 헬퍼
+- API 입출력은 기존과 같은 JSON 문자열 형식([{"year": 2023, "grade": 1}, ...])을 유지
+- 배정 엔진은 JSON 파싱 없이 집계 쿼리로 순환 규칙 대상을 조회
+"""
+import json
+from typing import Dict, Iterable, List, Set, Tuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import dialect_insert
+from app.models import Teacher, TeacherGradeHistory
+
+
+def parse_history_json(raw) -> List[Tuple[int, int]]:
+  """JSON 이력 → (연도, 학년) 목록. 같은 연도가 여러 번 있으면 마지막 값 사용, 잘못된 항목은 무시"""
+  if not raw:
+    return []
+  try:
+    history = json.loads(raw) if isinstance(raw, str) else raw
+  except (json.JSONDecodeError, TypeError):
+    return []
+  if not isinstance(history, list):
+    return []
+  by_year: Dict[int, int] = {}
+  for entry in history:
+    if not isinstance(entry, dict):
+      continue
+    try:
+      by_year[int(entry["year"])] = int(entry["grade"])
+    except (KeyError, TypeError, ValueError):
+      continue
+  return sorted(by_year.items())
+
+
+def to_history_json(entries: Iterable[Tuple[int, int]]) -> str | None:
+  """(연도, 학년) 목록 → API 응답용 JSON 문자열"""
+  history = [{"year": year, "grade": grade} for year, grade in entries]
+  if not history:
+    return None
+  return json.dumps(history, ensure_ascii=False)
+
+
+async def load_history_json(session: AsyncSession, teacher_id: int) -> str | None:
+  """교사 1명의 학년 이력을 JSON 문자열로 조회"""
+  rows = (
+    await session.execute(
+      select(TeacherGradeHistory.year, TeacherGradeHistory.grade)
+      .where(TeacherGradeHistory.teacher_id == teacher_id)
+      .order_by(TeacherGradeHistory.year)
+    )
+  ).all()
+  return to_history_json((r.year, r.grade) for r in rows)
+
+
+async def replace_history(session: AsyncSession, teacher_id: int, entries: List[Tuple[int, int]]):
+  """교사 1명의 학년 이력을 통째로 교체 (같은 연도가 중복되면 마지막 값 사용)"""
+  entries = sorted(dict(entries).items())
+  await session.execute(
+    delete(TeacherGradeHistory).where(TeacherGradeHistory.teacher_id == teacher_id)
+  )
+  if entries:
+    await session.execute(
+      TeacherGradeHistory.__table__.insert(),
+      [{"teacher_id": teacher_id, "year": year, "grade": grade} for year, grade in entries],
+    )
+
+
+async def replace_histories(session: AsyncSession, histories: Dict[int, List[Tuple[int, int]]]):
+  """여러 교사의 학년 이력을 DELETE 1회 + INSERT 1회로 교체"""
+  if not histories:
+    return
+  await session.execute(
+    delete(TeacherGradeHistory).where(TeacherGradeHistory.teacher_id.in_(list(histories)))
+  )
+  rows = [
+    {"teacher_id": teacher_id, "year": year, "grade": grade}
+    for teacher_id, entries in histories.items()
+    for year, grade in sorted(dict(entries).items())
+  ]
+  if rows:
+    await session.execute(TeacherGradeHistory.__table__.insert(), rows)
+
+
+async def upsert_history(session: AsyncSession, rows: List[dict]):
+  """(teacher_id, year, grade) 행들을 한 번에 저장. 같은 연도 기록이 있으면 학년만 갱신"""
+  if not rows:
+    return
+  stmt = dialect_insert(TeacherGradeHistory.__table__, session.bind.dialect.name)
+  stmt = stmt.on_conflict_do_update(
+    index_elements=["teacher_id", "year"],
+    set_={"grade": stmt.excluded.grade},
+  )
+  await session.execute(stmt, rows)
+
+
+async def load_repeated_grades(
+  session: AsyncSession,
+  before_year: int,
+  teacher_ids: Iterable[int] | None = None,
+  school_id: int | None = None,
+) -> Dict[int, Set[int]]:
+  """
+  before_year 이전에 같은 학년을 2번 이상 담임한 (교사 → 학년 집합) 조회
+  GROUP BY teacher_id, grade HAVING count >= 2 한 번으로 처리합니다.
+  teacher_ids가 주어지면 해당 교사만, school_id가 주어지면 해당 학교 교사만 조회합니다.
+  """
+  stmt = (
+    select(TeacherGradeHistory.teacher_id, TeacherGradeHistory.grade)
+    .where(TeacherGradeHistory.year < before_year)
+    .group_by(TeacherGradeHistory.teacher_id, TeacherGradeHistory.grade)
+    .having(func.count() >= 2)
+  )
+  if teacher_ids is not None:
+    stmt = stmt.where(TeacherGradeHistory.teacher_id.in_(list(teacher_ids)))
+  if school_id is not None:
+    stmt = stmt.join(Teacher, Teacher.id == TeacherGradeHistory.teacher_id).where(Teacher.school_id == school_id)
+  repeated: Dict[int, Set[int]] = {}
+  for teacher_id, grade in (await session.execute(stmt)).all():
+    repeated.setdefault(teacher_id, set()).add(grade)
+  return repeated
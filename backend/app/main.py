@@ -1,9 +1,18 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
+from sqlalchemy import select
+import asyncio
 from app.api import auth, preferences, admin
-from app.db import engine, Base
+from app.core.google_auth import close_http_client, start_http_client
+from app.core.metrics import DB_POOL, REGISTRY, QueryMetricsMiddleware, prometheus_enabled
+from app.db import engine, read_engine, pool_stats
+from app.migrate import migrate
+from app.models import School
+from app.assignment.jobs import start_stale_job_sweeper, stop_stale_job_sweeper
+from app.assignment.batch import shutdown_batch_pool, start_batch_pool
+from app.preference_buffer import preference_buffer
 import logging
 
 app = FastAPI(title="Assignment Service")
@@ -31,6 +40,9 @@ app.add_middleware(
   max_age=3600,  # preflight 요청 캐시 시간
 )
 
+# 요청별 SQL 수/DB 시간 집계 (Server-Timing 헤더, /metrics 히스토그램, 느린 요청 로그)
+app.add_middleware(QueryMetricsMiddleware)
+
 # 전역 예외 처리
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -51,10 +63,95 @@ async def general_exception_handler(request: Request, exc: Exception):
   )
 
 
+# startup이 끝나야 /ready가 200 (희망 일괄 저장 작업이 시작되기 전에는 트래픽을 받지 않도록)
+_started = False
+
+
 @app.on_event("startup")
 async def on_startup():
-  async with engine.begin() as conn:
-    await conn.run_sync(Base.metadata.create_all)
+  global _started
+  # 운영(워커 여러 개)에서는 python -m app.migrate를 먼저 한 번 실행하고 AUTO_MIGRATE=false
+  if settings.auto_migrate:
+    await migrate()
+  # 희망 제출 일괄 저장 작업 시작
+  await preference_buffer.start()
+  # 이전 실행에서 중단된 배정 작업(queued/running) 정리
+  start_stale_job_sweeper()
+  # 여러 학교 일괄 배정용 공유 프로세스 풀
+  start_batch_pool()
+  # 구글 로그인용 공유 HTTP 클라이언트 (연결 재사용)
+  start_http_client()
+  _started = True
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+  global _started
+  _started = False
+  await preference_buffer.stop()
+  await stop_stale_job_sweeper()
+  await shutdown_batch_pool()
+  await close_http_client()
+
+
+def _pools() -> dict:
+  pools = {"primary": pool_stats(engine)}
+  if read_engine is not engine:
+    pools["read"] = pool_stats(read_engine)
+  return pools
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+  """Prometheus 수집용 계측 값 (metrics_sinks에 prometheus가 있을 때만)"""
+  if not prometheus_enabled():
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "Not Found"})
+  for name, stats in _pools().items():
+    for stat, value in stats.items():
+      if isinstance(value, (int, float)):
+        DB_POOL.set(value, engine=name, stat=stat)
+  return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+async def health():
+  """상태 확인 (연결 풀 사용량 포함)"""
+  pools = _pools()
+  health = {"status": "ok", "db_pool": pools["primary"]}
+  if "read" in pools:
+    health["db_read_pool"] = pools["read"]
+  return health
+
+
+async def _check_db(target) -> str | None:
+  """풀에서 연결을 받아 학교 테이블 조회 (마이그레이션 전이거나 DB에 못 붙으면 오류 메시지)"""
+  async def probe():
+    async with target.connect() as conn:
+      await conn.execute(select(School.id).limit(1))
+
+  try:
+    # 풀이 꽉 차 연결을 기다리는 시간도 제한 시간에 포함
+    await asyncio.wait_for(probe(), settings.ready_timeout)
+  except Exception as e:
+    detail = str(e).splitlines()[0] if str(e) else ""
+    return f"{type(e).__name__}: {detail}"[:200]
+  return None
+
+
+@app.get("/ready")
+async def ready():
+  """준비 상태 확인 (startup 완료 + DB 연결·스키마 확인). 준비되지 않았으면 503"""
+  checks = {"startup": "ok" if _started else "starting"}
+  targets = {"db": engine}
+  if read_engine is not engine:
+    targets["db_read"] = read_engine
+  for name, target in targets.items():
+    checks[name] = await _check_db(target) or "ok"
+  ok = all(value == "ok" for value in checks.values())
+  return JSONResponse(
+    status_code=status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE,
+    content={"status": "ok" if ok else "unavailable", "checks": checks, "db_pool": pool_stats(engine)},
+  )
 
 
 app.include_router(auth.router)
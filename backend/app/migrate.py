@@ -0,0 +1,33 @@
+"""
+스키마 생성 및 보정 1회 실행
+  python -m app.migrate
+
+운영(gunicorn 워커 여러 개)에서는 서버를 띄우기 전에 이 명령을 한 번 실행하고
+AUTO_MIGRATE=false로 워커 startup에서 DDL을 실행하지 않도록 합니다.
+"""
+import asyncio
+import logging
+from app.db import Base, engine
+from app.migrations import run_migrations
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate():
+  """테이블 생성(create_all) 후 스키마 보정/데이터 이관 (여러 번 실행해도 안전)"""
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(conn)
+
+
+async def _main():
+  try:
+    await migrate()
+  finally:
+    await engine.dispose()
+  logger.info("마이그레이션 완료")
+
+
+if __name__ == "__main__":
+  logging.basicConfig(level=logging.INFO)
+  asyncio.run(_main())
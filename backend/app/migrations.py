@@ -0,0 +1,177 @@
+"""
+스키마 보정 및 데이터 이관
+create_all 이후 실행되며, 모든 단계는 여러 번 실행해도 안전하도록(idempotent) 작성합니다.
+"""
+import logging
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.db import Base, dialect_insert
+from app.grade_history import parse_history_json
+from app.models import DEFAULT_SCHOOL_ID, PreferenceSummary, School, Teacher, TeacherGradeHistory
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_grade_history(conn: AsyncConnection):
+  """teachers.grade_history(JSON) → teacher_grade_history 테이블 이관 후 JSON 컬럼 비우기"""
+  legacy = (
+    await conn.execute(
+      select(Teacher.id, Teacher.grade_history).where(Teacher.grade_history.is_not(None))
+    )
+  ).all()
+  if not legacy:
+    return
+
+  rows = [
+    {"teacher_id": teacher_id, "year": year, "grade": grade}
+    for teacher_id, raw in legacy
+    for year, grade in parse_history_json(raw)
+  ]
+  if rows:
+    stmt = dialect_insert(TeacherGradeHistory.__table__, conn.dialect.name)
+    await conn.execute(stmt.on_conflict_do_nothing(index_elements=["teacher_id", "year"]), rows)
+  await conn.execute(
+    update(Teacher.__table__)
+    .where(Teacher.grade_history.is_not(None))
+    .values(grade_history=None)
+  )
+  logger.info(f"grade_history 이관 완료: 교사 {len(legacy)}명, 이력 {len(rows)}건")
+
+
+# 학교(school_id) 컬럼이 나중에 추가된 테이블
+SCHOOL_SCOPED_TABLES = ("teachers", "preferences", "grade_settings", "assignments", "admin_settings", "assignment_jobs")
+# 학교 단위 고유 인덱스로 바뀌면서 없애야 하는 기존 전역 고유 인덱스/제약의 컬럼
+# (create_all로 만든 DB는 ix_* 고유 인덱스, supabase_schema.sql로 만든 DB는 *_key 고유 제약)
+LEGACY_UNIQUE_COLUMNS = {
+  "teachers": ("name",),
+  "admin_settings": ("year",),
+  "grade_settings": ("year", "grade"),
+}
+
+
+def _columns(sync_conn, table: str) -> set:
+  return {c["name"] for c in inspect(sync_conn).get_columns(table)}
+
+
+async def add_school_credentials(conn: AsyncConnection):
+  """
+  schools에 학교별 비밀번호/자가 등록 컬럼 추가
+  기존 기본 학교는 이전처럼 명단에 없는 교사도 이름으로 로그인(등록)할 수 있도록 자가 등록 허용
+  """
+  columns = await conn.run_sync(_columns, "schools")
+  for column in ("admin_password_hash", "teacher_password_hash"):
+    if column not in columns:
+      await conn.execute(text(f"ALTER TABLE schools ADD COLUMN {column} VARCHAR"))
+      logger.info(f"schools.{column} 컬럼 추가")
+  if "self_enrollment" not in columns:
+    await conn.execute(text("ALTER TABLE schools ADD COLUMN self_enrollment BOOLEAN NOT NULL DEFAULT FALSE"))
+    await conn.execute(
+      update(School.__table__).where(School.id == DEFAULT_SCHOOL_ID).values(self_enrollment=True)
+    )
+    logger.info("schools.self_enrollment 컬럼 추가")
+
+
+async def ensure_default_school(conn: AsyncConnection):
+  """기본 학교 생성 (단일 학교 배포와 같은 동작을 위해 자가 등록 허용)"""
+  stmt = dialect_insert(School.__table__, conn.dialect.name)
+  await conn.execute(
+    stmt.on_conflict_do_nothing(index_elements=["id"]),
+    {"id": DEFAULT_SCHOOL_ID, "name": "기본 학교", "self_enrollment": True},
+  )
+  if conn.dialect.name == "postgresql":
+    # id를 직접 넣었으므로 시퀀스를 현재 최대 id로 맞춤 (다음 학교 생성 시 id 1 충돌 방지)
+    await conn.execute(text(
+      "SELECT setval(pg_get_serial_sequence('schools', 'id'), (SELECT MAX(id) FROM schools))"
+    ))
+
+
+async def add_school_columns(conn: AsyncConnection):
+  """기존 테이블에 school_id 추가 (기존 행은 기본 학교로 채움)"""
+  references = " REFERENCES schools(id)" if conn.dialect.name == "postgresql" else ""
+  for table in SCHOOL_SCOPED_TABLES:
+    columns = await conn.run_sync(_columns, table)
+    if "school_id" not in columns:
+      await conn.execute(text(
+        f"ALTER TABLE {table} ADD COLUMN school_id INTEGER NOT NULL DEFAULT {DEFAULT_SCHOOL_ID}{references}"
+      ))
+      logger.info(f"{table}.school_id 컬럼 추가")
+
+  # 집계 테이블은 다시 계산할 수 있으므로 기본 키가 바뀌었으면 새로 만듦
+  if "school_id" not in await conn.run_sync(_columns, PreferenceSummary.__tablename__):
+    await conn.run_sync(lambda sync_conn: PreferenceSummary.__table__.drop(sync_conn))
+    await conn.run_sync(lambda sync_conn: PreferenceSummary.__table__.create(sync_conn))
+
+  def drop_legacy_unique(sync_conn):
+    inspector = inspect(sync_conn)
+    for table, legacy_columns in LEGACY_UNIQUE_COLUMNS.items():
+      for constraint in inspector.get_unique_constraints(table):
+        if tuple(constraint["column_names"]) != legacy_columns:
+          continue
+        name = constraint["name"]
+        if sync_conn.dialect.name == "postgresql" and name:
+          sync_conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+          logger.info(f"전역 고유 제약 삭제: {table}.{name}")
+        else:
+          # SQLite의 테이블 정의 안 UNIQUE는 테이블을 다시 만들어야만 없앨 수 있음
+          logger.warning(f"전역 고유 제약을 삭제할 수 없음: {table}{legacy_columns} (테이블 재생성 필요)")
+      for idx in inspector.get_indexes(table):
+        # 제약이 만든 인덱스(Postgres)는 위에서 제약과 함께 삭제됨
+        if idx["unique"] and tuple(idx["column_names"]) == legacy_columns and not idx.get("duplicates_constraint"):
+          sync_conn.execute(text(f'DROP INDEX "{idx["name"]}"'))
+          logger.info(f"전역 고유 인덱스 삭제: {idx['name']}")
+  await conn.run_sync(drop_legacy_unique)
+
+
+# 나중에 추가된 일반(nullable) 컬럼: 테이블 → {컬럼: 타입}
+LATER_COLUMNS = {
+  "assignment_jobs": {"metrics": "TEXT", "heartbeat_at": "TIMESTAMP"},
+  "schools": {"read_primary_until": "FLOAT", "token_version": "INTEGER"},
+  "teachers": {"token_version": "INTEGER"},
+  "admin_settings": {"solver": "VARCHAR"},
+}
+
+
+async def add_later_columns(conn: AsyncConnection):
+  """기존 테이블에 나중에 추가된 nullable 컬럼 추가"""
+  for table, columns in LATER_COLUMNS.items():
+    existing = await conn.run_sync(_columns, table)
+    for column, column_type in columns.items():
+      if column not in existing:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        logger.info(f"{table}.{column} 컬럼 추가")
+
+
+async def dedupe_preferences(conn: AsyncConnection):
+  """
+  (teacher_id, year) 고유 인덱스를 만들기 전에 중복 희망 정리 (가장 나중 행만 남김)
+  같은 컬럼의 고유 인덱스로 대신하므로 기존 비고유 인덱스 ix_preferences_year_teacher는 삭제
+  """
+  def unique_exists(sync_conn):
+    return any(idx["name"] == "uq_preferences_year_teacher" for idx in inspect(sync_conn).get_indexes("preferences"))
+
+  if not await conn.run_sync(unique_exists):
+    deleted = await conn.execute(text(
+      "DELETE FROM preferences WHERE id NOT IN (SELECT MAX(id) FROM preferences GROUP BY teacher_id, year)"
+    ))
+    if deleted.rowcount:
+      logger.info(f"중복 희망 {deleted.rowcount}건 삭제")
+    await conn.execute(text("DROP INDEX IF EXISTS ix_preferences_year_teacher"))
+
+
+async def ensure_indexes(conn: AsyncConnection):
+  """기존 테이블에 나중에 추가된 인덱스 생성 (create_all은 기존 테이블의 인덱스를 만들지 않음)"""
+  def create_missing(sync_conn):
+    for table in Base.metadata.sorted_tables:
+      for idx in table.indexes:
+        idx.create(sync_conn, checkfirst=True)
+  await conn.run_sync(create_missing)
+
+
+async def run_migrations(conn: AsyncConnection):
+  await add_school_credentials(conn)
+  await ensure_default_school(conn)
+  await add_school_columns(conn)
+  await add_later_columns(conn)
+  await dedupe_preferences(conn)
+  await ensure_indexes(conn)
+  await backfill_grade_history(conn)
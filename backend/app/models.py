@@ -1,12 +1,45 @@
-from sqlalchemy import Integer, String, Boolean, ForeignKey, JSON, Text
+from sqlalchemy import Integer, String, Boolean, Float, ForeignKey, JSON, Text, Index, UniqueConstraint, DateTime
+from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db import Base
 
+# 단일 학교 배포 및 school_id가 없는 기존 토큰/데이터의 기본 학교
+DEFAULT_SCHOOL_ID = 1
+
+
+def school_column() -> Mapped[int]:
+  """학교(테넌트) 컬럼. 기존 데이터는 기본 학교로 채워짐"""
+  return mapped_column(
+    ForeignKey("schools.id"), default=DEFAULT_SCHOOL_ID, server_default=str(DEFAULT_SCHOOL_ID)
+  )
+
+
+class School(Base):
+  """학교 (테넌트). 교육청 단위로 여러 학교를 한 백엔드에서 운영"""
+  __tablename__ = "schools"
+  id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+  name: Mapped[str] = mapped_column(String, unique=True)
+  created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+  # 학교별 관리자/교사 비밀번호 해시 (비어 있으면 기본 학교만 전역 ADMIN_PASSWORD/TEACHER_PASSWORD 사용)
+  admin_password_hash: Mapped[str | None] = mapped_column(String, nullable=True)
+  teacher_password_hash: Mapped[str | None] = mapped_column(String, nullable=True)
+  # 교사 명단에 없는 사람이 로그인하면 교사로 등록할지 여부 (False면 명단에 있는 교사만 로그인)
+  self_enrollment: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
+  # 이 시각(epoch 초)까지는 관리자 조회도 복제본 대신 기본 DB에서 읽음 (워커 사이 read-your-writes)
+  read_primary_until: Mapped[float | None] = mapped_column(Float, nullable=True)
+  # 올리면 이 학교에 발급된 토큰(관리자·교사)이 모두 무효 (토큰의 ver 클레임과 비교, 비어 있으면 1)
+  token_version: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
 
 class Teacher(Base):
   __tablename__ = "teachers"
+  __table_args__ = (
+    # 이름은 학교 안에서만 고유
+    Index("uq_teachers_school_name", "school_id", "name", unique=True),
+  )
   id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-  name: Mapped[str] = mapped_column(String, unique=True, index=True)
+  school_id: Mapped[int] = school_column()
+  name: Mapped[str] = mapped_column(String, index=True)
   email: Mapped[str | None] = mapped_column(String, nullable=True, unique=True, index=True)  # 구글 이메일
   google_id: Mapped[str | None] = mapped_column(String, nullable=True, unique=True, index=True)  # 구글 ID
   gender: Mapped[str | None] = mapped_column(String(10), nullable=True)
@@ -19,15 +52,39 @@ class Teacher(Base):
   duty_role: Mapped[str | None] = mapped_column(String, nullable=True)  # 업무부장/학년부장/교과전담 등
   subject: Mapped[str | None] = mapped_column(String, nullable=True)
   special_conditions: Mapped[str | None] = mapped_column(String, nullable=True)
-  grade_history: Mapped[str | None] = mapped_column(Text, nullable=True)  # 본교 근무 기간 동안 담임한 학년 이력 (JSON 형식: [{"year": 2023, "grade": 1}, ...])
+  grade_history: Mapped[str | None] = mapped_column(Text, nullable=True)  # (레거시) JSON 학년 이력. teacher_grade_history 테이블로 이관 후 비워짐
+  # 올리면 이 교사에게 발급된 토큰이 무효 (토큰의 tver 클레임과 비교, 비어 있으면 1)
+  token_version: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
   preferences: Mapped[list["Preference"]] = relationship(back_populates="teacher")
   assignments: Mapped[list["Assignment"]] = relationship(back_populates="teacher")
+  grade_records: Mapped[list["TeacherGradeHistory"]] = relationship(back_populates="teacher")
+
+
+class TeacherGradeHistory(Base):
+  """본교 근무 기간 동안 담임한 학년 이력 (교사·연도별 1건)"""
+  __tablename__ = "teacher_grade_history"
+  __table_args__ = (
+    UniqueConstraint("teacher_id", "year", name="uq_teacher_grade_history_teacher_year"),
+    Index("ix_teacher_grade_history_teacher_grade", "teacher_id", "grade"),
+  )
+  id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+  teacher_id: Mapped[int] = mapped_column(ForeignKey("teachers.id"))
+  year: Mapped[int] = mapped_column(Integer)
+  grade: Mapped[int] = mapped_column(Integer)
+
+  teacher: Mapped[Teacher] = relationship(back_populates="grade_records")
 
 
 class Preference(Base):
   __tablename__ = "preferences"
+  __table_args__ = (
+    # 교사당 연도별 희망 1건 (희망 저장 upsert의 ON CONFLICT 대상), 연도별 목록 조회 및 교사 조인용
+    Index("uq_preferences_year_teacher", "year", "teacher_id", unique=True),
+    Index("ix_preferences_school_year", "school_id", "year"),
+  )
   id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+  school_id: Mapped[int] = school_column()
   teacher_id: Mapped[int] = mapped_column(ForeignKey("teachers.id"))
   year: Mapped[int] = mapped_column(Integer, index=True)
   first_choice_grade: Mapped[int | None] = mapped_column(Integer, nullable=True)  # 교과전담 선택 시 null
@@ -43,7 +100,11 @@ class Preference(Base):
 
 class GradeSetting(Base):
   __tablename__ = "grade_settings"
+  __table_args__ = (
+    Index("ix_grade_settings_school_year", "school_id", "year"),
+  )
   id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+  school_id: Mapped[int] = school_column()
   year: Mapped[int] = mapped_column(Integer, index=True)
   grade: Mapped[int] = mapped_column(Integer)
   class_count: Mapped[int] = mapped_column(Integer)
@@ -54,7 +115,11 @@ class GradeSetting(Base):
 
 class Assignment(Base):
   __tablename__ = "assignments"
+  __table_args__ = (
+    Index("ix_assignments_school_year", "school_id", "year"),
+  )
   id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+  school_id: Mapped[int] = school_column()
   teacher_id: Mapped[int] = mapped_column(ForeignKey("teachers.id"))
   year: Mapped[int] = mapped_column(Integer, index=True)
   assigned_grade: Mapped[int] = mapped_column(Integer)
@@ -78,8 +143,55 @@ class AssignmentLog(Base):
 
 class AdminSetting(Base):
   __tablename__ = "admin_settings"
+  __table_args__ = (
+    Index("uq_admin_settings_school_year", "school_id", "year", unique=True),
+  )
   id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-  year: Mapped[int] = mapped_column(Integer, unique=True, index=True)
+  school_id: Mapped[int] = school_column()
+  year: Mapped[int] = mapped_column(Integer, index=True)
   total_teachers: Mapped[int] = mapped_column(Integer, default=0)  # 전체 교사 수
   is_closed: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")  # 마감 여부
+  solver: Mapped[str | None] = mapped_column(String, nullable=True)  # 마지막 전체 배정 방식 (증분 재배정도 같은 방식)
 
+
+
+class AssignmentJob(Base):
+  """백그라운드 배정 작업"""
+  __tablename__ = "assignment_jobs"
+  id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+  school_id: Mapped[int] = school_column()
+  year: Mapped[int] = mapped_column(Integer, index=True)
+  solver: Mapped[str] = mapped_column(String, default="greedy")
+  status: Mapped[str] = mapped_column(String, default="queued")  # queued/running/succeeded/failed
+  phase: Mapped[str | None] = mapped_column(String, nullable=True)  # 현재 진행 단계
+  progress: Mapped[int] = mapped_column(Integer, default=0)  # 진행률 (%)
+  phase_timings: Mapped[str | None] = mapped_column(Text, nullable=True)  # 단계별 소요 시간(초) JSON
+  metrics: Mapped[str | None] = mapped_column(Text, nullable=True)  # 단계별 쿼리 수/변경 행 수 등 계측 JSON
+  assigned_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+  error: Mapped[str | None] = mapped_column(String, nullable=True)
+  created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+  started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+  finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+  # 작업을 맡은 워커가 살아 있는 동안 주기적으로 갱신 (끊긴 queued/running 작업은 실패로 정리)
+  heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class PreferenceSummary(Base):
+  """학교·연도별 희망 제출 집계 (희망 저장/삭제 시 갱신, 대시보드는 이 행 1개만 조회)"""
+  __tablename__ = "preference_summaries"
+  school_id: Mapped[int] = mapped_column(ForeignKey("schools.id"), primary_key=True)
+  year: Mapped[int] = mapped_column(Integer, primary_key=True)
+  submitted_count: Mapped[int] = mapped_column(Integer, default=0)
+  choice_counts: Mapped[str] = mapped_column(Text, default="{}")  # {"first": {학년: 수}, "second": ..., "third": ...} JSON
+  updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DataVersion(Base):
+  """
+  학교·연도별 데이터 버전 (희망/설정/배정이 바뀔 때 같은 트랜잭션에서 1 증가)
+  관리자 조회의 ETag와 응답 캐시 키로 사용. year=0은 연도와 무관한 학교 전체 데이터(교사 명단)
+  """
+  __tablename__ = "data_versions"
+  school_id: Mapped[int] = mapped_column(ForeignKey("schools.id"), primary_key=True)
+  year: Mapped[int] = mapped_column(Integer, primary_key=True)
+  version: Mapped[int] = mapped_column(Integer, default=0)
@@ -0,0 +1,251 @@
+"""
+희망 제출 일괄 저장 (group commit)
+- POST /preferences/me는 검증한 제출을 버퍼에 넣고, 그 제출이 들어간 일괄 저장이 커밋된 뒤에 응답
+- 저장은 한 번에 하나씩 실행되며, 저장하는 동안 들어온 제출은 다음 저장에 함께 묶임
+  (같은 (교사, 연도)는 마지막 제출만 저장, 최대 preference_flush_batch건씩
+  INSERT ... ON CONFLICT (teacher_id, year) DO UPDATE 1회)
+- 응답한 제출은 이미 DB에 있으므로 워커가 여러 개이거나 워커가 죽어도 저장되지 않고 남는 제출이 없음
+- 마감 여부는 저장 트랜잭션 안에서 admin_settings 행을 공유 잠금(FOR SHARE)으로 읽어 다시 확인하고,
+  마감된 학교·연도의 제출은 저장하지 않고 PreferencesClosed로 돌려줌
+  마감 요청의 UPDATE와 잠금 순서가 정해지므로 마감이 커밋된 뒤에 저장되는 제출은 없음
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.assignment.incremental import reassign_in_background
+from app.core.config import settings
+from app.db import SessionLocal, dialect_insert
+from app.models import AdminSetting, Preference
+from app.preference_summary import refresh_summary
+
+logger = logging.getLogger(__name__)
+
+# upsert 시 갱신하는 컬럼
+UPDATE_FIELDS = (
+  "school_id",
+  "first_choice_grade",
+  "second_choice_grade",
+  "third_choice_grade",
+  "wants_grade_head",
+  "wants_subject_teacher",
+  "wants_duty_head",
+  "comment",
+)
+
+PreferenceKey = Tuple[int, int]  # (teacher_id, year)
+
+
+class PreferencesClosed(Exception):
+  """저장 시점에 희망 제출이 마감된 학교·연도"""
+
+
+class PreferenceRejected(ValueError):
+  """저장할 수 없는 제출 (그 사이 삭제된 교사 등)"""
+
+
+async def upsert_preferences(session: AsyncSession, rows: List[dict]):
+  """희망 행들을 INSERT ... ON CONFLICT (teacher_id, year) DO UPDATE 1회로 저장하고 학교·연도별 집계 갱신"""
+  stmt = dialect_insert(Preference.__table__, session.bind.dialect.name)
+  stmt = stmt.on_conflict_do_update(
+    index_elements=["year", "teacher_id"],
+    set_={key: stmt.excluded[key] for key in UPDATE_FIELDS},
+  )
+  await session.execute(stmt, rows)
+  for school_id, year in sorted({(r["school_id"], r["year"]) for r in rows}):
+    await refresh_summary(session, year, school_id)
+
+
+async def closed_years(session: AsyncSession, school_years: Iterable[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+  """
+  마감된 (학교, 연도). 트랜잭션이 끝날 때까지 admin_settings 행을 공유 잠금해
+  마감 요청의 UPDATE가 이 트랜잭션의 커밋 전후 어느 한쪽으로 정해지도록 함
+  """
+  # 마감되지 않은 행도 잠가야 하므로 is_closed는 조건이 아니라 결과로 읽음
+  rows = (
+    await session.execute(
+      select(AdminSetting.school_id, AdminSetting.year, AdminSetting.is_closed)
+      .where(tuple_(AdminSetting.school_id, AdminSetting.year).in_(list(school_years)))
+      .with_for_update(read=True)
+    )
+  ).all()
+  return {(school_id, year) for school_id, year, closed in rows if closed}
+
+
+class PreferenceBuffer:
+  def __init__(self):
+    self._pending: Dict[PreferenceKey, dict] = {}
+    # 같은 (교사, 연도)를 기다리는 요청들 (마지막 제출의 저장 결과를 함께 받음)
+    self._waiters: Dict[PreferenceKey, List[asyncio.Future]] = defaultdict(list)
+    self._flush_lock = asyncio.Lock()
+    self._wakeup: asyncio.Event | None = None
+    self._task: asyncio.Task | None = None
+    self._reassign_tasks: Set[asyncio.Task] = set()
+
+  async def submit(self, row: dict):
+    """
+    검증된 희망 1건을 버퍼에 넣고 DB에 커밋될 때까지 대기
+    마감됐으면 PreferencesClosed, 저장할 수 없는 행이면 PreferenceRejected
+    """
+    key = (row["teacher_id"], row["year"])
+    future = asyncio.get_running_loop().create_future()
+    self._pending[key] = row
+    self._waiters[key].append(future)
+    if self._task is not None and settings.preference_buffer_enabled:
+      self._wakeup.set()
+    else:
+      # 저장 작업이 없으면(시작 전/버퍼 끔) 요청에서 바로 저장 (결과와 예외는 future로 받음)
+      try:
+        await self.flush()
+      except Exception:
+        pass
+    await future
+
+  async def flush(self) -> int:
+    """버퍼 전체 저장 후 기다리는 요청에 결과 전달. 저장한 건수 반환"""
+    async with self._flush_lock:
+      saved = 0
+      error = None
+      while self._pending:
+        keys = list(self._pending)[: settings.preference_flush_batch]
+        batch = [self._pending.pop(key) for key in keys]
+        waiters = {key: self._waiters.pop(key, []) for key in keys}
+        try:
+          accepted, closed = await self._save(batch)
+        except Exception as e:
+          # 이 묶음을 기다리는 요청에는 예외를 전달하고 나머지 묶음은 계속 저장
+          for futures in waiters.values():
+            _resolve(futures, e)
+          error = error or e
+          continue
+        accepted_keys = {(row["teacher_id"], row["year"]) for row in accepted}
+        for row in batch:
+          key = (row["teacher_id"], row["year"])
+          if key in accepted_keys:
+            _resolve(waiters[key])
+          elif (row["school_id"], row["year"]) in closed:
+            _resolve(waiters[key], PreferencesClosed())
+          else:
+            _resolve(waiters[key], PreferenceRejected("희망을 저장할 수 없습니다."))
+        saved += len(accepted)
+      if error:
+        raise error
+      return saved
+
+  async def _save(self, rows: List[dict]) -> Tuple[List[dict], Set[Tuple[int, int]]]:
+    """마감되지 않은 학교·연도의 행만 저장 → (저장한 행, 마감된 (학교, 연도))"""
+    school_years = {(r["school_id"], r["year"]) for r in rows}
+    async with SessionLocal() as session:
+      closed = await closed_years(session, school_years)
+      accepted = [r for r in rows if (r["school_id"], r["year"]) not in closed]
+      try:
+        if accepted:
+          await upsert_preferences(session, accepted)
+        await session.commit()
+      except IntegrityError:
+        # 그 사이 삭제된 교사 등 저장할 수 없는 행만 빼고 다시 저장 (롤백으로 풀린 잠금도 다시 잡음)
+        await session.rollback()
+        closed = await closed_years(session, school_years)
+        valid = []
+        for row in rows:
+          if (row["school_id"], row["year"]) in closed:
+            continue
+          try:
+            async with session.begin_nested():
+              await upsert_preferences(session, [row])
+            valid.append(row)
+          except IntegrityError:
+            logger.warning(f"희망 저장 불가로 제외: teacher_id={row['teacher_id']}, year={row['year']}")
+        await session.commit()
+        accepted = valid
+    if closed:
+      late = sum((r["school_id"], r["year"]) in closed for r in rows)
+      logger.info(f"마감 후 도착한 희망 {late}건 거부: {sorted(closed)}")
+    if settings.auto_reassign_on_submit:
+      self._reassign(accepted)
+    return accepted, closed
+
+  def _reassign(self, rows: List[dict]):
+    """
+    이미 배정 결과가 있으면 제출한 교사와 관련된 학년만 학교·연도별로 묶어 증분 재배정
+    (auto_reassign_on_submit일 때만. 기본은 관리자가 /admin/assign/incremental로 직접 실행)
+    """
+    groups: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for row in rows:
+      groups[(row["school_id"], row["year"])].append(row["teacher_id"])
+    for (school_id, year), teacher_ids in groups.items():
+      task = asyncio.create_task(reassign_in_background(year, teacher_ids, school_id))
+      self._reassign_tasks.add(task)
+      task.add_done_callback(self._reassign_tasks.discard)
+
+  # -- 수명 주기 --------------------------------------------------------------
+
+  async def _flush_loop(self):
+    while True:
+      await self._wakeup.wait()
+      self._wakeup.clear()
+      try:
+        await self.flush()
+      except Exception as e:
+        # 실패한 제출은 각 요청에 예외로 전달됨
+        logger.error(f"희망 일괄 저장 실패: {e}", exc_info=True)
+
+  async def start(self):
+    self._wakeup = asyncio.Event()
+    self._task = asyncio.create_task(self._flush_loop())
+
+  async def stop(self):
+    if self._task:
+      self._task.cancel()
+      try:
+        await self._task
+      except asyncio.CancelledError:
+        pass
+      self._task = None
+    # 종료 중 아직 응답하지 않은 제출 저장
+    await self.flush()
+
+
+def _resolve(futures: List[asyncio.Future], error: Exception | None = None):
+  for future in futures:
+    if future.done():
+      continue
+    if error is None:
+      future.set_result(None)
+    else:
+      future.set_exception(error)
+
+
+preference_buffer = PreferenceBuffer()
+
+
+# 열린 상태 캐시: (학교, 연도) → 만료 시각
+# 마감은 저장 트랜잭션(closed_years)에서 다시 확인하므로, 다른 워커가 마감해 캐시가 늦더라도 마감 후 저장되지 않음
+# 마감 상태는 캐시하지 않아 다른 워커에서 다시 열면 바로 제출할 수 있음
+_open_cache: Dict[Tuple[int, int], float] = {}
+
+
+async def is_closed(session: AsyncSession, school_id: int, year: int) -> bool:
+  """희망 제출 마감 여부 (요청 단계의 빠른 거절용. 열린 상태만 closed_status_cache_seconds 동안 캐시)"""
+  now = time.monotonic()
+  if _open_cache.get((school_id, year), 0) > now:
+    return False
+  closed = bool(
+    (
+      await session.execute(
+        select(AdminSetting.is_closed).where(AdminSetting.school_id == school_id, AdminSetting.year == year)
+      )
+    ).scalar()
+  )
+  if not closed:
+    _open_cache[(school_id, year)] = now + settings.closed_status_cache_seconds
+  return closed
+
+
+def forget_closed(school_id: int, year: int):
+  """마감 설정이 바뀌면 이 워커의 캐시 삭제"""
+  _open_cache.pop((school_id, year), None)
@@ -0,0 +1,87 @@
+"""
+연도별 희망 제출 집계
+- 집계는 COUNT(*) FILTER (WHERE ...) 로 1지망/2지망/3지망 × 학년 칸을 한 번의 쿼리로 계산
+- 결과는 preference_summaries 테이블에 학교·연도별 1행으로 저장하고, 희망 저장/삭제 시 같은 트랜잭션에서 갱신
+  갱신은 집계 행을 먼저 FOR UPDATE로 잠근 뒤 계산하므로, 동시에 갱신하는 트랜잭션은 앞 트랜잭션이
+  커밋한 뒤의 희망으로 다시 계산함 (READ COMMITTED에서도 나중에 커밋한 쪽이 이전 결과를 덮어쓰지 않음)
+- 대시보드/요약 조회는 집계 행 1개만 읽고 쓰지 않음 (행이 없으면 저장하지 않고 바로 집계)
+"""
+import json
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.data_version import bump_version
+from app.db import dialect_insert
+from app.models import DEFAULT_SCHOOL_ID, Preference, PreferenceSummary
+
+# 희망 학년 범위 (schemas.PreferenceCreate와 동일)
+GRADES = range(1, 7)
+CHOICE_COLUMNS = {
+  "first": Preference.first_choice_grade,
+  "second": Preference.second_choice_grade,
+  "third": Preference.third_choice_grade,
+}
+
+
+async def aggregate_preferences(session: AsyncSession, year: int, school_id: int = DEFAULT_SCHOOL_ID) -> dict:
+  """해당 학교·연도 희망을 한 번의 집계 쿼리로 계산"""
+  columns = [func.count().label("submitted")]
+  for choice, column in CHOICE_COLUMNS.items():
+    columns.extend(
+      func.count().filter(column == grade).label(f"{choice}_{grade}") for grade in GRADES
+    )
+  stmt = select(*columns).where(Preference.school_id == school_id, Preference.year == year)
+  row = (await session.execute(stmt)).one()._mapping
+
+  counts: Dict[str, Dict[int, int]] = {
+    choice: {grade: row[f"{choice}_{grade}"] for grade in GRADES if row[f"{choice}_{grade}"]}
+    for choice in CHOICE_COLUMNS
+  }
+  return {"submitted_count": row["submitted"], "counts": counts}
+
+
+async def refresh_summary(session: AsyncSession, year: int, school_id: int = DEFAULT_SCHOOL_ID) -> dict:
+  """집계 행을 잠그고 다시 계산해 저장한 뒤 데이터 버전 증가 (commit은 호출한 쪽에서)"""
+  table = PreferenceSummary.__table__
+  # 잠글 행이 있도록 빈 집계 행을 먼저 만듦 (이미 있으면 그대로)
+  stmt = dialect_insert(table, session.bind.dialect.name)
+  await session.execute(
+    stmt.on_conflict_do_nothing(index_elements=["school_id", "year"]),
+    {"school_id": school_id, "year": year, "submitted_count": 0, "choice_counts": "{}", "updated_at": datetime.utcnow()},
+  )
+  await session.execute(
+    select(table.c.school_id)
+    .where(table.c.school_id == school_id, table.c.year == year)
+    .with_for_update()
+  )
+  summary = await aggregate_preferences(session, year, school_id)
+  await session.execute(
+    update(table)
+    .where(table.c.school_id == school_id, table.c.year == year)
+    .values(
+      submitted_count=summary["submitted_count"],
+      choice_counts=json.dumps(summary["counts"]),
+      updated_at=datetime.utcnow(),
+    )
+  )
+  await bump_version(session, school_id, year)
+  return summary
+
+
+async def get_summary(session: AsyncSession, year: int, school_id: int = DEFAULT_SCHOOL_ID) -> dict:
+  """
+  저장된 집계 조회 (조회 요청에서 쓰지 않음. 아직 희망 저장이 없어 행이 없으면 바로 집계)
+  반환 형식: {"submitted_count": int, "counts": {"first": {학년: 수}, "second": ..., "third": ...}}
+  """
+  stored = await session.get(PreferenceSummary, (school_id, year))
+  if stored is None:
+    return await aggregate_preferences(session, year, school_id)
+  counts = json.loads(stored.choice_counts or "{}")
+  return {
+    "submitted_count": stored.submitted_count,
+    "counts": {
+      choice: {int(grade): n for grade, n in counts.get(choice, {}).items()}
+      for choice in CHOICE_COLUMNS
+    },
+  }
@@ -1,12 +1,14 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Optional
 import re
+from app.models import DEFAULT_SCHOOL_ID
 
 
 class LoginRequest(BaseModel):
   name: str | None = Field(None, max_length=100)
   password: str = Field(..., min_length=1, max_length=200)
   role: str = Field("teacher", pattern="^(teacher|admin)$")
+  school_id: int = Field(DEFAULT_SCHOOL_ID, ge=1)
   
   @field_validator("name")
   @classmethod
@@ -149,3 +151,26 @@ class ClosePreferenceRequest(BaseModel):
   year: int = Field(..., ge=2000, le=2100)
   is_closed: bool
 
+
+
+class SchoolIn(BaseModel):
+  name: str = Field(..., min_length=1, max_length=100)
+  admin_password: str = Field(..., min_length=8, max_length=200)
+  teacher_password: str = Field(..., min_length=8, max_length=200)
+  self_enrollment: bool = False
+
+
+class SchoolCredentialsIn(BaseModel):
+  """학교 비밀번호/자가 등록 변경 (주지 않은 항목은 그대로)"""
+  admin_password: str | None = Field(None, min_length=8, max_length=200)
+  teacher_password: str | None = Field(None, min_length=8, max_length=200)
+  self_enrollment: bool | None = None
+
+
+class SchoolOut(BaseModel):
+  id: int
+  name: str
+  self_enrollment: bool
+
+  class Config:
+    from_attributes = True
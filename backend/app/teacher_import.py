@@ -0,0 +1,313 @@
+"""
+교사 명단 엑셀 일괄 등록
+- 업로드 파일을 메모리에 다시 읽지 않고 openpyxl read_only + values_only로 행 단위 처리
+- 기존 교사는 이름 기준으로 한 번에 미리 조회
+- 청크 단위 INSERT ... ON CONFLICT (school_id, name) DO UPDATE로 저장
+- email/google_id는 학교와 상관없이 전역 고유이므로, 저장 전에 청크별로 한 번 조회해
+  다른 교사(다른 학교 포함)나 파일의 앞선 행과 겹치는 행은 저장하지 않고 오류로 보고
+"""
+from typing import Any, BinaryIO, Dict, List, Tuple
+from fastapi import UploadFile
+from openpyxl import load_workbook
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import dialect_insert
+from app.grade_history import replace_histories
+from app.models import DEFAULT_SCHOOL_ID, Teacher
+
+# 한 번의 upsert 문에 담을 교사 수
+IMPORT_CHUNK_SIZE = 500
+# 업로드 크기 확인 시 한 번에 읽을 바이트 수
+UPLOAD_READ_CHUNK = 1024 * 1024
+
+# 엑셀에서 갱신 가능한 컬럼과 신규 교사 기본값
+IMPORT_FIELDS: Dict[str, Any] = {
+  "email": None,
+  "google_id": None,
+  "gender": None,
+  "hire_year": None,
+  "school_join_year": None,
+  "current_grade": None,
+  "current_class": None,
+  "is_homeroom_current": False,
+  "is_subject_teacher": False,
+  "duty_role": None,
+  "subject": None,
+  "special_conditions": None,
+}
+# 학교와 상관없이 전역 고유인 컬럼 → 오류 메시지용 이름
+UNIQUE_FIELDS = {"email": "이메일", "google_id": "구글 ID"}
+
+
+async def upload_size(file: UploadFile, limit_bytes: int) -> int:
+  """
+  업로드 파일 크기 확인 (내용을 메모리에 올리지 않음)
+  크기 정보가 없으면 청크 단위로 읽으며 limit_bytes를 넘는 즉시 중단합니다.
+  """
+  if file.size is not None:
+    return file.size
+  size = 0
+  while chunk := await file.read(UPLOAD_READ_CHUNK):
+    size += len(chunk)
+    if size > limit_bytes:
+      break
+  await file.seek(0)
+  return size
+
+
+def build_header_map(headers) -> Dict[str, int]:
+  """헤더 매핑 (다양한 형식 지원)"""
+  header_map = {}
+  for idx, header in enumerate(headers):
+    if header is None:
+      continue
+    header_str = str(header).strip().lower()
+    if "이름" in header_str or "name" in header_str:
+      header_map["name"] = idx
+    elif "이메일" in header_str or "email" in header_str:
+      header_map["email"] = idx
+    elif "구글" in header_str or "google" in header_str:
+      header_map["google_id"] = idx
+    elif "성별" in header_str or "gender" in header_str:
+      header_map["gender"] = idx
+    elif "총 경력" in header_str or "발령" in header_str or "hire" in header_str:
+      header_map["hire_year"] = idx
+    elif "본교" in header_str or "근무 시작" in header_str or "school_join" in header_str:
+      header_map["school_join_year"] = idx
+    elif "올해 학년" in header_str or "current_grade" in header_str:
+      header_map["current_grade"] = idx
+    elif "올해 학급" in header_str or "current_class" in header_str:
+      header_map["current_class"] = idx
+    elif "담임" in header_str and "올해" in header_str or "is_homeroom" in header_str:
+      header_map["is_homeroom_current"] = idx
+    elif "교과전담" in header_str or "is_subject" in header_str:
+      header_map["is_subject_teacher"] = idx
+    elif "업무부장" in header_str or "duty_role" in header_str:
+      header_map["duty_role"] = idx
+    elif "교과" in header_str or "subject" in header_str:
+      header_map["subject"] = idx
+    elif "특수" in header_str or "special" in header_str:
+      header_map["special_conditions"] = idx
+    elif "본교 담임 이력" in header_str or "학년이력" in header_str or "grade_history" in header_str or "담임 이력" in header_str:
+      header_map["grade_history"] = idx
+  return header_map
+
+
+def _to_bool(val, truthy: tuple) -> bool | None:
+  if val is None:
+    return None
+  if isinstance(val, bool):
+    return val
+  if isinstance(val, str):
+    return val.lower() in truthy
+  if isinstance(val, (int, float)):
+    return bool(val)
+  return None
+
+
+def _to_int(val) -> int | None:
+  try:
+    return int(val)
+  except (ValueError, TypeError):
+    return None
+
+
+def _parse_history(value: str) -> List[Tuple[int, int]]:
+  """"연도:학년,연도:학년" 형식 파싱 (파싱 실패 시 빈 목록)"""
+  history = []
+  try:
+    for entry in value.split(","):
+      entry = entry.strip()
+      if ":" in entry:
+        parts = entry.split(":")
+        if len(parts) == 2:
+          history.append((int(parts[0].strip()), int(parts[1].strip())))
+  except (ValueError, TypeError):
+    return []
+  return history
+
+
+def parse_row(row: tuple, header_map: Dict[str, int]) -> Tuple[Dict[str, Any], List[Tuple[int, int]]]:
+  """
+  엑셀 한 행 → (갱신할 필드, 학년 이력)
+  값이 비어 있는 칸은 기존 값을 유지하도록 필드에서 제외합니다.
+  """
+  def cell(key: str):
+    idx = header_map.get(key)
+    if idx is None or idx >= len(row):
+      return None
+    return row[idx]
+
+  fields: Dict[str, Any] = {}
+  for key in ("email", "google_id", "current_class", "duty_role", "subject", "special_conditions"):
+    if cell(key):
+      fields[key] = str(cell(key)).strip() or None
+  if cell("gender"):
+    fields["gender"] = str(cell("gender")).strip()[:10] or None
+  for key in ("hire_year", "school_join_year", "current_grade"):
+    if cell(key):
+      value = _to_int(cell(key))
+      if value is not None:
+        fields[key] = value
+
+  homeroom = _to_bool(cell("is_homeroom_current"), ("true", "1", "예", "yes", "담임", "o", "○"))
+  if homeroom is not None:
+    fields["is_homeroom_current"] = homeroom
+  subject_teacher = _to_bool(cell("is_subject_teacher"), ("true", "1", "예", "yes", "교과전담", "o", "○"))
+  if subject_teacher is not None:
+    fields["is_subject_teacher"] = subject_teacher
+
+  history: List[Tuple[int, int]] = []
+  if cell("grade_history"):
+    history = _parse_history(str(cell("grade_history")).strip())
+  return fields, history
+
+
+async def _unique_conflicts(
+  session: AsyncSession,
+  pending: Dict[str, Dict[str, Any]],
+  school_id: int,
+  claimed: Dict[Tuple[str, str], str],
+) -> Dict[str, str]:
+  """
+  전역 고유 컬럼이 다른 교사와 겹치는 교사 → {이름: 사유}
+  claimed: 이번 업로드에서 이미 저장한 (컬럼, 값) → 이름 (청크 사이에서 유지하며 여기서 갱신)
+  """
+  owners: Dict[Tuple[str, str], Tuple[int, str]] = {}
+  for key in UNIQUE_FIELDS:
+    values = {fields[key] for fields in pending.values() if fields.get(key)}
+    if not values:
+      continue
+    column = getattr(Teacher, key)
+    for value, owner_school, owner_name in (
+      await session.execute(select(column, Teacher.school_id, Teacher.name).where(column.in_(values)))
+    ).all():
+      owners[(key, value)] = (owner_school, owner_name)
+
+  conflicts: Dict[str, str] = {}
+  for name, fields in pending.items():
+    keys = [(key, fields[key]) for key in UNIQUE_FIELDS if fields.get(key)]
+    for key, value in keys:
+      # 이번 업로드에서 먼저 저장한 교사가 있으면 그 교사가, 없으면 DB의 교사가 주인
+      owner = claimed.get((key, value)) or owners.get((key, value))
+      if owner and owner != name and owner != (school_id, name):
+        conflicts[name] = f"이미 다른 교사가 사용 중인 {UNIQUE_FIELDS[key]}입니다: {value}"
+        break
+    else:
+      for key, value in keys:
+        claimed[(key, value)] = name
+  return conflicts
+
+
+async def _flush_chunk(
+  session: AsyncSession,
+  pending: Dict[str, Dict[str, Any]],
+  histories: Dict[str, List[Tuple[int, int]]],
+  school_id: int,
+) -> Dict[str, int]:
+  """교사 청크 upsert 후 학년 이력 교체. 이름 → id 반환"""
+  stmt = dialect_insert(Teacher.__table__, session.bind.dialect.name)
+  stmt = stmt.on_conflict_do_update(
+    index_elements=["school_id", "name"],
+    set_={key: stmt.excluded[key] for key in IMPORT_FIELDS},
+  ).returning(Teacher.id, Teacher.name)
+  rows = [{"school_id": school_id, "name": name, **fields} for name, fields in pending.items()]
+  ids = {name: teacher_id for teacher_id, name in (await session.execute(stmt, rows)).all()}
+  await replace_histories(session, {ids[name]: history for name, history in histories.items()})
+  return ids
+
+
+async def import_teachers(
+  session: AsyncSession,
+  fileobj: BinaryIO,
+  chunk_size: int = IMPORT_CHUNK_SIZE,
+  school_id: int = DEFAULT_SCHOOL_ID,
+) -> dict:
+  """
+  엑셀 파일로 school_id 학교의 교사 일괄 등록/수정
+  - 같은 이름이 여러 행에 있으면 뒤의 값이 앞의 값을 덮어씀
+  - email/google_id가 다른 교사와 겹치는 교사는 저장하지 않고 그 행들을 오류로 보고 (rejected_rows)
+  - 호출한 쪽에서 commit
+  """
+  wb = load_workbook(fileobj, read_only=True, data_only=True)
+  try:
+    ws = wb.active
+    headers = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    header_map = build_header_map(headers)
+    if "name" not in header_map:
+      raise ValueError("Excel file must contain 'name' column")
+
+    # 기존 교사를 이름 기준으로 한 번에 조회 (엑셀에 없는 필드는 기존 값 유지)
+    columns = [getattr(Teacher, key) for key in IMPORT_FIELDS]
+    known: Dict[str, Dict[str, Any]] = {
+      r.name: dict(zip(IMPORT_FIELDS, r[1:]))
+      for r in (
+        await session.execute(select(Teacher.name, *columns).where(Teacher.school_id == school_id))
+      ).all()
+    }
+    existing_names = set(known)
+
+    success_count = 0
+    error_count = 0
+    errors: List[str] = []
+    pending: Dict[str, Dict[str, Any]] = {}
+    histories: Dict[str, List[Tuple[int, int]]] = {}
+    rows_of: Dict[str, List[int]] = {}  # 청크 안에서 이름 → 행 번호
+    claimed: Dict[Tuple[str, str], str] = {}
+    rejected_rows: List[int] = []
+
+    async def flush():
+      nonlocal success_count, error_count
+      conflicts = await _unique_conflicts(session, pending, school_id, claimed)
+      for name, reason in conflicts.items():
+        del pending[name]
+        histories.pop(name, None)
+        rows = rows_of[name]
+        success_count -= len(rows)
+        error_count += len(rows)
+        rejected_rows.extend(rows)
+        errors.append(f"{', '.join(map(str, rows))}행: {reason}")
+      if pending:
+        await _flush_chunk(session, pending, histories, school_id)
+        known.update(pending)
+      pending.clear()
+      histories.clear()
+      rows_of.clear()
+
+    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+      name_idx = header_map["name"]
+      # 빈 행 건너뛰기
+      if name_idx >= len(row) or not row[name_idx]:
+        continue
+      try:
+        name = str(row[name_idx]).strip()
+        if not name:
+          continue
+        fields, history = parse_row(row, header_map)
+        merged = pending.get(name) or known.get(name) or IMPORT_FIELDS
+        pending[name] = {**merged, **fields}
+        if history:
+          histories[name] = history
+        rows_of.setdefault(name, []).append(row_idx)
+        success_count += 1
+      except Exception as e:
+        error_count += 1
+        errors.append(f"{row_idx}행: {str(e)}")
+
+      if len(pending) >= chunk_size:
+        await flush()
+
+    if pending:
+      await flush()
+  finally:
+    wb.close()
+
+  created_count = len(known) - len(existing_names)
+  return {
+    "status": "ok",
+    "success_count": success_count,
+    "created_count": created_count,
+    "error_count": error_count,
+    "errors": errors[:10],  # 최대 10개 오류만 반환
+    "rejected_rows": sorted(rejected_rows),
+  }
@@ -0,0 +1,126 @@
+"""
+배정 엔진 단계별 벤치마크 (인메모리 SQLite)
+가상 학교를 만들어 DB에 넣고 run_assignment를 실행하면서
+조회(load), 각 단계(PHASES), 저장(persistence) 소요 시간을 JSON으로 기록합니다.
+
+  cd backend
+  python -m benchmarks.run_engine --sizes 50 500 5000 --solvers greedy flow --out bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import time
+from datetime import datetime
+from typing import Dict, List, Sequence
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.pool import StaticPool
+from app.db import Base
+from app.models import DEFAULT_SCHOOL_ID, GradeSetting, Preference, School, Teacher, TeacherGradeHistory
+from app.assignment.engine import run_assignment
+from app.assignment.solver import SOLVERS
+from benchmarks.synthetic import generate_school
+
+DEFAULT_SIZES = (50, 500, 5000)
+# SQLite 바인드 변수 제한을 넘지 않도록 나눠 넣는 행 수
+INSERT_CHUNK = 5000
+
+
+async def _insert(session: AsyncSession, table, rows: List[dict], school_id: int | None = None):
+  for i in range(0, len(rows), INSERT_CHUNK):
+    chunk = rows[i:i + INSERT_CHUNK]
+    if school_id is not None:
+      chunk = [{"school_id": school_id, **row} for row in chunk]
+    await session.execute(table.insert(), chunk)
+
+
+async def bench_once(teacher_count: int, solver: str, year: int, seed: int, skew: float) -> dict:
+  engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+  try:
+    async with engine.begin() as conn:
+      await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    data = generate_school(teacher_count, year=year, seed=seed, skew=skew)
+    started = time.perf_counter()
+    async with sessions() as session:
+      await _insert(session, School.__table__, [{"id": DEFAULT_SCHOOL_ID, "name": "벤치마크"}])
+      await _insert(session, Teacher.__table__, data["teachers"], DEFAULT_SCHOOL_ID)
+      await _insert(session, TeacherGradeHistory.__table__, data["histories"])
+      await _insert(session, Preference.__table__, data["preferences"], DEFAULT_SCHOOL_ID)
+      await _insert(session, GradeSetting.__table__, data["grade_settings"], DEFAULT_SCHOOL_ID)
+      await session.commit()
+    seed_seconds = time.perf_counter() - started
+
+    timings: Dict[str, float] = {}
+    current = {"phase": "load", "started": time.perf_counter()}
+
+    def close_phase():
+      timings[current["phase"]] = round(time.perf_counter() - current["started"], 4)
+
+    async def on_phase(phase: str):
+      close_phase()
+      current["phase"], current["started"] = phase, time.perf_counter()
+
+    started = time.perf_counter()
+    async with sessions() as session:
+      assigned, excluded, logs = await run_assignment(session, year, solver=solver, progress=on_phase)
+    close_phase()
+    total = time.perf_counter() - started
+
+    return {
+      "teachers": teacher_count,
+      "solver": solver,
+      "seed": seed,
+      "preferences": len(data["preferences"]),
+      "history_rows": len(data["histories"]),
+      "assigned": len(assigned),
+      "excluded": len(excluded),
+      "seed_seconds": round(seed_seconds, 4),
+      "total_seconds": round(total, 4),
+      "phases": timings,
+    }
+  finally:
+    await engine.dispose()
+
+
+async def run(sizes: Sequence[int], solvers: Sequence[str], year: int, seed: int, skew: float, repeat: int) -> dict:
+  runs = []
+  for size in sizes:
+    for solver in solvers:
+      for i in range(repeat):
+        result = await bench_once(size, solver, year, seed + i, skew)
+        runs.append(result)
+        print(f"{size:>6}명 {solver:<6} #{i + 1}: {result['total_seconds']:.3f}s {result['phases']}", flush=True)
+  return {
+    "generated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "year": year,
+    "skew": skew,
+    "runs": runs,
+  }
+
+
+def main(argv: Sequence[str] | None = None):
+  parser = argparse.ArgumentParser(description="배정 엔진 단계별 벤치마크")
+  parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="교사 수 (50 ~ 50000)")
+  parser.add_argument("--solvers", nargs="+", choices=SOLVERS, default=list(SOLVERS))
+  parser.add_argument("--year", type=int, default=2026)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--skew", type=float, default=1.0, help="인기 학년 쏠림 정도 (0이면 균등)")
+  parser.add_argument("--repeat", type=int, default=1)
+  parser.add_argument("--out", default=None, help="결과 JSON 파일 (생략 시 표준 출력)")
+  args = parser.parse_args(argv)
+
+  result = asyncio.run(run(args.sizes, args.solvers, args.year, args.seed, args.skew, args.repeat))
+  text = json.dumps(result, ensure_ascii=False, indent=2)
+  if args.out:
+    with open(args.out, "w", encoding="utf-8") as f:
+      f.write(text)
+  else:
+    print(text)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,108 @@
+"""
+벤치마크용 가상 학교 데이터 생성기
+- 교사 수 50 ~ 50,000명
+- special_conditions(제외/우선 사유), duty_role(역할) 분포
+- 여러 해의 담임 학년 이력
+- 인기 학년 쪽으로 치우친 1/2/3지망
+같은 seed면 항상 같은 데이터를 만듭니다.
+"""
+import random
+from typing import Dict, List, Optional
+
+# (값, 비율). None은 해당 없음
+SPECIAL_CONDITIONS = [
+  (None, 0.86),
+  ("휴직", 0.02),
+  ("병가 30일 이상", 0.01),
+  ("파견", 0.005),
+  ("연수", 0.005),
+  ("원로교사", 0.02),
+  ("건강 사유", 0.02),
+  ("요양", 0.005),
+  ("출산 예정", 0.01),
+  ("군입대", 0.005),
+]
+DUTY_ROLES = [
+  (None, 0.78),
+  ("업무1부장", 0.02),
+  ("업무2부장", 0.02),
+  ("업무3부장", 0.02),
+  ("학년부장", 0.09),
+  ("교과전담", 0.07),
+]
+SUBJECTS = [(None, 0.85), ("영어", 0.06), ("체육", 0.05), ("음악", 0.04)]
+# 학년별 인기도 (1/2/3지망 선택 가중치, skew로 강도 조절)
+GRADE_POPULARITY = {1: 1.0, 2: 2.2, 3: 1.6, 4: 1.0, 5: 1.3, 6: 0.7}
+
+GRADES = (1, 2, 3, 4, 5, 6)
+
+
+def _pick(rnd: random.Random, choices):
+  values, weights = zip(*choices)
+  return rnd.choices(values, weights=weights, k=1)[0]
+
+
+def _weighted_sample(rnd: random.Random, weights: Dict[int, float], k: int) -> List[int]:
+  """가중치 비복원 추출"""
+  pool = dict(weights)
+  picked = []
+  for _ in range(min(k, len(pool))):
+    grade = rnd.choices(list(pool), weights=list(pool.values()), k=1)[0]
+    picked.append(grade)
+    del pool[grade]
+  return picked
+
+
+def generate_school(
+  teacher_count: int,
+  year: int = 2026,
+  seed: int = 0,
+  submit_rate: float = 0.9,
+  skew: float = 1.0,
+  max_history_years: int = 8,
+  homeroom_ratio: float = 0.8,
+) -> dict:
+  """
+  가상 학교 1곳 생성
+  반환: {"teachers": [...], "histories": [...], "preferences": [...], "grade_settings": [...]}
+  각 항목은 테이블에 바로 넣을 수 있는 dict (teachers의 id는 1부터)
+  """
+  rnd = random.Random(seed)
+  popularity = {g: w ** skew for g, w in GRADE_POPULARITY.items()}
+
+  teachers, histories, preferences = [], [], []
+  for teacher_id in range(1, teacher_count + 1):
+    duty_role = _pick(rnd, DUTY_ROLES)
+    teachers.append({
+      "id": teacher_id,
+      "name": f"교사{teacher_id:05d}",
+      "current_grade": rnd.choice(GRADES) if rnd.random() < 0.9 else None,
+      "is_homeroom_current": rnd.random() < 0.8,
+      "is_subject_teacher": duty_role == "교과전담" and rnd.random() < 0.5,
+      "duty_role": duty_role,
+      "subject": _pick(rnd, SUBJECTS),
+      "special_conditions": _pick(rnd, SPECIAL_CONDITIONS),
+    })
+    for past in range(year - rnd.randint(0, max_history_years), year):
+      histories.append({"teacher_id": teacher_id, "year": past, "grade": rnd.choice(GRADES)})
+    if rnd.random() < submit_rate:
+      choices: List[Optional[int]] = _weighted_sample(rnd, popularity, rnd.choice((1, 2, 3, 3, 3)))
+      choices += [None] * (3 - len(choices))
+      preferences.append({
+        "teacher_id": teacher_id,
+        "year": year,
+        "first_choice_grade": choices[0],
+        "second_choice_grade": choices[1],
+        "third_choice_grade": choices[2],
+      })
+
+  # 필요 담임 수: 교사의 homeroom_ratio만큼을 학년에 고르게 배분
+  homerooms = max(len(GRADES), int(teacher_count * homeroom_ratio))
+  per_grade = [homerooms // len(GRADES)] * len(GRADES)
+  for i in range(homerooms % len(GRADES)):
+    per_grade[i] += 1
+  grade_settings = [
+    {"year": year, "grade": g, "class_count": n, "required_homerooms": n}
+    for g, n in zip(GRADES, per_grade)
+  ]
+  return {"teachers": teachers, "histories": histories, "preferences": preferences, "grade_settings": grade_settings}
@@ -0,0 +1,36 @@
+"""
+운영 실행 설정 (gunicorn + uvicorn 워커)
+  python -m app.migrate && gunicorn -c gunicorn.conf.py app.main:app
+
+워커는 startup에서 DDL을 실행하지 않도록 AUTO_MIGRATE=false로 띄웁니다 (Dockerfile 참고).
+환경 변수
+- WEB_CONCURRENCY: 워커 수 (기본 CPU 코어 수, SQLite DB면 항상 1)
+- BIND: 주소 (기본 0.0.0.0:8001)
+- KEEPALIVE: keep-alive 유지 시간(초, 기본 5). 앞단 프록시/로드밸런서의 idle timeout보다 길게
+- BACKLOG: 대기 연결 수 (기본 2048)
+- TIMEOUT / GRACEFUL_TIMEOUT: 응답 없는 워커 재시작 / 종료 시 진행 중 요청을 기다리는 시간(초)
+
+워커끼리 공유해야 하는 상태는 DB에 있음
+- 같은 학교·연도 배정 잠금: PostgreSQL advisory lock (assignment/jobs.year_lock)
+- 관리자 쓰기 직후 기본 DB에서 읽는 기한: schools.read_primary_until
+- 희망 제출: 커밋된 뒤 응답, 마감 여부는 저장 트랜잭션에서 확인 (preference_buffer)
+- 관리자 조회 캐시: DB의 데이터 버전으로 무효화 (data_version)
+"""
+import multiprocessing
+import os
+from app.core.config import settings
+
+bind = os.getenv("BIND", "0.0.0.0:8001")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# 워커 사이 배정 잠금(advisory lock)은 PostgreSQL에서만 동작하므로 SQLite는 워커 1개
+if settings.db_url.startswith("sqlite"):
+  workers = 1
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+backlog = int(os.getenv("BACKLOG", "2048"))
+timeout = int(os.getenv("TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# 워커마다 앱을 따로 불러옴 (DB 연결 풀/희망 버퍼는 워커별로 만들어야 함)
+preload_app = False
+accesslog = "-"
+errorlog = "-"
@@ -1,10 +1,28 @@
 -- Supabase 데이터베이스 스키마
 -- Supabase SQL Editor에서 실행하세요
+-- 백엔드 models.py와 같은 스키마입니다. 이전 스키마로 만든 DB는 백엔드 마이그레이션
+-- (python -m app.migrate)이 school_id 컬럼 추가와 전역 고유 제약 삭제를 처리합니다.
 
--- 교사 테이블
-CREATE TABLE teachers (
+-- 학교 (테넌트) 테이블
+CREATE TABLE schools (
   id SERIAL PRIMARY KEY,
   name VARCHAR(255) UNIQUE NOT NULL,
+  admin_password_hash VARCHAR(255),  -- 비어 있으면 기본 학교(id=1)만 전역 ADMIN_PASSWORD 사용
+  teacher_password_hash VARCHAR(255),
+  self_enrollment BOOLEAN NOT NULL DEFAULT FALSE,  -- 명단에 없는 교사의 로그인(자가 등록) 허용
+  read_primary_until DOUBLE PRECISION,  -- 이 시각(epoch 초)까지 관리자 조회를 복제본 대신 기본 DB에서 읽음
+  token_version INTEGER DEFAULT 1,  -- 올리면 이 학교에 발급된 토큰이 모두 무효
+  created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- 기본 학교 (단일 학교 배포)
+INSERT INTO schools (name, self_enrollment) VALUES ('기본 학교', TRUE);
+
+-- 교사 테이블 (이름은 학교 안에서만 고유)
+CREATE TABLE teachers (
+  id SERIAL PRIMARY KEY,
+  school_id INTEGER NOT NULL DEFAULT 1 REFERENCES schools(id),
+  name VARCHAR(255) NOT NULL,
   email VARCHAR(255) UNIQUE,
   google_id VARCHAR(255) UNIQUE,
   gender VARCHAR(10),
@@ -17,14 +35,27 @@ CREATE TABLE teachers (
   duty_role VARCHAR(255),
   subject VARCHAR(255),
   special_conditions TEXT,
-  grade_history TEXT,  -- 본교 근무 기간 동안 담임한 학년 이력 (JSON 형식: [{"year": 2023, "grade": 1}, ...])
+  grade_history TEXT,  -- (레거시) JSON 학년 이력. teacher_grade_history로 이관 후 비워짐
+  token_version INTEGER DEFAULT 1,  -- 올리면 이 교사에게 발급된 토큰이 무효
   created_at TIMESTAMP DEFAULT NOW(),
   updated_at TIMESTAMP DEFAULT NOW()
 );
+CREATE UNIQUE INDEX uq_teachers_school_name ON teachers(school_id, name);
 
--- 희망 학년 테이블
+-- 본교 담임 학년 이력 (교사·연도별 1건)
+CREATE TABLE teacher_grade_history (
+  id SERIAL PRIMARY KEY,
+  teacher_id INTEGER NOT NULL REFERENCES teachers(id) ON DELETE CASCADE,
+  year INTEGER NOT NULL,
+  grade INTEGER NOT NULL,
+  CONSTRAINT uq_teacher_grade_history_teacher_year UNIQUE (teacher_id, year)
+);
+CREATE INDEX ix_teacher_grade_history_teacher_grade ON teacher_grade_history(teacher_id, grade);
+
+-- 희망 학년 테이블 (교사당 연도별 1건)
 CREATE TABLE preferences (
   id SERIAL PRIMARY KEY,
+  school_id INTEGER NOT NULL DEFAULT 1 REFERENCES schools(id),
   teacher_id INTEGER NOT NULL REFERENCES teachers(id) ON DELETE CASCADE,
   year INTEGER NOT NULL,
   first_choice_grade INTEGER,  -- 교과전담 선택 시 NULL 가능
@@ -35,27 +66,30 @@ CREATE TABLE preferences (
   wants_duty_head BOOLEAN DEFAULT FALSE,
   comment TEXT,
   created_at TIMESTAMP DEFAULT NOW(),
-  updated_at TIMESTAMP DEFAULT NOW(),
-  UNIQUE(teacher_id, year)
+  updated_at TIMESTAMP DEFAULT NOW()
 );
+CREATE UNIQUE INDEX uq_preferences_year_teacher ON preferences(year, teacher_id);
+CREATE INDEX ix_preferences_school_year ON preferences(school_id, year);
 
 -- 학년별 설정 테이블
 CREATE TABLE grade_settings (
   id SERIAL PRIMARY KEY,
+  school_id INTEGER NOT NULL DEFAULT 1 REFERENCES schools(id),
   year INTEGER NOT NULL,
   grade INTEGER NOT NULL,
   class_count INTEGER NOT NULL,
   required_homerooms INTEGER NOT NULL,
-  required_subject_teachers INTEGER DEFAULT 0,
-  required_duty_heads INTEGER DEFAULT 0,
+  required_subject_teachers INTEGER NOT NULL DEFAULT 0,
+  required_duty_heads INTEGER NOT NULL DEFAULT 0,
   created_at TIMESTAMP DEFAULT NOW(),
-  updated_at TIMESTAMP DEFAULT NOW(),
-  UNIQUE(year, grade)
+  updated_at TIMESTAMP DEFAULT NOW()
 );
+CREATE INDEX ix_grade_settings_school_year ON grade_settings(school_id, year);
 
 -- 배정 결과 테이블
 CREATE TABLE assignments (
   id SERIAL PRIMARY KEY,
+  school_id INTEGER NOT NULL DEFAULT 1 REFERENCES schools(id),
   teacher_id INTEGER NOT NULL REFERENCES teachers(id) ON DELETE CASCADE,
   year INTEGER NOT NULL,
   assigned_grade INTEGER NOT NULL,
@@ -64,6 +98,7 @@ CREATE TABLE assignments (
   description TEXT,
   created_at TIMESTAMP DEFAULT NOW()
 );
+CREATE INDEX ix_assignments_school_year ON assignments(school_id, year);
 
 -- 배정 로그 테이블
 CREATE TABLE assignment_logs (
@@ -74,29 +109,77 @@ CREATE TABLE assignment_logs (
   created_at TIMESTAMP DEFAULT NOW()
 );
 
--- 관리자 설정 테이블
+-- 관리자 설정 테이블 (학교·연도별 1건)
 CREATE TABLE admin_settings (
   id SERIAL PRIMARY KEY,
-  year INTEGER UNIQUE NOT NULL,
+  school_id INTEGER NOT NULL DEFAULT 1 REFERENCES schools(id),
+  year INTEGER NOT NULL,
   total_teachers INTEGER DEFAULT 0,
+  is_closed BOOLEAN NOT NULL DEFAULT FALSE,  -- 희망 제출 마감 여부
+  solver VARCHAR(255),  -- 마지막 전체 배정 방식 (증분 재배정도 같은 방식)
   created_at TIMESTAMP DEFAULT NOW(),
   updated_at TIMESTAMP DEFAULT NOW()
 );
+CREATE UNIQUE INDEX uq_admin_settings_school_year ON admin_settings(school_id, year);
+
+-- 백그라운드 배정 작업
+CREATE TABLE assignment_jobs (
+  id SERIAL PRIMARY KEY,
+  school_id INTEGER NOT NULL DEFAULT 1 REFERENCES schools(id),
+  year INTEGER NOT NULL,
+  solver VARCHAR(255) NOT NULL DEFAULT 'greedy',
+  status VARCHAR(255) NOT NULL DEFAULT 'queued',  -- queued/running/succeeded/failed
+  phase VARCHAR(255),
+  progress INTEGER NOT NULL DEFAULT 0,
+  phase_timings TEXT,
+  metrics TEXT,
+  assigned_count INTEGER,
+  error VARCHAR(255),
+  created_at TIMESTAMP DEFAULT NOW(),
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  heartbeat_at TIMESTAMP  -- 작업을 맡은 워커가 주기적으로 갱신 (끊기면 실패로 정리)
+);
+
+-- 학교·연도별 희망 제출 집계
+CREATE TABLE preference_summaries (
+  school_id INTEGER NOT NULL REFERENCES schools(id),
+  year INTEGER NOT NULL,
+  submitted_count INTEGER NOT NULL DEFAULT 0,
+  choice_counts TEXT NOT NULL DEFAULT '{}',
+  updated_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (school_id, year)
+);
+
+-- 학교·연도별 데이터 버전 (관리자 조회 ETag)
+CREATE TABLE data_versions (
+  school_id INTEGER NOT NULL REFERENCES schools(id),
+  year INTEGER NOT NULL,
+  version INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (school_id, year)
+);
 
 -- 인덱스 생성
-CREATE INDEX idx_preferences_year ON preferences(year);
-CREATE INDEX idx_preferences_teacher_id ON preferences(teacher_id);
-CREATE INDEX idx_grade_settings_year ON grade_settings(year);
-CREATE INDEX idx_assignments_year ON assignments(year);
+CREATE INDEX ix_teachers_name ON teachers(name);
+CREATE INDEX ix_preferences_year ON preferences(year);
+CREATE INDEX ix_grade_settings_year ON grade_settings(year);
+CREATE INDEX ix_assignments_year ON assignments(year);
 CREATE INDEX idx_assignments_teacher_id ON assignments(teacher_id);
+CREATE INDEX ix_admin_settings_year ON admin_settings(year);
+CREATE INDEX ix_assignment_jobs_year ON assignment_jobs(year);
 
 -- Row Level Security (RLS) 활성화
+ALTER TABLE schools ENABLE ROW LEVEL SECURITY;
 ALTER TABLE teachers ENABLE ROW LEVEL SECURITY;
+ALTER TABLE teacher_grade_history ENABLE ROW LEVEL SECURITY;
 ALTER TABLE preferences ENABLE ROW LEVEL SECURITY;
 ALTER TABLE grade_settings ENABLE ROW LEVEL SECURITY;
 ALTER TABLE assignments ENABLE ROW LEVEL SECURITY;
 ALTER TABLE assignment_logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE admin_settings ENABLE ROW LEVEL SECURITY;
+ALTER TABLE assignment_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE preference_summaries ENABLE ROW LEVEL SECURITY;
+ALTER TABLE data_versions ENABLE ROW LEVEL SECURITY;
 
 -- 공개 정책 (개발용 - 모든 사용자 접근 허용)
 CREATE POLICY "Enable all for authenticated users" ON teachers
@@ -117,6 +200,17 @@ CREATE POLICY "Enable all for authenticated users" ON assignment_logs
 CREATE POLICY "Enable all for authenticated users" ON admin_settings
   FOR ALL USING (true);
 
-     git config --global user.email 'yaco9304@gmail.com'
-   git config --global user.name yaco93'
+CREATE POLICY "Enable all for authenticated users" ON schools
+  FOR ALL USING (true);
 
+CREATE POLICY "Enable all for authenticated users" ON teacher_grade_history
+  FOR ALL USING (true);
+
+CREATE POLICY "Enable all for authenticated users" ON assignment_jobs
+  FOR ALL USING (true);
+
+CREATE POLICY "Enable all for authenticated users" ON preference_summaries
+  FOR ALL USING (true);
+
+CREATE POLICY "Enable all for authenticated users" ON data_versions
+  FOR ALL USING (true);
@@ -74,359 +74,81 @@ class Assignment:
     description: Optional[str] = None
 
 
-# ==================== 배정 규칙 ====================
-
-EXCLUDE_PATTERNS = [
-    ("휴직", "제13조: 휴직"),
-    ("병가", "제13조: 병가 30일 이상"),
-    ("파견", "제13조: 파견"),
-    ("연수", "제13조: 연수"),
-    ("산전", "제13조: 임신/산전"),
-    ("임신", "제13조: 임신"),
-    ("출산", "제13조: 출산 예정"),
-    ("고령", "제13조: 고령 교사"),
-]
-
-ROLE_POINTS = {
-    "업무1부장": 6.0,
-    "업무2부장": 5.0,
-    "업무3부장": 4.3,
-    "학년부장": 2.0,
-    "교과전담": 3.0,
-}
-
-PRIORITY_PATTERNS = [
-    ("원로", "제12조④: 원로교사"),
-    ("요양", "제12조④: 요양 필요"),
-    ("건강", "제12조④: 건강 사유"),
-    ("군입대", "제12조③/제14조③: 군 입대"),
-    ("출산", "제12조④: 출산 예정"),
-    ("임신", "제12조④: 임신"),
-]
-
-
-def apply_exclusions(teachers: List[Teacher], year: int) -> Tuple[List[Teacher], List[Teacher], List[Tuple[str, str]]]:
-    """제외 대상 필터링 (제13조)"""
-    kept, excluded, logs = [], [], []
-    for t in teachers:
-        cond = (t.special_conditions or "").lower()
-        reason = None
-        for key, msg in EXCLUDE_PATTERNS:
-            if key in cond:
-                reason = msg
-                break
-        if reason:
-            excluded.append(t)
-            logs.append((t.name, "exclude", reason))
-        else:
-            kept.append(t)
-    return kept, excluded, logs
-
-
-def apply_priority_rules(teachers: List[Teacher], settings: List[GradeSetting], year: int, prefs_by_name: Dict[str, Preference]) -> Tuple[List[Tuple[Teacher, int, str, str]], List[Teacher], List[Tuple[str, str]]]:
-    """우선 배정 규칙 적용"""
-    assigned: List[Tuple[Teacher, int, str, str]] = []
-    remaining: List[Teacher] = teachers[:]
-    logs = []
-
-    # 1) 특수 사유 우선 (제12조④)
-    pri_candidates = []
-    still = []
-    for t in remaining:
-        reason = None
-        cond = (t.special_conditions or "").lower()
-        for key, msg in PRIORITY_PATTERNS:
-            if key in cond:
-                reason = msg
-                break
-        if reason:
-            pri_candidates.append((t, reason))
-        else:
-            still.append(t)
-    remaining = still
+# ==================== 배정 엔진 ====================
+# 배정 규칙/점수/알고리즘은 백엔드와 같은 순수 엔진(backend/app/assignment)을 사용합니다.
+# 이 스크립트는 엑셀 데이터를 엔진 레코드로 바꾸고 결과를 엑셀 형식으로 돌려주는 역할만 합니다.
+# backend 폴더 위치: 환경 변수 ASSIGN_BACKEND_DIR 또는 이 스크립트 옆의 backend 폴더
 
-    # 특수 사유자는 1지망→2지망→3지망 순으로 우선 배정
-    for t, reason in pri_candidates:
-        pref = prefs_by_name.get(t.name)
-        prefs = []
-        if pref:
-            if pref.first_choice_grade:
-                prefs.append(pref.first_choice_grade)
-            if pref.second_choice_grade:
-                prefs.append(pref.second_choice_grade)
-            if pref.third_choice_grade:
-                prefs.append(pref.third_choice_grade)
-        
-        target_grade = t.current_grade
-        hope_detail = ""
-        if not target_grade and prefs:
-            target_grade = prefs[0]
-            hope_detail = " (1지망 반영)"
-        elif target_grade:
-            hope_detail = " (현재 학년 유지)"
-        
-        if target_grade:
-            desc = f"{reason}{hope_detail}"
-            assigned.append((t, target_grade, "규정우선", desc))
-            logs.append((t.name, "rule_12_4", reason))
-        else:
-            remaining.append(t)
-
-    # 2) 업무부장/학년부장/교과전담 경합 시 점수 높은 순 (제12조②)
-    def role_score(t: Teacher) -> float:
-        if t.duty_role:
-            for k, v in ROLE_POINTS.items():
-                if k in t.duty_role:
-                    return v
-        return 0.0
-
-    role_sorted = sorted(
-        [t for t in remaining if role_score(t) > 0],
-        key=lambda x: role_score(x),
-        reverse=True,
-    )
-    remaining = [t for t in remaining if role_score(t) == 0]
+_BACKEND_DIR = os.environ.get("ASSIGN_BACKEND_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "backend"
+)
+if _BACKEND_DIR not in sys.path:
+    sys.path.insert(0, _BACKEND_DIR)
 
-    for t in role_sorted:
-        pref = prefs_by_name.get(t.name)
-        prefs = []
-        if pref:
-            if pref.first_choice_grade:
-                prefs.append(pref.first_choice_grade)
-            if pref.second_choice_grade:
-                prefs.append(pref.second_choice_grade)
-            if pref.third_choice_grade:
-                prefs.append(pref.third_choice_grade)
-        
-        target = prefs[0] if prefs else (t.current_grade or None)
-        hope_detail = ""
-        if target:
-            if prefs and target == prefs[0]:
-                hope_detail = " (1지망 반영)"
-            elif len(prefs) > 1 and target == prefs[1]:
-                hope_detail = " (2지망 반영)"
-            elif len(prefs) > 2 and target == prefs[2]:
-                hope_detail = " (3지망 반영)"
-            elif target == t.current_grade:
-                hope_detail = " (현재 학년 유지)"
-            
-            role_name = t.duty_role or "역할"
-            desc = f"제12조② 역할 우선 ({role_name}){hope_detail}"
-            assigned.append((t, target, "규정우선", desc))
-            logs.append((t.name, "rule_12_2", f"역할 {t.duty_role or ''} 우선 배정"))
-        else:
-            remaining.append(t)
+from app.assignment.records import GradeSettingRecord, PreferenceRecord, SchoolData, TeacherRecord
+from app.assignment.rules import EXCLUDE_PATTERNS, PRIORITY_PATTERNS, ROLE_POINTS  # noqa: F401 (기존 이름 호환)
+from app.assignment.scoring import score_candidate  # noqa: F401 (기존 이름 호환)
+from app.assignment.solver import rule_reference, solve_assignment
 
-    return assigned, remaining, logs
 
-
-def apply_rotation(teachers: List[Teacher], prefs_by_name: Dict[str, Preference]) -> List[Teacher]:
-    """학년 순환 규칙 적용"""
-    updated: List[Teacher] = []
-    for t in teachers:
-        banned = set()
-        
-        # 1. 올해 담당 학년 제외 (제12조①)
-        if t.current_grade:
-            pref = prefs_by_name.get(t.name)
-            wants_same = False
-            if pref:
-                wants_same = (
-                    pref.first_choice_grade == t.current_grade
-                    or pref.second_choice_grade == t.current_grade
-                    or pref.third_choice_grade == t.current_grade
-                )
-            # 1학년/6학년은 동일학년 희망 시 제한 완화
-            if not (t.current_grade in {1, 6} and wants_same):
-                banned.add(t.current_grade)
-        
-        # 2. 동일 학년 2번 제한 (본교 근무 기간 동안)
-        if t.grade_history:
-            grade_counts: Dict[int, int] = {}
-            for entry in t.grade_history:
-                if isinstance(entry, dict) and "grade" in entry:
-                    grade = entry["grade"]
-                    grade_counts[grade] = grade_counts.get(grade, 0) + 1
-            
-            # 2번 이상 담임한 학년은 제외
-            for grade, count in grade_counts.items():
-                if count >= 2:
-                    banned.add(grade)
-        
-        t.banned_grades = banned
-        updated.append(t)
-    return updated
-
-
-def apply_subject_rules(teachers: List[Teacher]) -> List[Teacher]:
-    """교과전담 규칙 적용"""
-    updated: List[Teacher] = []
-    for t in teachers:
-        if t.is_subject_teacher:
-            banned = getattr(t, "banned_grades", set())
-            banned.update({1, 2, 3, 4, 5, 6})
-            t.banned_grades = banned
-        updated.append(t)
-    return updated
-
-
-def score_candidate(teacher: Teacher, grade: int, prefs: List[int]) -> Tuple[int, Dict]:
-    """점수 계산 및 상세 내역 반환"""
-    hope_score = 0
-    hope_detail = ""
-    if prefs:
-        if grade == prefs[0]:
-            hope_score = 10
-            hope_detail = "1지망"
-        elif len(prefs) > 1 and grade == prefs[1]:
-            hope_score = 5
-            hope_detail = "2지망"
-        elif len(prefs) > 2 and grade == prefs[2]:
-            hope_score = 2
-            hope_detail = "3지망"
-    
-    grade_weight = {6: 6, 1: 5, 5: 4, 3: 3, 4: 3, 2: 2}.get(grade, 0)
-    
-    role_score = 0
-    role_detail = ""
-    role_text = (teacher.duty_role or "") + " " + (teacher.special_conditions or "") + " " + (teacher.subject or "")
-    for key, val in ROLE_POINTS.items():
-        if key in role_text:
-            if val > role_score:
-                role_score = val
-                role_detail = key
-    
-    penalty = -999 if grade in teacher.banned_grades else 0
-    total_score = hope_score + grade_weight + role_score + penalty
-    
-    details = {
-        "hope_score": hope_score,
-        "hope_detail": hope_detail,
-        "grade_weight": grade_weight,
-        "role_score": role_score,
-        "role_detail": role_detail,
-        "penalty": penalty,
-        "total_score": total_score,
-    }
-    
-    return total_score, details
+def _repeated_grades(grade_history: List[Dict[str, int]]) -> set:
+    """본교 담임 이력에서 2번 이상 담임한 학년 (동일 학년 2번 제한)"""
+    grade_counts: Dict[int, int] = {}
+    for entry in grade_history:
+        if isinstance(entry, dict) and "grade" in entry:
+            grade = entry["grade"]
+            grade_counts[grade] = grade_counts.get(grade, 0) + 1
+    return {grade for grade, count in grade_counts.items() if count >= 2}
 
 
 def run_assignment(teachers: List[Teacher], settings: List[GradeSetting], prefs_by_name: Dict[str, Preference], year: int) -> Tuple[List[Assignment], List[Teacher], List[Tuple[str, str]]]:
-    """배정 알고리즘 실행"""
-    # 1. 제외 대상 필터링
-    kept, excluded, logs_all = apply_exclusions(teachers, year)
-    
-    # 2. 희망 정보를 teacher 객체에 붙이기
-    for t in kept:
-        pref = prefs_by_name.get(t.name)
-        if pref:
-            t.preferred_grade_primary = pref.first_choice_grade
-            t.preferred_grade_secondary = pref.second_choice_grade
-            t.preferred_grade_third = pref.third_choice_grade
-    
-    # 3. 우선 배정 규칙 적용
-    assigned, remaining, pri_logs = apply_priority_rules(kept, settings, year, prefs_by_name)
-    logs_all.extend(pri_logs)
-    
-    # 4. 학년 순환 규칙 적용
-    remaining = apply_rotation(remaining, prefs_by_name)
-    
-    # 5. 교과전담 규칙 적용
-    remaining = apply_subject_rules(remaining)
-    
-    # 6. 슬롯 풀 생성
-    slots: List[int] = []
-    for s in settings:
-        for _ in range(s.required_homerooms):
-            slots.append(s.grade)
-    
-    if not slots:
-        raise ValueError("필요 담임 수가 0입니다. 학급 설정에서 필요 담임 수를 입력해주세요.")
-    
-    # 7. 1/2/3 지망 우선 배정
-    for choice_idx in [0, 1, 2]:
-        still = []
-        for t in remaining:
-            prefs = []
-            pref = prefs_by_name.get(t.name)
-            if pref:
-                if pref.first_choice_grade:
-                    prefs.append(pref.first_choice_grade)
-                if pref.second_choice_grade:
-                    prefs.append(pref.second_choice_grade)
-                if pref.third_choice_grade:
-                    prefs.append(pref.third_choice_grade)
-            if choice_idx < len(prefs) and prefs[choice_idx] in slots and prefs[choice_idx] not in t.banned_grades:
-                g = prefs[choice_idx]
-                hope_rank = f"{choice_idx+1}지망"
-                desc = f"{hope_rank} 반영 (희망 학년: {g}학년)"
-                assigned.append((t, g, hope_rank, desc))
-                slots.remove(g)
-            else:
-                still.append(t)
-        remaining = still
-    
-    # 8. 남은 슬롯 점수 기반 배정 (greedy)
-    scored = []
-    for t in remaining:
-        prefs = []
+    """배정 알고리즘 실행 (교사는 엑셀 행 순서를 id로 사용)"""
+    records = [
+        TeacherRecord(
+            id=idx,
+            name=t.name,
+            current_grade=t.current_grade,
+            is_subject_teacher=t.is_subject_teacher,
+            duty_role=t.duty_role,
+            special_conditions=t.special_conditions,
+            subject=t.subject,
+        )
+        for idx, t in enumerate(teachers)
+    ]
+    prefs_by_teacher = {}
+    for idx, t in enumerate(teachers):
         pref = prefs_by_name.get(t.name)
         if pref:
-            if pref.first_choice_grade:
-                prefs.append(pref.first_choice_grade)
-            if pref.second_choice_grade:
-                prefs.append(pref.second_choice_grade)
-            if pref.third_choice_grade:
-                prefs.append(pref.third_choice_grade)
-        best = None
-        best_details = None
-        for g in set(slots):
-            sc, details = score_candidate(t, g, prefs)
-            if best is None or sc > best[1]:
-                best = (g, sc)
-                best_details = details
-        if best:
-            scored.append((t, best[0], best[1], best_details))
-    scored.sort(key=lambda x: x[2], reverse=True)
-    for t, g, sc, details in scored:
-        if g in slots:
-            desc_parts = []
-            if details["hope_detail"]:
-                desc_parts.append(f"희망: {details['hope_detail']}({details['hope_score']}점)")
-            desc_parts.append(f"학년가중치: {details['grade_weight']}점")
-            if details["role_detail"]:
-                desc_parts.append(f"역할: {details['role_detail']}({details['role_score']}점)")
-            desc_parts.append(f"총점: {details['total_score']}점")
-            desc = " | ".join(desc_parts)
-            assigned.append((t, g, "조정", desc))
-            slots.remove(g)
-    
-    # 9. 결과 변환
-    assignments = []
-    for t, g, atype, desc in assigned:
-        rule_ref = None
-        if "규정우선" in atype:
-            if "제12조④" in (desc or ""):
-                rule_ref = "제12조④ (특수 사유 우선 배정)"
-            elif "제12조②" in (desc or ""):
-                rule_ref = "제12조② (역할 우선 배정)"
-            elif "제13조" in (desc or ""):
-                rule_ref = "제13조 (배정 제외)"
-        elif "1지망" in atype or "2지망" in atype or "3지망" in atype:
-            rule_ref = "제11조 (희망 학년 반영)"
-        elif "조정" in atype:
-            rule_ref = "제12조① (학년 순환 원칙) + 점수 기반 조정"
-        
-        assignments.append(Assignment(
-            teacher_name=t.name,
+            prefs_by_teacher[idx] = PreferenceRecord(
+                idx, pref.first_choice_grade, pref.second_choice_grade, pref.third_choice_grade
+            )
+    data = SchoolData(
+        school_id=0,
+        year=year,
+        teachers=records,
+        settings=[GradeSettingRecord(s.grade, s.required_homerooms) for s in settings],
+        prefs_by_teacher=prefs_by_teacher,
+        repeated_grades={idx: _repeated_grades(t.grade_history) for idx, t in enumerate(teachers) if t.grade_history},
+    )
+
+    assigned, excluded, logs = solve_assignment(data, "greedy")
+
+    # 엔진 계산 결과(배정 금지 학년)를 엑셀 교사 객체에도 반영
+    for r in records:
+        teachers[r.id].banned_grades = r.banned_grades
+
+    assignments = [
+        Assignment(
+            teacher_name=teachers[r.id].name,
             assigned_grade=g,
             assignment_type=atype,
-            rule_reference=rule_ref,
+            rule_reference=rule_reference(atype, desc),
             description=desc,
-        ))
-    
-    return assignments, excluded, logs_all
+        )
+        for r, g, atype, desc in assigned
+    ]
+    logs_by_name = [(teachers[teacher_id].name, step, message) for teacher_id, step, message in logs]
+    return assignments, [teachers[r.id] for r in excluded], logs_by_name
 
 
 # ==================== 엑셀 읽기/쓰기 ====================